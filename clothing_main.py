@@ -9,16 +9,19 @@ import os
 Runs clothing conversational recommendation system in terminal 
 """
 
-warnings.simplefilter("default")
-logging.config.fileConfig('logging.conf')
-with open('system_config.yaml') as f:
-    config = yaml.load(f, Loader=yaml.FullLoader)
-config['PATH_TO_DOMAIN_CONFIGS'] = "domain_specific/configs/clothing_configs"
-load_dotenv()
+# the sharded embedding pipeline starts worker processes that import this module, so the system is only
+# created when the module is run
+if __name__ == '__main__':
+    warnings.simplefilter("default")
+    logging.config.fileConfig('logging.conf')
+    with open('system_config.yaml') as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    config['PATH_TO_DOMAIN_CONFIGS'] = "domain_specific/configs/clothing_configs"
+    load_dotenv()
 
-openai_api_key_or_gradio_url = os.environ['OPENAI_API_KEY']
+    openai_api_key_or_gradio_url = os.environ['OPENAI_API_KEY']
 
-conv_rec_system = ConvRecSystem(
-    config, openai_api_key_or_gradio_url)
+    conv_rec_system = ConvRecSystem(
+        config, openai_api_key_or_gradio_url)
 
-conv_rec_system.run()
+    conv_rec_system.run()
@@ -13,7 +13,6 @@ from dialogue_manager import DialogueManager
 from state.common_state_manager import CommonStateManager
 from state.constraints.one_step_constraints_updater import OneStepConstraintsUpdater
 from user.terminal import Terminal
-from user.gradio import GradioInterface
 from user.user_interface import UserInterface
 from user_intent.accept_recommendation import AcceptRecommendation
 from user_intent.ask_for_recommendation import AskForRecommendation
@@ -25,11 +24,10 @@ from user_intent.classifiers.multilabel_user_intents_classifier import Multilabe
 from user_intent.extractors.current_items_extractor import CurrentItemsExtractor
 from rec_action.common_rec_actions_classifier import CommonRecActionsClassifier
 from information_retriever.embedder.statics import *
-from information_retriever.embedder.bert_embedder import BERT_model
+from information_retriever.embedder.embedder_registry import embedder_registry
+from information_retriever.embedder.embedding_cache import EmbeddingCache
 from user_intent.reject_recommendation import RejectRecommendation
 from domain_specific_config_loader import DomainSpecificConfigLoader
-from information_retriever.search_engine.matmul_search_engine import MatMulSearchEngine
-from information_retriever.search_engine.vector_database_search_engine import VectorDatabaseSearchEngine
 from information_retriever.metadata_wrapper import MetadataWrapper
 from information_retriever.filter.filter_applier import FilterApplier
 from information_retriever.filter.filter import Filter
@@ -110,15 +108,41 @@ class ConvRecSystem(WarningObserver):
         BERT_name = config["IR_BERT_MODEL_NAME"]
         BERT_model_name = BERT_MODELS[BERT_name]
         tokenizer_name = TOEKNIZER_MODELS[BERT_name]
-        embedder = BERT_model(BERT_model_name, tokenizer_name)
+        embedding_cache_size = config.get('IR_EMBEDDING_CACHE_SIZE', 0)
+        embedding_cache = EmbeddingCache(embedding_cache_size, config.get('IR_EMBEDDING_CACHE_TTL')) \
+            if embedding_cache_size > 0 else None
+        shared_embedder = embedder_registry.get_embedder(config.get('IR_EMBEDDER_BACKEND', 'tensorflow'),
+                                                         BERT_model_name, tokenizer_name,
+                                                         config.get('IR_CONVERTED_MODEL_CACHE_DIR'))
+        embedder = shared_embedder.with_embedding_cache(embedding_cache)
+        embedder.warm_up()
+        num_coarse_candidate_items = config.get('NUM_COARSE_CANDIDATE_ITEMS', 0)
         if config['SEARCH_ENGINE'] == "matmul":
+            from information_retriever.search_engine.matmul_search_engine import MatMulSearchEngine
+
             reviews_item_ids, reviews, reviews_embedding_matrix = \
                 domain_specific_config_loader.load_data_for_pd_search_engine()
-            search_engine = MatMulSearchEngine(embedder, reviews_item_ids, reviews, reviews_embedding_matrix, metadata_wrapper)
+            item_embedding_matrix = domain_specific_config_loader.load_item_embedding_matrix(reviews_item_ids) \
+                if num_coarse_candidate_items > 0 else None
+            exact_reviews_embedding_matrix = domain_specific_config_loader.load_exact_reviews_embedding_matrix()
+            search_engine = MatMulSearchEngine(embedder, reviews_item_ids, reviews, reviews_embedding_matrix,
+                                               metadata_wrapper, config.get('SCORE_CANDIDATES_ONLY', False),
+                                               item_embedding_matrix, num_coarse_candidate_items,
+                                               config.get('REVIEWS_EMBEDDING_PRECISION', 'float32'),
+                                               config.get('NUM_RESCORED_ITEMS', 0),
+                                               exact_reviews_embedding_matrix=exact_reviews_embedding_matrix)
         else:
+            # FAISS is only loaded when the vector database search engine is used
+            from information_retriever.search_engine.vector_database_search_engine import VectorDatabaseSearchEngine
+
             reviews_item_ids, reviews, database = \
                 domain_specific_config_loader.load_data_for_vector_database_search_engine()
-            search_engine = VectorDatabaseSearchEngine(embedder, reviews_item_ids, reviews, database, metadata_wrapper)
+            item_embedding_matrix = domain_specific_config_loader.load_item_embedding_matrix(reviews_item_ids) \
+                if num_coarse_candidate_items > 0 else None
+            search_engine = VectorDatabaseSearchEngine(embedder, reviews_item_ids, reviews, database, metadata_wrapper,
+                                                       config.get('VECTOR_DATABASE_NUM_CANDIDATE_REVIEWS', 0),
+                                                       config.get('SCORE_CANDIDATES_ONLY', False),
+                                                       item_embedding_matrix, num_coarse_candidate_items)
         information_retrieval = InformationRetrieval(search_engine, metadata_wrapper, ItemLoader())
         
         # Initialize User Intent
@@ -172,6 +196,9 @@ class ConvRecSystem(WarningObserver):
 
         # Initialize system
         if user_interface_str == "demo":
+            # gradio is only loaded when the demo is run
+            from user.gradio import GradioInterface
+
             self.user_interface = GradioInterface()
         else:
             self.user_interface = Terminal()
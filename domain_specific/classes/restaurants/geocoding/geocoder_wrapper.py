@@ -1,4 +1,7 @@
-from geopy import Location
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from geopy import Location
 
 
 class GeocoderWrapper:
@@ -7,7 +10,7 @@ class GeocoderWrapper:
     Wrapper for geocoder.
     """
 
-    def geocode(self, query: str, **kwargs) -> Location:
+    def geocode(self, query: str, **kwargs) -> 'Location':
         """
         Convert the given query to location object from geopy.
 
@@ -17,7 +20,7 @@ class GeocoderWrapper:
         """
         raise NotImplementedError()
 
-    def is_location_specific(self, location: Location) -> bool:
+    def is_location_specific(self, location: 'Location') -> bool:
         """
         Return whether location is specific enough.
 
@@ -37,7 +40,7 @@ class GeocoderWrapper:
         """
         raise NotImplementedError()
 
-    def get_boundary(self, location: Location) -> tuple[tuple[float, float], tuple[float, float]]:
+    def get_boundary(self, location: 'Location') -> tuple[tuple[float, float], tuple[float, float]]:
         """
         Get boundary points (northeast point and southwest point) of a location.
         :param location: input location
@@ -47,7 +50,7 @@ class GeocoderWrapper:
         """
         raise NotImplementedError()
 
-    def get_lat_lon_of_loc(self, location: Location) -> tuple[float, float]:
+    def get_lat_lon_of_loc(self, location: 'Location') -> tuple[float, float]:
         """
         Get the latitude and longitude of a location.
         :param location: input location
@@ -1,8 +1,13 @@
-from geopy import GoogleV3, Location
+from typing import TYPE_CHECKING
+
 from domain_specific.classes.restaurants.geocoding.geocoder_wrapper import GeocoderWrapper
 
 import os
 import dotenv
+
+if TYPE_CHECKING:
+    from geopy import GoogleV3, Location
+
 dotenv.load_dotenv()
 
 
@@ -14,11 +19,13 @@ class GoogleV3Wrapper(GeocoderWrapper):
     :param mandatory_address_keys: key used to determine if location is specific enough
     """
 
-    _geocoder: GoogleV3
+    _geocoder: 'GoogleV3'
     _mandatory_address_keys: set[str]
-    _geocoder_history: dict[str, Location]
+    _geocoder_history: dict[str, 'Location']
 
     def __init__(self, mandatory_address_keys=None):
+        from geopy import GoogleV3
+
         super().__init__()
         if mandatory_address_keys is None:
             mandatory_address_keys = {'route', 'intersection'}
@@ -26,7 +33,7 @@ class GoogleV3Wrapper(GeocoderWrapper):
         self._mandatory_address_keys = mandatory_address_keys
         self._geocoder_history = {}
 
-    def geocode(self, query, **kwargs) -> Location:
+    def geocode(self, query, **kwargs) -> 'Location':
         """
         Convert the given query to location object from geopy.
 
@@ -38,7 +45,7 @@ class GoogleV3Wrapper(GeocoderWrapper):
             self._geocoder_history[query] = self._geocoder.geocode(query, **kwargs)
         return self._geocoder_history[query]
 
-    def is_location_specific(self, location: Location) -> bool:
+    def is_location_specific(self, location: 'Location') -> bool:
         """
         Return whether location is specific enough.
 
@@ -67,7 +74,7 @@ class GoogleV3Wrapper(GeocoderWrapper):
         else:
             return f'{new_loc_query}, {old_loc_query}'
 
-    def get_boundary(self, location: Location) -> tuple[tuple[float, float], tuple[float, float]]:
+    def get_boundary(self, location: 'Location') -> tuple[tuple[float, float], tuple[float, float]]:
         """
         Get boundary points (northeast point and southwest point) of a location.
         :param location: input location
@@ -82,7 +89,7 @@ class GoogleV3Wrapper(GeocoderWrapper):
         southwest_lat_lon = (southwest.get('lat'), southwest.get('lng'))
         return northeast_lat_lon, southwest_lat_lon
 
-    def get_lat_lon_of_loc(self, location: Location) -> tuple[float, float]:
+    def get_lat_lon_of_loc(self, location: 'Location') -> tuple[float, float]:
         """
         Get the latitude and longitude of a location.
         :param location: input location
@@ -1,20 +1,26 @@
-from geopy import Location, Nominatim
+from typing import TYPE_CHECKING
+
 from domain_specific.classes.restaurants.geocoding.geocoder_wrapper import GeocoderWrapper
 import time
 
+if TYPE_CHECKING:
+    from geopy import Location, Nominatim
+
 
 class NominatimWrapper(GeocoderWrapper):
     """
     Wrapper for Nominatim geocoder.
     """
 
-    _geocoder: Nominatim
+    _geocoder: 'Nominatim'
     _mandatory_address_key: str
-    _geocoder_history: dict[str, Location]
+    _geocoder_history: dict[str, 'Location']
     _max_attempts: int
     _location_bias: str
 
     def __init__(self, max_attempts: int = 5, mandatory_address_key='road', location_bias=None):
+        from geopy import Nominatim
+
         super().__init__()
         self._geocoder = Nominatim(user_agent='d3m-2023-convrec-demo')
         self._mandatory_address_key = mandatory_address_key
@@ -22,7 +28,7 @@ class NominatimWrapper(GeocoderWrapper):
         self._max_attempts = max_attempts
         self._location_bias = location_bias
 
-    def geocode(self, query, **kwargs) -> Location:
+    def geocode(self, query, **kwargs) -> 'Location':
         """
         Convert the given query to location object from geopy.
 
@@ -49,7 +55,7 @@ class NominatimWrapper(GeocoderWrapper):
 
         return self._geocoder_history[query]
 
-    def is_location_specific(self, location: Location) -> bool:
+    def is_location_specific(self, location: 'Location') -> bool:
         """
         Return whether location is specific enough.
 
@@ -78,7 +84,7 @@ class NominatimWrapper(GeocoderWrapper):
         else:
             return f'{new_loc_query}, {old_loc_query}'
 
-    def get_boundary(self, location: Location) -> tuple[tuple[float, float], tuple[float, float]]:
+    def get_boundary(self, location: 'Location') -> tuple[tuple[float, float], tuple[float, float]]:
         """
         Get boundary points (northeast point and southwest point) of a location.
         :param location: input location
@@ -91,7 +97,7 @@ class NominatimWrapper(GeocoderWrapper):
         southwest_lat_lon = (float(boundingbox[0]), float(boundingbox[2]))
         return northeast_lat_lon, southwest_lat_lon
 
-    def get_lat_lon_of_loc(self, location: Location) -> tuple[float, float]:
+    def get_lat_lon_of_loc(self, location: 'Location') -> tuple[float, float]:
         """
         Get the latitude and longitude of a location.
         :param location: input location
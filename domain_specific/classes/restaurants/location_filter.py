@@ -1,7 +1,7 @@
 from state.state_manager import StateManager
-from geopy.distance import geodesic
 from domain_specific.classes.restaurants.geocoding.geocoder_wrapper import GeocoderWrapper
 from information_retriever.filter.filter import Filter
+import numpy as np
 import pandas as pd
 
 
@@ -27,29 +27,26 @@ class LocationFilter(Filter):
         self._default_max_distance_in_km = default_max_distance_in_km
         self._geocoder_wrapper = geocoder_wrapper
 
-    def filter(self, state_manager: StateManager,
-               metadata: pd.DataFrame) -> pd.DataFrame:
+    def get_mask(self, state_manager: StateManager, metadata: pd.DataFrame, mask: np.ndarray) -> np.ndarray:
         """
-        Return a filtered version of metadata pandas dataframe.
+        Return a boolean mask that is true for the items that are kept.
 
         :param state_manager: current state
         :param metadata: items' metadata
-        :return: filtered version of metadata pandas dataframe
+        :param mask: boolean mask that is true for the items kept by the previous filters
+        :return: boolean mask that is true for the items that are kept
         """
         location_names = state_manager.get('hard_constraints').get(self._constraint_key)
         if location_names is None or not location_names:
-            return metadata
+            return mask
 
         lat_lon_of_locations, max_distances_in_km = self._get_lat_lon_and_max_distance(location_names)
         if not lat_lon_of_locations or not max_distances_in_km:
-            return metadata
+            return mask
 
-        metadata['is_close_enough'] = metadata.apply(
-            self._is_item_close_enough_to_loc, args=(lat_lon_of_locations, max_distances_in_km), axis=1)
-        filtered_metadata = metadata.loc[metadata['is_close_enough']]
-        filtered_metadata = filtered_metadata.drop('is_close_enough', axis=1)
-
-        return filtered_metadata
+        lat_lon_of_items = pd.Series(list(zip(metadata[self._metadata_field[0]], metadata[self._metadata_field[1]])))
+        return self._get_mask_of_kept_items(lat_lon_of_items, mask, self._is_item_close_enough_to_loc,
+                                            lat_lon_of_locations, max_distances_in_km)
 
     def _get_lat_lon_and_max_distance(self, location_names: list[str]) -> tuple[list, list]:
         """
@@ -70,19 +67,19 @@ class LocationFilter(Filter):
 
         return lat_lon_of_loc, max_distance_in_km
 
-    def _is_item_close_enough_to_loc(self, row_of_df: pd.Series,
+    def _is_item_close_enough_to_loc(self, lat_lon_of_item: tuple[float, float],
                                      lat_lon_of_loc: list[tuple[float, float]],
                                      max_distance_in_km: list[float]) -> bool:
         """
         Check whether the distance between the item and the location is within max distance.
 
+        :param lat_lon_of_item: tuple where the first element is latitude and the second element is
+        longitude of the item
         :param lat_lon_of_loc: tuple where the first element is latitude and the second element is
         longitude of the location
         :param max_distance_in_km: maximum allowable distance
         :return: true or false on whether the distance between the item and the location is within max distance
         """
-        lat_lon_of_item = (row_of_df[self._metadata_field[0]], row_of_df[self._metadata_field[1]])
-
         for index in range(len(lat_lon_of_loc)):
             distance_btw_loc_and_item_in_km \
                 = self._get_geodesic_distance(lat_lon_of_loc[index], lat_lon_of_item)
@@ -115,4 +112,6 @@ class LocationFilter(Filter):
         :param lat_lon_of_item: tuple where the first element is latitude and the second element is longitude of the item
         :return: geodesic distance between the location and the item in km
         """
+        from geopy.distance import geodesic
+
         return geodesic(lat_lon_of_loc, lat_lon_of_item).km
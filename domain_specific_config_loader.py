@@ -1,22 +1,28 @@
 import re
+from typing import TYPE_CHECKING, Callable
 
 import torch
 import numpy as np
-import faiss
 import pandas as pd
 import yaml
 
-from information_retriever.embedder.bert_embedder import BERT_model
+from information_retriever.embedder.embedder import Embedder
+from information_retriever.embedder.embedder_registry import embedder_registry
 from information_retriever.embedder.embedding_matrix_creator import EmbeddingMatrixCreator
-from information_retriever.embedder.vector_database_creator import VectorDatabaseCreator
 from information_retriever.filter.filter import Filter
 from information_retriever.filter.exact_word_matching_filter import ExactWordMatchingFilter
 from information_retriever.filter.item_filter import ItemFilter
 from information_retriever.filter.value_range_filter import ValueRangeFilter
 from information_retriever.filter.word_in_filter import WordInFilter
-from information_retriever.vector_database import VectorDataBase
+from information_retriever.review_store import ReviewStore
 import os
 
+if TYPE_CHECKING:
+    # FAISS is only loaded when a vector database is read or created
+    import faiss
+    from information_retriever.embedder.vector_database_creator import VectorDatabaseCreator
+    from information_retriever.vector_database import VectorDataBase
+
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '1'
 
 
@@ -213,6 +219,18 @@ class DomainSpecificConfigLoader:
         """
         return self.system_config['PATH_TO_DOMAIN_CONFIGS']
 
+    def _get_embedder_loader(self, model_name: str) -> Callable[[], Embedder]:
+        """
+        Return a function that returns the shared embedder of the given model, so that the model is only loaded
+        when reviews need to be embedded.
+
+        :param model_name: name of the model used both as language model and tokenizer
+        :return: function returning the embedder
+        """
+        return embedder_registry.get_embedder_loader(
+            self.system_config.get('IR_EMBEDDER_BACKEND', 'tensorflow'), model_name, model_name,
+            self.system_config.get('IR_CONVERTED_MODEL_CACHE_DIR'))
+
     def load_inquire_classification_fewshots(self) -> list[dict]:
         """
         Load few shot example used for user intent classification corresponding to inquire user intent
@@ -304,37 +322,63 @@ class DomainSpecificConfigLoader:
         path_to_items_metadata = f'{self._get_path_to_domain()}/{filename}'
         return pd.read_json(path_to_items_metadata, orient='records', lines=True)
 
-    def load_data_for_pd_search_engine(self) -> tuple[np.ndarray, np.ndarray, torch.Tensor]:
+    def load_data_for_pd_search_engine(self) -> tuple[np.ndarray, np.ndarray | ReviewStore, torch.Tensor]:
         """
         Load data (item id corresponding to each review, review texts and embedding matrix)
-        used for initializing PD Search Engine
+        used for initializing PD Search Engine. When items are rescored with the float32 review embeddings, the
+        embedding matrix is memory mapped so that load_exact_reviews_embedding_matrix can map the same file.
 
         :return: data used for initializing pd search engine
         """
         path_to_domain = self._get_path_to_domain()
-        filename = self._load_domain_specific_config()['PATH_TO_REVIEWS']
-        filepath = f'{self._get_path_to_domain()}/{filename}'
-        reviews_df = pd.read_csv(filepath)
+        reviews_df, reviews = self._load_reviews()
 
         # load embedding matrix
         embedding_matrix_filename = self._load_domain_specific_config()['PATH_TO_EMBEDDING_MATRIX']
         path_to_embedding_matrix = f'{path_to_domain}/{embedding_matrix_filename}'
-        embedding_matrix = self._create_embedding_matrix(reviews_df, path_to_embedding_matrix)
+        if self.system_config.get('MMAP_EMBEDDINGS', False) or self._should_rescore_items():
+            embedding_matrix = self._load_embedding_matrix_mmap(reviews_df, path_to_embedding_matrix)
+        else:
+            embedding_matrix = self._create_embedding_matrix(reviews_df, path_to_embedding_matrix)
 
         review_item_ids = reviews_df["item_id"].to_numpy()
-        reviews = reviews_df["Review"].to_numpy()
         return review_item_ids, reviews, embedding_matrix
 
-    def load_data_for_vector_database_search_engine(self) -> tuple[np.ndarray, np.ndarray, VectorDataBase]:
+    def load_exact_reviews_embedding_matrix(self) -> np.ndarray | None:
+        """
+        Memory map the float32 review embeddings saved as a .npy file by load_data_for_pd_search_engine, which are
+        used to rescore the most similar items when REVIEWS_EMBEDDING_PRECISION is not "float32". Only the rows
+        of the rescored reviews are read from disk.
+
+        :return: float32 review embeddings, or None if items are not rescored
+        """
+        if not self._should_rescore_items():
+            return None
+
+        embedding_matrix_filename = self._load_domain_specific_config()['PATH_TO_EMBEDDING_MATRIX']
+        path_to_embedding_matrix = f'{self._get_path_to_domain()}/{embedding_matrix_filename}'
+        return np.load(f'{os.path.splitext(path_to_embedding_matrix)[0]}.npy', mmap_mode='r')
+
+    def _should_rescore_items(self) -> bool:
+        """
+        Return whether the most similar items are rescored with the float32 review embeddings.
+
+        :return: whether items are rescored
+        """
+        return self.system_config.get('REVIEWS_EMBEDDING_PRECISION', 'float32') != 'float32' and \
+            self.system_config.get('NUM_RESCORED_ITEMS', 0) > 0
+
+    def load_data_for_vector_database_search_engine(self) \
+            -> tuple[np.ndarray, np.ndarray | ReviewStore, 'VectorDataBase']:
         """
         Load data (item id corresponding to each review, review texts and faiss database)
         for initializing vector database search engine
 
         :return: data used for initializing vector database search engine
         """
-        filename = self._load_domain_specific_config()['PATH_TO_REVIEWS']
-        filepath = f'{self._get_path_to_domain()}/{filename}'
-        reviews_df = pd.read_csv(filepath)
+        from information_retriever.vector_database import VectorDataBase
+
+        reviews_df, reviews = self._load_reviews()
 
         path_to_domain = self._get_path_to_domain()
         database_filename = self._load_domain_specific_config()['PATH_TO_DATABASE']
@@ -343,22 +387,116 @@ class DomainSpecificConfigLoader:
         database = self._create_database(reviews_df, path_to_database)
 
         review_item_ids = reviews_df["item_id"].to_numpy()
-        reviews = reviews_df["Review"].to_numpy()
-        return review_item_ids, reviews, VectorDataBase(database)
+        vector_database = VectorDataBase(database, self.system_config.get('VECTOR_DATABASE_NPROBE'),
+                                         self.system_config.get('VECTOR_DATABASE_EF_SEARCH'))
+        return review_item_ids, reviews, vector_database
 
-    def _create_database(self, reviews_df: pd.DataFrame, path_to_database: str) -> faiss.Index:
+    def load_item_embedding_matrix(self, review_item_ids: np.ndarray) -> torch.Tensor:
+        """
+        Load matrix storing the pooled embedding of each item used for coarse retrieval. If it doesn't exist yet
+        or doesn't have a row for each item, create it from the embedding matrix or the vector database of the
+        reviews and save it.
+
+        :param review_item_ids: item ids corresponding to reviews
+        :return: item embedding matrix
+        """
+        path_to_domain = self._get_path_to_domain()
+        domain_specific_config = self._load_domain_specific_config()
+        path_to_item_embedding_matrix = f'{path_to_domain}/{domain_specific_config["PATH_TO_ITEM_EMBEDDING_MATRIX"]}'
+        if os.path.exists(path_to_item_embedding_matrix):
+            item_embedding_matrix = torch.load(path_to_item_embedding_matrix)
+            if item_embedding_matrix.shape[0] == pd.unique(review_item_ids).size:
+                return item_embedding_matrix
+
+        path_to_embedding_matrix = f'{path_to_domain}/{domain_specific_config["PATH_TO_EMBEDDING_MATRIX"]}'
+        if os.path.exists(path_to_embedding_matrix):
+            reviews_embedding_matrix = torch.load(path_to_embedding_matrix)
+        else:
+            import faiss
+
+            database = faiss.read_index(f'{path_to_domain}/{domain_specific_config["PATH_TO_DATABASE"]}')
+            reviews_embedding_matrix = EmbeddingMatrixCreator.create_embedding_matrix_from_database(database)
+
+        return EmbeddingMatrixCreator.create_item_embedding_matrix(reviews_embedding_matrix, review_item_ids,
+                                                                   path_to_item_embedding_matrix)
+
+    def _load_reviews(self) -> tuple[pd.DataFrame, np.ndarray | ReviewStore]:
+        """
+        Load dataframe containing reviews and the review texts. If REVIEW_STORE is set, reviews are read from a
+        review store next to the reviews file, which is created again whenever the reviews file is newer or
+        whether the store is compressed doesn't match REVIEW_STORE_COMPRESSION_LEVEL, and the dataframe only
+        contains the item ids until the review texts are needed to embed reviews.
+
+        :return: Returning a tuple with element 0 being the dataframe containing reviews and element 1 being the
+                review texts
+        """
+        path_to_reviews = self._get_path_to_reviews()
+        if not self.system_config.get('REVIEW_STORE', False):
+            reviews_df = pd.read_csv(path_to_reviews)
+            return reviews_df, reviews_df["Review"].to_numpy()
+
+        path_to_store = f'{os.path.splitext(path_to_reviews)[0]}_store'
+        compression_level = self.system_config.get('REVIEW_STORE_COMPRESSION_LEVEL')
+        if os.path.exists(path_to_store) and os.path.getmtime(path_to_store) >= os.path.getmtime(path_to_reviews):
+            review_store = ReviewStore(path_to_store)
+            if review_store.is_compressed() == (compression_level is not None):
+                return pd.DataFrame({'item_id': review_store.get_item_ids()}), review_store
+
+        reviews_df = pd.read_csv(path_to_reviews)
+        review_store = ReviewStore.create(reviews_df["Review"].to_list(), reviews_df["item_id"].to_numpy(),
+                                          path_to_store, compression_level=compression_level)
+        return reviews_df, review_store
+
+    def _load_review_texts(self, reviews_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Return reviews_df with the review texts, reading the reviews file if reviews_df only contains item ids.
+
+        :param reviews_df: dataframe containing reviews
+        :return: dataframe containing reviews and their texts
+        """
+        if "Review" in reviews_df.columns:
+            return reviews_df
+        return pd.read_csv(self._get_path_to_reviews())
+
+    def _get_path_to_reviews(self) -> str:
+        """
+        Return the path to the file storing the reviews.
+
+        :return: path to the reviews file
+        """
+        return f'{self._get_path_to_domain()}/{self._load_domain_specific_config()["PATH_TO_REVIEWS"]}'
+
+    def _create_database(self, reviews_df: pd.DataFrame, path_to_database: str) -> 'faiss.Index':
         """
         Create or load vector database. If database already exists in path_to_database, load database. Otherwise,
         create database and save them to path_to_database from embedding matrix or reviews_df.
+        If MMAP_EMBEDDINGS is set, a complete database is loaded with faiss.IO_FLAG_MMAP so that the inverted
+        lists of IVF databases are memory mapped instead of read into memory.
 
         :param reviews_df: dataframe containing reviews
         :param path_to_database: path to vector database
         :return: FAISS database
         """
+        import faiss
+
+        from information_retriever.embedder.vector_database_creator import VectorDatabaseCreator
+
+        # memory map complete database instead of reading it into memory
+        if self.system_config.get('MMAP_EMBEDDINGS', False) and os.path.exists(path_to_database):
+            database = faiss.read_index(path_to_database, faiss.IO_FLAG_MMAP)
+            if database.ntotal == reviews_df.shape[0]:
+                return database
+
         # initialize vector database creator
         model_name = "sebastian-hofstaetter/distilbert-dot-tas_b-b256-msmarco"
-        bert_model = BERT_model(model_name, model_name)
-        vector_database_creator = VectorDatabaseCreator(bert_model)
+        bert_model = self._get_embedder_loader(model_name)
+        vector_database_creator = VectorDatabaseCreator(
+            bert_model,
+            self.system_config.get('VECTOR_DATABASE_INDEX_TYPE', 'flat'),
+            self.system_config.get('VECTOR_DATABASE_NLIST', 1024),
+            self.system_config.get('VECTOR_DATABASE_PQ_M', 64),
+            self.system_config.get('VECTOR_DATABASE_HNSW_M', 32)
+        )
 
         # load file path to embedding matrix
         path_to_domain = self._get_path_to_domain()
@@ -370,13 +508,67 @@ class DomainSpecificConfigLoader:
         if not os.path.exists(path_to_database) and os.path.exists(path_to_embedding_matrix):
             embedding_matrix = torch.load(path_to_embedding_matrix)
             if embedding_matrix.shape[0] == reviews_df.shape[0]:
-                database = vector_database_creator.create_vector_database_from_matrix(embedding_matrix, path_to_database)
+                database = vector_database_creator.create_configured_vector_database_from_matrix(
+                    embedding_matrix, path_to_database)
             else:
-                database = vector_database_creator.create_vector_database_from_reviews(reviews_df, path_to_database)
+                database = self._create_database_from_reviews(vector_database_creator, reviews_df, path_to_database,
+                                                              path_to_embedding_matrix)
         else:
-            database = vector_database_creator.create_vector_database_from_reviews(reviews_df, path_to_database)
+            database = self._create_database_from_reviews(vector_database_creator, reviews_df, path_to_database,
+                                                          path_to_embedding_matrix)
         return database
 
+    def _create_database_from_reviews(self, vector_database_creator: 'VectorDatabaseCreator',
+                                      reviews_df: pd.DataFrame, path_to_database: str,
+                                      path_to_embedding_matrix: str) -> 'faiss.Index':
+        """
+        Create database by embedding reviews_df and save it to path_to_database, or load it if path_to_database
+        already stores every review. If EMBEDDING_NUM_WORKERS is set, reviews are embedded by the sharded
+        embedding pipeline instead of vector_database_creator.
+
+        :param vector_database_creator: creator of the database
+        :param reviews_df: dataframe containing reviews
+        :param path_to_database: path to vector database
+        :param path_to_embedding_matrix: path to embedding matrix, next to which the shards are stored
+        :return: FAISS database
+        """
+        import faiss
+
+        if os.path.exists(path_to_database):
+            database = faiss.read_index(path_to_database)
+            if database.ntotal == reviews_df.shape[0]:
+                return database
+
+        reviews_df = self._load_review_texts(reviews_df)
+        if self.system_config.get('EMBEDDING_NUM_WORKERS', 0) <= 0:
+            return vector_database_creator.create_vector_database_from_reviews(reviews_df, path_to_database)
+
+        embedding_matrix = self._embed_reviews_in_shards(reviews_df, path_to_embedding_matrix)
+        return vector_database_creator.create_configured_vector_database_from_matrix(embedding_matrix,
+                                                                                     path_to_database)
+
+    def _load_embedding_matrix_mmap(self, reviews_df: pd.DataFrame, path_to_embedding_matrix: str) -> torch.Tensor:
+        """
+        Memory map embedding matrix stored as a .npy file next to path_to_embedding_matrix, so that processes
+        loading the same matrix share it through the page cache. If the .npy file doesn't exist yet, create or
+        load embedding matrix and save it as a .npy file.
+
+        :param reviews_df: dataframe containing reviews
+        :param path_to_embedding_matrix: path to embedding matrix
+        :return: embedding matrix backed by the memory mapped file
+        """
+        path_to_npy = f'{os.path.splitext(path_to_embedding_matrix)[0]}.npy'
+        if not os.path.exists(path_to_npy) or np.load(path_to_npy, mmap_mode='r').shape[0] != reviews_df.shape[0]:
+            embedding_matrix = self._create_embedding_matrix(reviews_df, path_to_embedding_matrix)
+            # write to a temporary file first so that other processes never map a partially written file
+            path_to_tmp_npy = f'{path_to_npy}.{os.getpid()}.tmp'
+            with open(path_to_tmp_npy, 'wb') as f:
+                np.save(f, embedding_matrix.numpy())
+            os.replace(path_to_tmp_npy, path_to_npy)
+
+        # copy on write mapping gives a writable array, as torch expects, while pages stay shared until written
+        return torch.from_numpy(np.load(path_to_npy, mmap_mode='c'))
+
     def _create_embedding_matrix(self, reviews_df: pd.DataFrame, path_to_embedding_matrix: str) -> torch.Tensor:
         """
         Create or load matrix containing embedding matrix. If embedding matrix already exists in
@@ -389,7 +581,7 @@ class DomainSpecificConfigLoader:
         """
         # initialize embedding matrix creator
         model_name = "sebastian-hofstaetter/distilbert-dot-tas_b-b256-msmarco"
-        bert_model = BERT_model(model_name, model_name)
+        bert_model = self._get_embedder_loader(model_name)
         embedding_matrix_creator = EmbeddingMatrixCreator(bert_model)
 
         # load file path to database
@@ -400,6 +592,8 @@ class DomainSpecificConfigLoader:
 
         # create embedding matrix
         if not os.path.exists(path_to_embedding_matrix) and os.path.exists(path_to_database):
+            import faiss
+
             database = faiss.read_index(path_to_database)
             if database.ntotal == reviews_df.shape[0]:
                 embedding_matrix = embedding_matrix_creator.create_embedding_matrix_from_database(
@@ -407,17 +601,64 @@ class DomainSpecificConfigLoader:
                     path_to_embedding_matrix
                 )
             else:
-                embedding_matrix = embedding_matrix_creator.create_embedding_matrix_from_reviews(
+                embedding_matrix = self._create_embedding_matrix_from_reviews(
+                    embedding_matrix_creator,
                     reviews_df,
                     path_to_embedding_matrix
                 )
         else:
-            embedding_matrix = embedding_matrix_creator.create_embedding_matrix_from_reviews(
+            embedding_matrix = self._create_embedding_matrix_from_reviews(
+                embedding_matrix_creator,
                 reviews_df,
                 path_to_embedding_matrix
             )
         return embedding_matrix
 
+    def _create_embedding_matrix_from_reviews(self, embedding_matrix_creator: EmbeddingMatrixCreator,
+                                              reviews_df: pd.DataFrame, path_to_embedding_matrix: str) -> torch.Tensor:
+        """
+        Create embedding matrix by embedding reviews_df and save it to path_to_embedding_matrix, or load it if
+        path_to_embedding_matrix already stores every review. If EMBEDDING_NUM_WORKERS is set, reviews are
+        embedded by the sharded embedding pipeline instead of embedding_matrix_creator.
+
+        :param embedding_matrix_creator: creator of the embedding matrix
+        :param reviews_df: dataframe containing reviews
+        :param path_to_embedding_matrix: path to embedding matrix, next to which the shards are stored
+        :return: embedding matrix
+        """
+        if os.path.exists(path_to_embedding_matrix):
+            embedding_matrix = torch.load(path_to_embedding_matrix)
+            if embedding_matrix.shape[0] == reviews_df.shape[0]:
+                return embedding_matrix
+
+        reviews_df = self._load_review_texts(reviews_df)
+        if self.system_config.get('EMBEDDING_NUM_WORKERS', 0) <= 0:
+            return embedding_matrix_creator.create_embedding_matrix_from_reviews(reviews_df, path_to_embedding_matrix)
+
+        embedding_matrix = self._embed_reviews_in_shards(reviews_df, path_to_embedding_matrix)
+        torch.save(embedding_matrix, path_to_embedding_matrix)
+        return embedding_matrix
+
+    def _embed_reviews_in_shards(self, reviews_df: pd.DataFrame, path_to_embedding_matrix: str) -> torch.Tensor:
+        """
+        Embed reviews_df with the sharded embedding pipeline using EMBEDDING_NUM_WORKERS processes. Shards are
+        stored in a directory next to path_to_embedding_matrix, so that an interrupted run resumes from the
+        shards that are missing and the database and the embedding matrix share the same shards.
+
+        :param reviews_df: dataframe containing reviews
+        :param path_to_embedding_matrix: path to embedding matrix
+        :return: embedding matrix
+        """
+        from information_retriever.embedder.sharded_embedding_pipeline import ShardedEmbeddingPipeline
+
+        model_name = "sebastian-hofstaetter/distilbert-dot-tas_b-b256-msmarco"
+        pipeline = ShardedEmbeddingPipeline(
+            self.system_config.get('IR_EMBEDDER_BACKEND', 'tensorflow'), model_name, model_name,
+            self.system_config['EMBEDDING_NUM_WORKERS'], self.system_config.get('EMBEDDING_SHARD_SIZE', 10000),
+            converted_model_cache_dir=self.system_config.get('IR_CONVERTED_MODEL_CACHE_DIR'))
+        shard_dir = f'{os.path.splitext(path_to_embedding_matrix)[0]}_shards'
+        return torch.from_numpy(pipeline.embed_reviews(reviews_df, shard_dir))
+
     def load_hard_coded_responses(self) -> list[dict]:
         """
         Load config that defines hard coded response.
@@ -1,11 +1,17 @@
-from transformers import AutoTokenizer, TFAutoModel
+import contextlib
+import os
+import re
+import shutil
+
+from transformers import AutoConfig, TFAutoModel
 import tensorflow as tf
 from tensorflow import keras
 from keras import layers
-import torch
 import transformers
 import numpy as np
-from transformers.models.distilbert.tokenization_distilbert_fast import DistilBertTokenizerFast
+
+from information_retriever.embedder.embedder import Embedder
+from information_retriever.embedder.embedding_cache import EmbeddingCache
 
 transformers.logging.set_verbosity_error()
 
@@ -14,72 +20,81 @@ transformers.logging.set_verbosity_error()
 """
 
 
-class BERT_model:
-    _bert_name: str
-    _tokenizer: DistilBertTokenizerFast
-    _bert_model: keras.Model
+class BERT_model(Embedder):
+    _bert_model: keras.Model | tf.Module
     _first_input: str
     _second_input: str
-    _device: torch.device
+    _forward_function: tf.types.experimental.GenericFunction
+    _converted_model_cache_dir: str | None
 
-    def __init__(self, bert_name: str, tokenizer_name: str, from_pt: bool = True):
+    def __init__(self, bert_name: str, tokenizer_name: str, from_pt: bool = True,
+                 embedding_cache: EmbeddingCache = None, warm_up: bool = True,
+                 converted_model_cache_dir: str = None):
         """
+        Embedder running the language model with TensorFlow.
+
         :param bert_name: name or address of language prefernce_matching
         :param tokenizer_name: name or address of the tokenizer
+        :param from_pt: whether to convert the weights of a PyTorch model
+        :param embedding_cache: cache of query embeddings used by get_tensor_embedding and get_tensor_embeddings.
+        If it is None, every query is embedded.
+        :param warm_up: whether to embed a query when created, so that the first query doesn't pay for tracing
+        the forward pass
+        :param converted_model_cache_dir: directory storing the forward pass of models converted from PyTorch
+        checkpoints as TensorFlow SavedModels, so that they are only converted and traced once. If it is None,
+        models are converted every time.
         """
-        self._bert_name = bert_name
-        self._tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
-        self._bert_model, self._first_input, self._second_input = self._create_model(bert_name, from_pt)
-        self._device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        super().__init__(bert_name, tokenizer_name, embedding_cache)
+        self._converted_model_cache_dir = os.path.expanduser(converted_model_cache_dir) \
+            if converted_model_cache_dir is not None else None
+        if from_pt and self._converted_model_cache_dir is not None:
+            self._bert_model, self._forward_function = self._load_cached_forward_function(bert_name)
+        else:
+            self._bert_model, self._first_input, self._second_input = self._create_model(bert_name, from_pt)
+            self._forward_function = self._create_forward_function()
+        if warm_up:
+            self.warm_up()
 
     def embed(self, texts: list[str], strategy=None, bs=48, verbose=0) -> np.ndarray:
         """
-        Embed the batch of texts.
+        Embed the batch of texts. Texts are sorted by length and each batch is only padded to its longest
+        text, so short texts don't pay for a forward pass over 512 tokens.
 
         :param texts: list of strings to be embedded
         :param strategy: Defaults to None.
         :param bs: Defaults to 48.
-        :param verbose: Defaults to 0.
+        :param verbose: whether to show a progress bar. Defaults to 0.
         :return: embeddings of texts
         """
-        tokenized_review = self._tokenizer.batch_encode_plus(
-            texts,
-            max_length=512,
-            add_special_tokens=True,
-            truncation=True,
-            padding="max_length",
-            return_token_type_ids=True,
-        )
+        with strategy.scope() if strategy is not None else contextlib.nullcontext():
+            return super().embed(texts, bs, verbose)
 
-        data = {
-            self._first_input: tokenized_review['input_ids'],
-            self._second_input: tokenized_review['attention_mask'],
-        }
-
-        if strategy is not None:
-            with strategy.scope():
-                dataset = tf.data.Dataset.from_tensor_slices(data).batch(bs, drop_remainder=False).prefetch(
-                    buffer_size=tf.data.experimental.AUTOTUNE)
-                outputs = self._bert_model.predict(dataset, verbose=verbose)
-                return outputs['last_hidden_state'][:, 0, :].reshape(-1, 768)
-        else:
-            dataset = tf.data.Dataset.from_tensor_slices(data).prefetch(
-                buffer_size=tf.data.experimental.AUTOTUNE).batch(bs, drop_remainder=False)
-            outputs = self._bert_model.predict(dataset, verbose=verbose)
-            return outputs['last_hidden_state'][:, 0, :].reshape(-1, 768)
+    def _create_forward_function(self) -> tf.types.experimental.GenericFunction:
+        """
+        Create the forward pass returning CLS embeddings as a function traced once for any batch size and
+        sequence length.
 
-    def get_tensor_embedding(self, query: str) -> torch.Tensor:
+        :return: function taking token ids and attention mask as int32 arrays of shape (batch size, length)
         """
-        Get a tensor embedding of a string.
+        input_signature = [tf.TensorSpec([None, None], tf.int32), tf.TensorSpec([None, None], tf.int32)]
+
+        @tf.function(input_signature=input_signature)
+        def forward(input_ids: tf.Tensor, attention_mask: tf.Tensor) -> tf.Tensor:
+            outputs = self._bert_model({self._first_input: input_ids, self._second_input: attention_mask},
+                                       training=False)
+            return outputs['last_hidden_state'][:, 0, :]
 
-        :param query: string to be embedded
-        :return: tensor embedding of query
+        return forward
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
         """
-        query_embedding = self.embed([query])
-        query_embedding = torch.tensor(query_embedding).to(self._device)
-        query_embedding = query_embedding.squeeze(0)
+        Run the traced forward pass and return the CLS embedding of each text.
 
-        return query_embedding
+        :param input_ids: int32 array of token ids of shape (batch size, length)
+        :param attention_mask: int32 array of shape (batch size, length) that is 0 for padding tokens
+        :return: float32 array of CLS embeddings of shape (batch size, 768)
+        """
+        return self._forward_function(input_ids, attention_mask).numpy()
 
     def _create_model(self, bert_name: str, from_pt: bool = True) -> tuple[keras.Model, str, str]:
         # BERT encoder
@@ -99,3 +114,41 @@ class BERT_model:
 
         model.compile()
         return model, input_ids.name, attention_mask.name
+
+    def _load_cached_forward_function(self, bert_name: str) \
+            -> tuple[tf.Module, tf.types.experimental.GenericFunction]:
+        """
+        Load the forward pass of the model converted from the PyTorch checkpoint of bert_name from the converted
+        model cache, converting the model and saving its forward pass first if it isn't cached. Cached models
+        are keyed by model name and version, which is the commit of hub models and the modification time of
+        local models.
+
+        :param bert_name: name or address of the PyTorch model
+        :return: Returning a tuple with element 0 being the restored SavedModel and element 1 being its forward pass
+        """
+        if os.path.isdir(bert_name):
+            model_key = os.path.abspath(bert_name)
+            version = str(os.stat(bert_name).st_mtime_ns)
+        else:
+            model_key = bert_name
+            version = AutoConfig.from_pretrained(bert_name)._commit_hash or "unknown"
+        path_to_saved_model = os.path.join(self._converted_model_cache_dir,
+                                           f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model_key)}-{version}")
+
+        if not os.path.isdir(path_to_saved_model):
+            self._bert_model, self._first_input, self._second_input = self._create_model(bert_name, True)
+            module = tf.Module()
+            module.bert_model = self._bert_model
+            module.forward = self._create_forward_function()
+
+            # save to a temporary directory first so that other processes never load a partially saved model
+            path_to_tmp_saved_model = f'{path_to_saved_model}.{os.getpid()}.tmp'
+            tf.saved_model.save(module, path_to_tmp_saved_model)
+            try:
+                os.replace(path_to_tmp_saved_model, path_to_saved_model)
+            except OSError:
+                # another process saved the same model first
+                shutil.rmtree(path_to_tmp_saved_model, ignore_errors=True)
+
+        saved_model = tf.saved_model.load(path_to_saved_model)
+        return saved_model, saved_model.forward
@@ -0,0 +1,195 @@
+import copy
+import time
+
+import numpy as np
+import torch
+from tqdm import tqdm
+from transformers import AutoTokenizer, PreTrainedTokenizerBase
+
+from information_retriever.embedder.embedding_cache import EmbeddingCache
+
+
+class Embedder:
+    """
+    Interface of the models that embed texts as the CLS embedding of a BERT like language model. It takes care
+    of tokenizing, batching and caching, while subclasses implement the forward pass with their own runtime.
+
+    :param bert_name: name or address of the language model
+    :param tokenizer_name: name or address of the tokenizer
+    :param embedding_cache: cache of query embeddings used by get_tensor_embedding and get_tensor_embeddings.
+    If it is None, every query is embedded.
+    """
+
+    _bert_name: str
+    _tokenizer: PreTrainedTokenizerBase
+    _device: torch.device
+    _embedding_cache: EmbeddingCache | None
+    _last_tokenize_time: float
+    _last_forward_time: float
+
+    def __init__(self, bert_name: str, tokenizer_name: str, embedding_cache: EmbeddingCache = None):
+        self._bert_name = bert_name
+        self._tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+        self._device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self._embedding_cache = embedding_cache
+        self._last_tokenize_time = 0.0
+        self._last_forward_time = 0.0
+
+    def embed(self, texts: list[str], bs=48, verbose=0) -> np.ndarray:
+        """
+        Embed the batch of texts. Texts are sorted by length and each batch is only padded to its longest
+        text, so short texts don't pay for a forward pass over 512 tokens.
+
+        :param texts: list of strings to be embedded
+        :param bs: Defaults to 48.
+        :param verbose: whether to show a progress bar. Defaults to 0.
+        :return: embeddings of texts
+        """
+        if not texts:
+            return np.empty((0, 768), dtype=np.float32)
+
+        tokenized_review = self._tokenizer.batch_encode_plus(
+            texts,
+            max_length=512,
+            add_special_tokens=True,
+            truncation=True,
+            padding=False,
+            return_attention_mask=False,
+        )
+        input_ids = tokenized_review['input_ids']
+
+        # batches of texts with similar length need little padding
+        order = np.argsort([len(ids) for ids in input_ids], kind='stable')
+        embeddings = np.empty((len(texts), 768), dtype=np.float32)
+        batch_starts = range(0, len(texts), bs)
+        if verbose:
+            batch_starts = tqdm(batch_starts)
+
+        for start in batch_starts:
+            batch_indices = order[start:start + bs]
+            embeddings[batch_indices] = self._embed_batch([input_ids[i] for i in batch_indices])
+        return embeddings
+
+    def get_tensor_embedding(self, query: str) -> torch.Tensor:
+        """
+        Get a tensor embedding of a string.
+
+        :param query: string to be embedded
+        :return: tensor embedding of query
+        """
+        if self._embedding_cache is not None:
+            query_embedding = self._embedding_cache.get(self._get_cache_key(query))
+            if query_embedding is not None:
+                return query_embedding
+
+        query_embedding = torch.tensor(self._embed_query(query)).to(self._device)
+
+        if self._embedding_cache is not None:
+            self._embedding_cache.put(self._get_cache_key(query), query_embedding)
+        return query_embedding
+
+    def get_tensor_embeddings(self, queries: list[str]) -> torch.Tensor:
+        """
+        Get tensor embeddings of a list of strings in a single call to embed.
+
+        :param queries: strings to be embedded
+        :return: tensor whose row i is the embedding of queries[i]
+        """
+        if self._embedding_cache is None:
+            query_embeddings = self.embed(queries)
+            return torch.tensor(query_embeddings).to(self._device)
+
+        cached_embeddings = [self._embedding_cache.get(self._get_cache_key(query)) for query in queries]
+        missing_queries = list(dict.fromkeys(
+            query for query, embedding in zip(queries, cached_embeddings) if embedding is None))
+        if missing_queries:
+            missing_embeddings = torch.tensor(self.embed(missing_queries)).to(self._device)
+            for query, embedding in zip(missing_queries, missing_embeddings):
+                self._embedding_cache.put(self._get_cache_key(query), embedding)
+            missing_embedding_by_query = dict(zip(missing_queries, missing_embeddings))
+            cached_embeddings = [missing_embedding_by_query[query] if embedding is None else embedding
+                                 for query, embedding in zip(queries, cached_embeddings)]
+
+        return torch.stack(cached_embeddings)
+
+    def with_embedding_cache(self, embedding_cache: EmbeddingCache | None) -> "Embedder":
+        """
+        Return an embedder sharing the language model and tokenizer of this one but using its own cache of query
+        embeddings, so that an embedder shared through the embedder registry is never changed by its consumers.
+
+        :param embedding_cache: cache of query embeddings. If it is None, every query is embedded.
+        :return: shallow copy of this embedder using embedding_cache
+        """
+        embedder = copy.copy(self)
+        embedder._embedding_cache = embedding_cache
+        return embedder
+
+    def get_last_query_timing(self) -> dict[str, float]:
+        """
+        Return the time spent embedding the last query that wasn't found in the embedding cache.
+
+        :return: number of seconds spent tokenizing the query ("tokenize") and in the forward pass ("forward")
+        """
+        return {'tokenize': self._last_tokenize_time, 'forward': self._last_forward_time}
+
+    def warm_up(self) -> None:
+        """
+        Embed a query so that one time costs of the forward pass are not paid by the first user query.
+        """
+        self._embed_query("warm up")
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """
+        Run the language model and return the CLS embedding of each text.
+
+        :param input_ids: int32 array of token ids of shape (batch size, length)
+        :param attention_mask: int32 array of shape (batch size, length) that is 0 for padding tokens
+        :return: float32 array of CLS embeddings of shape (batch size, 768)
+        """
+        raise NotImplementedError()
+
+    def _embed_batch(self, input_ids: list[list[int]]) -> np.ndarray:
+        """
+        Embed a batch of tokenized texts padded to the longest of them.
+
+        :param input_ids: token ids of each text
+        :return: CLS embedding of each text
+        """
+        max_length = max(len(ids) for ids in input_ids)
+        padded_input_ids = np.full((len(input_ids), max_length), self._tokenizer.pad_token_id, dtype=np.int32)
+        attention_mask = np.zeros((len(input_ids), max_length), dtype=np.int32)
+        for i, ids in enumerate(input_ids):
+            padded_input_ids[i, :len(ids)] = ids
+            attention_mask[i, :len(ids)] = 1
+
+        return self._forward(padded_input_ids, attention_mask).reshape(-1, 768)
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a single query by calling the forward pass on its token ids directly, and record the time spent
+        tokenizing and in the forward pass.
+
+        :param query: string to be embedded
+        :return: CLS embedding of query
+        """
+        start = time.perf_counter()
+        input_ids = np.asarray([self._tokenizer.encode(query, max_length=512, truncation=True)], dtype=np.int32)
+        attention_mask = np.ones_like(input_ids)
+        tokenized = time.perf_counter()
+        query_embedding = self._forward(input_ids, attention_mask).reshape(768)
+        self._last_tokenize_time = tokenized - start
+        self._last_forward_time = time.perf_counter() - tokenized
+        return query_embedding
+
+    def _get_cache_key(self, query: str) -> tuple[str, str]:
+        """
+        Return the key of the query embedding in the embedding cache. Whitespace is normalized since the
+        tokenizer splits on it, and case is normalized only when the tokenizer lower cases its input.
+
+        :param query: string to be embedded
+        :return: key made of the model name and the normalized query
+        """
+        normalized_query = " ".join(query.split())
+        if getattr(self._tokenizer, 'do_lower_case', False):
+            normalized_query = normalized_query.lower()
+        return self._bert_name, normalized_query
@@ -0,0 +1,27 @@
+from information_retriever.embedder.embedder import Embedder
+from information_retriever.embedder.embedding_cache import EmbeddingCache
+
+
+def create_embedder(backend: str, bert_name: str, tokenizer_name: str, embedding_cache: EmbeddingCache = None,
+                    warm_up: bool = True, converted_model_cache_dir: str = None) -> Embedder:
+    """
+    Create an embedder running the language model with the given backend. The backend module is only imported
+    here, so that processes using the "torch" backend never import TensorFlow.
+
+    :param backend: runtime of the language model, either "tensorflow" or "torch"
+    :param bert_name: name or address of the language model
+    :param tokenizer_name: name or address of the tokenizer
+    :param embedding_cache: cache of query embeddings. If it is None, every query is embedded.
+    :param warm_up: whether to embed a query when created
+    :param converted_model_cache_dir: directory caching models converted from PyTorch checkpoints,
+    used by the "tensorflow" backend
+    :return: embedder
+    """
+    if backend == "tensorflow":
+        from information_retriever.embedder.bert_embedder import BERT_model
+        return BERT_model(bert_name, tokenizer_name, embedding_cache=embedding_cache, warm_up=warm_up,
+                          converted_model_cache_dir=converted_model_cache_dir)
+    elif backend == "torch":
+        from information_retriever.embedder.torch_embedder import TorchEmbedder
+        return TorchEmbedder(bert_name, tokenizer_name, embedding_cache=embedding_cache, warm_up=warm_up)
+    raise ValueError(f'Unknown embedder backend: {backend}')
@@ -0,0 +1,65 @@
+import functools
+import threading
+from typing import Callable
+
+from information_retriever.embedder.embedder import Embedder
+from information_retriever.embedder.embedder_factory import create_embedder
+
+
+class EmbedderRegistry:
+    """
+    Registry of the embedders created in this process, so that each language model is only loaded once and shared
+    by everything that embeds texts with it. Embedders are created the first time they are requested.
+    """
+
+    _embedders: dict[tuple[str, str, str], Embedder]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self._embedders = {}
+        self._lock = threading.Lock()
+
+    def get_embedder(self, backend: str, bert_name: str, tokenizer_name: str,
+                     converted_model_cache_dir: str = None) -> Embedder:
+        """
+        Return the embedder of the given language model and tokenizer, creating it if it wasn't requested before.
+        Embedders are created without embedding cache and without warm up, since they are shared.
+
+        :param backend: runtime running the language model, either "tensorflow" or "torch"
+        :param bert_name: name or address of the language model
+        :param tokenizer_name: name or address of the tokenizer
+        :param converted_model_cache_dir: directory caching models converted from PyTorch checkpoints,
+        used by the "tensorflow" backend
+        :return: embedder
+        """
+        key = (backend, bert_name, tokenizer_name)
+        with self._lock:
+            if key not in self._embedders:
+                self._embedders[key] = create_embedder(backend, bert_name, tokenizer_name, warm_up=False,
+                                                       converted_model_cache_dir=converted_model_cache_dir)
+            return self._embedders[key]
+
+    def get_embedder_loader(self, backend: str, bert_name: str, tokenizer_name: str,
+                            converted_model_cache_dir: str = None) -> Callable[[], Embedder]:
+        """
+        Return a function that returns the embedder of the given language model and tokenizer, so that the
+        language model is only loaded when something needs to be embedded.
+
+        :param backend: runtime running the language model, either "tensorflow" or "torch"
+        :param bert_name: name or address of the language model
+        :param tokenizer_name: name or address of the tokenizer
+        :param converted_model_cache_dir: directory caching models converted from PyTorch checkpoints,
+        used by the "tensorflow" backend
+        :return: function returning the embedder
+        """
+        return functools.partial(self.get_embedder, backend, bert_name, tokenizer_name, converted_model_cache_dir)
+
+    def clear(self) -> None:
+        """
+        Remove every embedder from the registry.
+        """
+        with self._lock:
+            self._embedders.clear()
+
+
+embedder_registry = EmbedderRegistry()
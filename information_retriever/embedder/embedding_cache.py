@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+import torch
+
+
+class EmbeddingCache:
+    """
+    Bounded least recently used cache of embeddings that is safe to share between threads.
+
+    :param max_size: maximum number of embeddings stored in the cache
+    :param ttl: number of seconds an embedding stays in the cache. If it is None, embeddings never expire.
+    """
+
+    _max_size: int
+    _ttl: float | None
+    _embeddings: OrderedDict[Hashable, tuple[torch.Tensor, float]]
+    _lock: threading.Lock
+    _num_hits: int
+    _num_misses: int
+
+    def __init__(self, max_size: int = 1024, ttl: float | None = None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._embeddings = OrderedDict()
+        self._lock = threading.Lock()
+        self._num_hits = 0
+        self._num_misses = 0
+
+    def get(self, key: Hashable) -> torch.Tensor | None:
+        """
+        Return the embedding stored with the given key and mark it as most recently used.
+
+        :param key: key of the embedding
+        :return: copy of the embedding or None if it is not in the cache or expired
+        """
+        with self._lock:
+            entry = self._embeddings.get(key)
+            if entry is not None and self._ttl is not None and time.monotonic() - entry[1] >= self._ttl:
+                del self._embeddings[key]
+                entry = None
+
+            if entry is None:
+                self._num_misses += 1
+                return None
+
+            self._num_hits += 1
+            self._embeddings.move_to_end(key)
+            return entry[0].clone()
+
+    def put(self, key: Hashable, embedding: torch.Tensor) -> None:
+        """
+        Store the embedding with the given key, evicting the least recently used embedding if the cache is full.
+
+        :param key: key of the embedding
+        :param embedding: embedding to store
+        """
+        if self._max_size <= 0:
+            return
+
+        with self._lock:
+            self._embeddings[key] = (embedding.clone(), time.monotonic())
+            self._embeddings.move_to_end(key)
+            while len(self._embeddings) > self._max_size:
+                self._embeddings.popitem(last=False)
+
+    def get_num_hits(self) -> int:
+        """
+        Return the number of calls to get that found an embedding.
+
+        :return: number of cache hits
+        """
+        return self._num_hits
+
+    def get_num_misses(self) -> int:
+        """
+        Return the number of calls to get that didn't find an embedding.
+
+        :return: number of cache misses
+        """
+        return self._num_misses
+
+    def __len__(self) -> int:
+        return len(self._embeddings)
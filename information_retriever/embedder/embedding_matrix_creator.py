@@ -1,10 +1,16 @@
+import json
 import os
+import shutil
+from typing import TYPE_CHECKING, Callable
 
+import numpy as np
 import torch
 import pandas as pd
-import faiss
 from tqdm import tqdm
-from information_retriever.embedder.bert_embedder import BERT_model
+from information_retriever.embedder.embedder import Embedder
+
+if TYPE_CHECKING:
+    import faiss
 
 
 class EmbeddingMatrixCreator:
@@ -12,12 +18,13 @@ class EmbeddingMatrixCreator:
     """
     Class responsible for creating matrix storing all the embeddings.
 
-    :param model: model used to embed reviews
+    :param model: model used to embed reviews, or a function returning it so that the model is only loaded
+    when there are reviews to embed
     """
 
-    _embedding_model: BERT_model
+    _embedding_model: Embedder | Callable[[], Embedder]
 
-    def __init__(self, model: BERT_model):
+    def __init__(self, model: Embedder | Callable[[], Embedder]):
         self._embedding_model = model
 
     def create_embedding_matrix_from_reviews(self, reviews_df: pd.DataFrame, output_filepath=None, batch_size=128,
@@ -25,6 +32,9 @@ class EmbeddingMatrixCreator:
         """
         Create matrix by embedding reviews in reviews_df and save it to given output_filepath.
         If output_filepath is None, don't save the matrix.
+        While embedding, the embeddings of every k batches are appended as a new chunk file in a directory next to
+        output_filepath, so each checkpoint only writes new rows. An interrupted run resumes after the last chunk,
+        and the chunks are stitched into the matrix saved to output_filepath once every review is embedded.
 
         :param reviews_df: data frame that contains "Review" column storing all the reviews to embed
         :param output_filepath: file path to save the matrix
@@ -34,57 +44,160 @@ class EmbeddingMatrixCreator:
         reviews = reviews_df['Review']
 
         if output_filepath is None or not os.path.exists(output_filepath):
-            start_index = 0
             prev_matrix = None
+            start_index = 0
         else:
             prev_matrix = torch.load(output_filepath)
             start_index = prev_matrix.size()[0]
 
-        embeddings = []
-
-        if not start_index == len(reviews):
-            save_number = k * batch_size
-            for i in tqdm(range(start_index, len(reviews), batch_size)):
-                embedding = self._embedding_model.embed(reviews[i:i + batch_size].to_list())
-                embedding = torch.as_tensor(embedding)
-                embeddings.append(embedding)
-                if output_filepath is not None and (i - start_index) % save_number == 0:
-                    if prev_matrix is not None:
-                        prev_matrix = torch.cat((prev_matrix, torch.cat(embeddings)))
-                    else:
-                        prev_matrix = torch.cat(embeddings)
-                    torch.save(prev_matrix, output_filepath)
-                    embeddings = []
-
-        if not embeddings:
+        chunk_dir = f'{output_filepath}.chunks' if output_filepath is not None else None
+        chunk_sizes = self._load_chunk_sizes(chunk_dir) if chunk_dir is not None else []
+
+        if start_index == len(reviews):
+            # chunks left behind by a run interrupted after saving the complete matrix
+            if chunk_dir is not None:
+                shutil.rmtree(chunk_dir, ignore_errors=True)
             return prev_matrix
 
-        new_matrix = torch.cat(embeddings)
+        # every row is written once to its final place, instead of concatenating the matrix at each checkpoint
+        matrix = np.empty((len(reviews), 768), dtype=np.float32)
         if prev_matrix is not None:
-            new_matrix = torch.cat((prev_matrix, new_matrix))
-
+            matrix[:start_index] = prev_matrix.numpy()
+        for chunk, chunk_size in enumerate(chunk_sizes):
+            matrix[start_index:start_index + chunk_size] = np.load(self._get_path_to_chunk(chunk_dir, chunk),
+                                                                   mmap_mode='r')
+            start_index += chunk_size
+
+        saved_index = start_index
+        save_number = k * batch_size
+        for i in tqdm(range(start_index, len(reviews), batch_size)):
+            matrix[i:i + batch_size] = self._get_embedding_model().embed(reviews[i:i + batch_size].to_list())
+            end_index = min(i + batch_size, len(reviews))
+            if chunk_dir is not None and end_index - saved_index >= save_number:
+                chunk_sizes = self._append_chunk(chunk_dir, chunk_sizes, matrix[saved_index:end_index])
+                saved_index = end_index
+
+        matrix = torch.from_numpy(matrix)
         if output_filepath is not None:
-            torch.save(new_matrix, output_filepath)
-        return new_matrix
+            torch.save(matrix, output_filepath)
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+        return matrix
 
     @staticmethod
-    def create_embedding_matrix_from_database(database: faiss.Index, output_filepath=None) -> torch.Tensor:
+    def create_embedding_matrix_from_database(database: 'faiss.Index', output_filepath=None) -> torch.Tensor:
         """
         Create embedding matrix storing all the embeddings of the reviews from vector database.
+        Row i of the matrix is the embedding of the vector with index i, and the rows of vectors removed from
+        the database are 0.
 
         :param database: vector database storing all embeddings
         :param output_filepath: file path to save the embedding matrix
 
         :return: The embedding matrix
         """
-        num_embeddings = database.ntotal
-        embeddings = []
-        for i in range(num_embeddings):
-            embedding = torch.tensor(database.reconstruct(i))
-            embeddings.append(embedding)
+        import faiss
+        from information_retriever.vector_database import VectorDataBase
+
+        vector_ids = VectorDataBase.get_vector_ids(database)
+        is_sequential = vector_ids is None or np.array_equal(np.sort(vector_ids), np.arange(database.ntotal))
+
+        # IVF indexes can only reconstruct vectors once they map ids to their position in the inverted lists,
+        # which must be a hashtable unless the ids are sequential
+        index_ivf = faiss.try_extract_index_ivf(database)
+        if index_ivf is not None and index_ivf.direct_map.type == faiss.DirectMap.NoMap:
+            index_ivf.set_direct_map_type(faiss.DirectMap.Array if is_sequential else faiss.DirectMap.Hashtable)
+
+        if is_sequential:
+            # every vector is copied into a single buffer in one call, which torch shares without copying
+            matrix = torch.from_numpy(database.reconstruct_n(0, database.ntotal))
+        else:
+            # vectors are looked up by index, since reconstruct_n fails on the indices of removed vectors
+            vectors = np.zeros((int(vector_ids.max()) + 1, database.d), dtype=np.float32)
+            vectors[vector_ids] = database.reconstruct_batch(vector_ids)
+            matrix = torch.from_numpy(vectors)
+        if output_filepath is not None:
+            torch.save(matrix, output_filepath)
+        return matrix
+
+
+    @staticmethod
+    def create_item_embedding_matrix(reviews_embedding_matrix: torch.Tensor, review_item_ids: np.ndarray,
+                                     output_filepath=None) -> torch.Tensor:
+        """
+        Create matrix storing the pooled embedding of each item, which is the mean of the embeddings of its
+        reviews. Row i of the matrix corresponds to the i-th item in the order the items first appear in
+        review_item_ids, as in SearchEngine, so reviews of the same item don't need to be next to each other.
+
+        :param reviews_embedding_matrix: matrix storing the embedding of each review
+        :param review_item_ids: item ids corresponding to reviews
+        :param output_filepath: file path to save the item embedding matrix
+
+        :return: The item embedding matrix
+        """
+        review_item_index, item_ids = pd.factorize(review_item_ids)
+        review_item_index = torch.from_numpy(review_item_index.astype(np.int64))
+        num_items = item_ids.size
+
+        reviews_embedding_matrix = reviews_embedding_matrix.to(torch.float32)
+        matrix = torch.zeros(num_items, reviews_embedding_matrix.size(1)).index_add_(
+            0, review_item_index, reviews_embedding_matrix)
+        matrix /= torch.bincount(review_item_index, minlength=num_items).unsqueeze(1)
 
-        matrix = torch.stack(embeddings)
         if output_filepath is not None:
             torch.save(matrix, output_filepath)
         return matrix
 
+    def _get_embedding_model(self) -> Embedder:
+        """
+        Return the model used to embed reviews, loading it first if it was given as a function.
+
+        :return: model used to embed reviews
+        """
+        if not isinstance(self._embedding_model, Embedder):
+            self._embedding_model = self._embedding_model()
+        return self._embedding_model
+
+    def _append_chunk(self, chunk_dir: str, chunk_sizes: list[int], embeddings: np.ndarray) -> list[int]:
+        """
+        Save embeddings as a new chunk in chunk_dir and record it in the manifest of chunk_dir.
+
+        :param chunk_dir: directory storing the chunks of the embedding matrix
+        :param chunk_sizes: number of rows of each chunk already in chunk_dir
+        :param embeddings: embeddings to save
+        :return: number of rows of each chunk in chunk_dir
+        """
+        os.makedirs(chunk_dir, exist_ok=True)
+        np.save(self._get_path_to_chunk(chunk_dir, len(chunk_sizes)), embeddings)
+        chunk_sizes = chunk_sizes + [embeddings.shape[0]]
+
+        # the chunk only counts once the manifest listing it is replaced, so a partial chunk is never loaded
+        path_to_manifest = os.path.join(chunk_dir, 'manifest.json')
+        with open(f'{path_to_manifest}.tmp', 'w') as f:
+            json.dump({'chunk_sizes': chunk_sizes}, f)
+        os.replace(f'{path_to_manifest}.tmp', path_to_manifest)
+        return chunk_sizes
+
+    @staticmethod
+    def _load_chunk_sizes(chunk_dir: str) -> list[int]:
+        """
+        Load the number of rows of each chunk recorded in the manifest of chunk_dir.
+
+        :param chunk_dir: directory storing the chunks of the embedding matrix
+        :return: number of rows of each chunk, or an empty list if chunk_dir has no manifest
+        """
+        path_to_manifest = os.path.join(chunk_dir, 'manifest.json')
+        if not os.path.exists(path_to_manifest):
+            return []
+        with open(path_to_manifest) as f:
+            return json.load(f)['chunk_sizes']
+
+    @staticmethod
+    def _get_path_to_chunk(chunk_dir: str, chunk: int) -> str:
+        """
+        Return the path to the file storing the given chunk.
+
+        :param chunk_dir: directory storing the chunks of the embedding matrix
+        :param chunk: index of the chunk
+        :return: path to the file storing the chunk
+        """
+        return os.path.join(chunk_dir, f'chunk_{chunk:05d}.npy')
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+
+class ShardedEmbeddingPipeline:
+    """
+    Pipeline embedding a large number of reviews across a pool of processes. Reviews are split into shards of
+    consecutive reviews, each shard is embedded by one worker and saved to its own file, and a manifest records
+    the shards that are complete, so that an interrupted run resumes from the shards that are missing.
+
+    :param backend: runtime running the language model, either "tensorflow" or "torch"
+    :param bert_name: name or address of the language model
+    :param tokenizer_name: name or address of the tokenizer
+    :param num_workers: number of processes embedding shards. If it is None, one process is used per core.
+    If it is 1, shards are embedded in this process.
+    :param shard_size: number of reviews in each shard
+    :param batch_size: size of each batch when embedding
+    :param converted_model_cache_dir: directory caching models converted from PyTorch checkpoints,
+    used by the "tensorflow" backend
+    """
+
+    _backend: str
+    _bert_name: str
+    _tokenizer_name: str
+    _num_workers: int
+    _shard_size: int
+    _batch_size: int
+    _converted_model_cache_dir: str | None
+
+    def __init__(self, backend: str, bert_name: str, tokenizer_name: str, num_workers: int = None,
+                 shard_size: int = 10000, batch_size: int = 128, converted_model_cache_dir: str = None):
+        self._backend = backend
+        self._bert_name = bert_name
+        self._tokenizer_name = tokenizer_name
+        self._num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self._shard_size = shard_size
+        self._batch_size = batch_size
+        self._converted_model_cache_dir = converted_model_cache_dir
+
+    def embed_reviews(self, reviews_df: pd.DataFrame, shard_dir: str) -> np.ndarray:
+        """
+        Embed reviews in reviews_df, saving the embeddings of each shard to shard_dir, and return the merged
+        embeddings. Shards that are already complete in shard_dir are not embedded again.
+
+        :param reviews_df: data frame that contains "Review" column storing all the reviews to embed
+        :param shard_dir: directory storing the embeddings of each shard and the manifest
+        :return: embeddings of the reviews, where row i is the embedding of the i-th review
+        """
+        reviews = reviews_df['Review'].astype(str).to_list()
+        os.makedirs(shard_dir, exist_ok=True)
+        manifest = self._load_manifest(reviews, shard_dir)
+
+        num_shards = (len(reviews) + self._shard_size - 1) // self._shard_size
+        completed_shards = set(manifest['completed_shards'])
+        missing_shards = [shard for shard in range(num_shards) if shard not in completed_shards
+                          or not os.path.exists(self._get_path_to_shard(shard_dir, shard))]
+
+        for shard in tqdm(self._embed_shards(reviews, shard_dir, missing_shards), total=len(missing_shards)):
+            completed_shards.add(shard)
+            manifest['completed_shards'] = sorted(completed_shards)
+            self._save_manifest(manifest, shard_dir)
+
+        return self.merge_shards(shard_dir)
+
+    def merge_shards(self, shard_dir: str) -> np.ndarray:
+        """
+        Concatenate the embeddings of every shard in shard_dir in order.
+
+        :param shard_dir: directory storing the embeddings of each shard and the manifest
+        :return: embeddings of the reviews, where row i is the embedding of the i-th review
+        """
+        with open(os.path.join(shard_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        num_reviews = manifest['num_reviews']
+        num_shards = (num_reviews + manifest['shard_size'] - 1) // manifest['shard_size']
+        if len(manifest['completed_shards']) != num_shards:
+            raise ValueError(f'Only {len(manifest["completed_shards"])} of {num_shards} shards in {shard_dir} '
+                             f'are complete')
+
+        embeddings = np.empty((num_reviews, 768), dtype=np.float32)
+        for shard in range(num_shards):
+            start = shard * manifest['shard_size']
+            embeddings[start:start + manifest['shard_size']] = np.load(self._get_path_to_shard(shard_dir, shard),
+                                                                       mmap_mode='r')
+        return embeddings
+
+    def _embed_shards(self, reviews: list[str], shard_dir: str, shards: list[int]) -> Iterator[int]:
+        """
+        Embed the given shards and save each of them to shard_dir, yielding each shard once it is saved.
+
+        :param reviews: all the reviews
+        :param shard_dir: directory storing the embeddings of each shard
+        :param shards: indices of the shards to embed
+        :return: generator of the indices of the shards that are saved
+        """
+        shard_args = [
+            (self._backend, self._bert_name, self._tokenizer_name, self._converted_model_cache_dir,
+             reviews[shard * self._shard_size:(shard + 1) * self._shard_size], self._batch_size,
+             self._get_path_to_shard(shard_dir, shard))
+            for shard in shards
+        ]
+
+        if self._num_workers <= 1 or len(shards) <= 1:
+            for shard, args in zip(shards, shard_args):
+                _embed_shard(*args)
+                yield shard
+            return
+
+        # each worker loads its own model, and the cores are split between workers so they don't compete
+        num_workers = min(self._num_workers, len(shards))
+        num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        # language model runtimes are not safe to fork, so workers start from a fresh interpreter
+        with ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_initialize_worker, initargs=(num_threads,)) as executor:
+            futures = {executor.submit(_embed_shard, *args): shard for shard, args in zip(shards, shard_args)}
+            for future in as_completed(futures):
+                future.result()
+                yield futures[future]
+
+    def _load_manifest(self, reviews: list[str], shard_dir: str) -> dict:
+        """
+        Load the manifest in shard_dir, or create a new one if shard_dir doesn't have one. The manifest stores
+        the model, the shard size and a hash of the reviews, so that shards are never merged with shards
+        embedded from other reviews or with another model.
+
+        :param reviews: all the reviews
+        :param shard_dir: directory storing the embeddings of each shard and the manifest
+        :return: manifest
+        """
+        reviews_hash = hashlib.sha1()
+        for review in reviews:
+            reviews_hash.update(review.encode('utf-8'))
+            reviews_hash.update(b'\0')
+
+        manifest = {
+            'bert_name': self._bert_name,
+            'tokenizer_name': self._tokenizer_name,
+            'num_reviews': len(reviews),
+            'reviews_hash': reviews_hash.hexdigest(),
+            'shard_size': self._shard_size,
+            'completed_shards': [],
+        }
+
+        path_to_manifest = os.path.join(shard_dir, 'manifest.json')
+        if not os.path.exists(path_to_manifest):
+            self._save_manifest(manifest, shard_dir)
+            return manifest
+
+        with open(path_to_manifest) as f:
+            saved_manifest = json.load(f)
+        if {**saved_manifest, 'completed_shards': []} != manifest:
+            raise ValueError(f'Shards in {shard_dir} were embedded from other reviews or with other settings')
+        return saved_manifest
+
+    @staticmethod
+    def _save_manifest(manifest: dict, shard_dir: str) -> None:
+        """
+        Save manifest to shard_dir, replacing the previous manifest atomically.
+
+        :param manifest: manifest to save
+        :param shard_dir: directory storing the embeddings of each shard and the manifest
+        """
+        path_to_manifest = os.path.join(shard_dir, 'manifest.json')
+        path_to_tmp_manifest = f'{path_to_manifest}.{os.getpid()}.tmp'
+        with open(path_to_tmp_manifest, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(path_to_tmp_manifest, path_to_manifest)
+
+    @staticmethod
+    def _get_path_to_shard(shard_dir: str, shard: int) -> str:
+        """
+        Return the path to the file storing the embeddings of the given shard.
+
+        :param shard_dir: directory storing the embeddings of each shard
+        :param shard: index of the shard
+        :return: path to the file storing the embeddings of the shard
+        """
+        return os.path.join(shard_dir, f'shard_{shard:05d}.npy')
+
+
+def _initialize_worker(num_threads: int) -> None:
+    """
+    Limit the number of threads used by the language model in a worker process.
+
+    :param num_threads: number of threads the worker can use
+    """
+    # TensorFlow reads these when it is first imported, which happens after this in a spawned worker
+    os.environ['OMP_NUM_THREADS'] = str(num_threads)
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(num_threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+
+    import torch
+    torch.set_num_threads(num_threads)
+
+
+def _embed_shard(backend: str, bert_name: str, tokenizer_name: str, converted_model_cache_dir: str | None,
+                 reviews: list[str], batch_size: int, path_to_shard: str) -> None:
+    """
+    Embed the reviews of a shard and save their embeddings to path_to_shard. The model is loaded once per process.
+
+    :param backend: runtime running the language model, either "tensorflow" or "torch"
+    :param bert_name: name or address of the language model
+    :param tokenizer_name: name or address of the tokenizer
+    :param converted_model_cache_dir: directory caching models converted from PyTorch checkpoints
+    :param reviews: reviews of the shard
+    :param batch_size: size of each batch when embedding
+    :param path_to_shard: path to the file storing the embeddings of the shard
+    """
+    from information_retriever.embedder.embedder_registry import embedder_registry
+
+    embedder = embedder_registry.get_embedder(backend, bert_name, tokenizer_name, converted_model_cache_dir)
+    embeddings = embedder.embed(reviews, bs=batch_size)
+
+    # write to a temporary file first so that an interrupted worker never leaves a partial shard behind
+    path_to_tmp_shard = f'{path_to_shard}.{os.getpid()}.tmp'
+    with open(path_to_tmp_shard, 'wb') as f:
+        np.save(f, embeddings)
+    os.replace(path_to_tmp_shard, path_to_shard)
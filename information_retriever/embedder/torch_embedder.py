@@ -0,0 +1,44 @@
+import numpy as np
+import torch
+import transformers
+from transformers import AutoModel, PreTrainedModel
+
+from information_retriever.embedder.embedder import Embedder
+from information_retriever.embedder.embedding_cache import EmbeddingCache
+
+transformers.logging.set_verbosity_error()
+
+
+class TorchEmbedder(Embedder):
+    """
+    Embedder running the language model with PyTorch, so that TensorFlow is never imported.
+
+    :param bert_name: name or address of the language model
+    :param tokenizer_name: name or address of the tokenizer
+    :param embedding_cache: cache of query embeddings used by get_tensor_embedding and get_tensor_embeddings.
+    If it is None, every query is embedded.
+    :param warm_up: whether to embed a query when created, so that the first query doesn't pay for one time costs
+    of the forward pass
+    """
+
+    _bert_model: PreTrainedModel
+
+    def __init__(self, bert_name: str, tokenizer_name: str, embedding_cache: EmbeddingCache = None,
+                 warm_up: bool = True):
+        super().__init__(bert_name, tokenizer_name, embedding_cache)
+        self._bert_model = AutoModel.from_pretrained(bert_name).to(self._device).eval()
+        if warm_up:
+            self.warm_up()
+
+    def _forward(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """
+        Run the language model and return the CLS embedding of each text.
+
+        :param input_ids: int32 array of token ids of shape (batch size, length)
+        :param attention_mask: int32 array of shape (batch size, length) that is 0 for padding tokens
+        :return: float32 array of CLS embeddings of shape (batch size, 768)
+        """
+        with torch.inference_mode():
+            outputs = self._bert_model(input_ids=torch.from_numpy(input_ids).to(self._device, torch.int64),
+                                       attention_mask=torch.from_numpy(attention_mask).to(self._device))
+            return outputs.last_hidden_state[:, 0, :].cpu().numpy()
@@ -1,11 +1,14 @@
 import os
+from typing import Callable
 
+import numpy as np
 import torch
 import faiss
 from tqdm import tqdm
 import pandas as pd
 
-from information_retriever.embedder.bert_embedder import BERT_model
+from information_retriever.embedder.embedder import Embedder
+from information_retriever.vector_database import VectorDataBase
 
 
 class VectorDatabaseCreator:
@@ -13,13 +16,30 @@ class VectorDatabaseCreator:
     """
     Class responsible for creating vector database storing all the embeddings.
 
-    :param model: model used to embed reviews
+    :param model: model used to embed reviews, or a function returning it so that the model is only loaded
+    when there are reviews to embed
+    :param index_type: type of FAISS index to create, one of "flat", "ivf flat", "ivf pq" or "hnsw"
+    :param nlist: number of inverted lists of IVF indexes
+    :param pq_m: number of sub-quantizers of IVF PQ indexes, must divide the embedding dimension
+    :param hnsw_m: number of neighbours of each vector in HNSW indexes
+    :param num_training_vectors: maximum number of embeddings used to train IVF indexes
     """
 
-    _embedding_model: BERT_model
+    _embedding_model: Embedder | Callable[[], Embedder]
+    _index_type: str
+    _nlist: int
+    _pq_m: int
+    _hnsw_m: int
+    _num_training_vectors: int
 
-    def __init__(self, model: BERT_model):
+    def __init__(self, model: Embedder | Callable[[], Embedder], index_type: str = "flat", nlist: int = 1024,
+                 pq_m: int = 64, hnsw_m: int = 32, num_training_vectors: int = 100000):
         self._embedding_model = model
+        self._index_type = index_type
+        self._nlist = nlist
+        self._pq_m = pq_m
+        self._hnsw_m = hnsw_m
+        self._num_training_vectors = num_training_vectors
 
     def create_vector_database_from_reviews(self, reviews_df: pd.DataFrame, output_filepath=None, batch_size=128,
                                             k=10) -> faiss.Index:
@@ -36,17 +56,33 @@ class VectorDatabaseCreator:
 
         if output_filepath is not None and os.path.exists(output_filepath):
             index = faiss.read_index(output_filepath)
-            start_index = index.ntotal
+            start_index = self._get_next_vector_id(index)
         else:
             dimension_size = 768
-            index = faiss.IndexFlatIP(dimension_size)
+            index = self._create_index(dimension_size)
             start_index = 0
 
+        training_indices = np.zeros(0, dtype=np.int64)
+        training_embeddings = np.zeros((0, index.d), dtype=np.float32)
+        if not index.is_trained:
+            # approximate indexes must be trained before adding embeddings. Reviews of the same item are next to
+            # each other, so they are trained on a random sample of the reviews, whose embeddings are kept to be
+            # added with the other reviews
+            training_indices = self._sample_training_indices(len(reviews))
+            training_embeddings = np.concatenate([
+                self._get_embedding_model().embed(reviews.iloc[training_indices[i:i + batch_size]].to_list())
+                for i in tqdm(range(0, training_indices.size, batch_size))
+            ])
+            index.train(training_embeddings)
+            if output_filepath is not None:
+                faiss.write_index(index, output_filepath)
+
         if start_index < len(reviews):
             save_number = k * batch_size
             for i in tqdm(range(start_index, len(reviews), batch_size)):
-                embedding = self._embedding_model.embed(reviews[i:i + batch_size].to_list())
-                index.add(embedding)
+                embedding = self._embed_reviews(reviews, i, min(i + batch_size, len(reviews)), training_indices,
+                                                training_embeddings)
+                self._add_embeddings(index, embedding, i)
                 if output_filepath is not None and (i - start_index) % save_number == 0:
                     faiss.write_index(index, output_filepath)
 
@@ -58,12 +94,131 @@ class VectorDatabaseCreator:
     @staticmethod
     def create_vector_database_from_matrix(embedding_matrix: torch.Tensor, output_filepath=None) -> faiss.Index:
         """
-        Create vector database storing all the embeddings of the reviws from embedding matrix.
+        Create flat vector database storing all the embeddings of the reviws from embedding matrix.
+        Use create_configured_vector_database_from_matrix to create the index type of the creator.
 
         :param embedding_matrix: matrix storing all embeddings
         """
         index = faiss.IndexFlatIP(embedding_matrix.shape[1])
-        index.add(embedding_matrix.numpy())
+        index.add(np.ascontiguousarray(embedding_matrix.numpy(), dtype=np.float32))
         if output_filepath is not None:
             faiss.write_index(index, output_filepath)
         return index
+
+    def create_configured_vector_database_from_matrix(self, embedding_matrix: torch.Tensor,
+                                                      output_filepath=None) -> faiss.Index:
+        """
+        Create vector database of the configured index type storing all the embeddings of the reviws from
+        embedding matrix.
+
+        :param embedding_matrix: matrix storing all embeddings
+        """
+        embeddings = np.ascontiguousarray(embedding_matrix.numpy(), dtype=np.float32)
+        index = self._create_index(embedding_matrix.shape[1])
+        if not index.is_trained:
+            index.train(embeddings[self._sample_training_indices(embeddings.shape[0])])
+        self._add_embeddings(index, embeddings)
+        if output_filepath is not None:
+            faiss.write_index(index, output_filepath)
+        return index
+
+    def _get_embedding_model(self) -> Embedder:
+        """
+        Return the model used to embed reviews, loading it first if it was given as a function.
+
+        :return: model used to embed reviews
+        """
+        if not isinstance(self._embedding_model, Embedder):
+            self._embedding_model = self._embedding_model()
+        return self._embedding_model
+
+    def _sample_training_indices(self, num_vectors: int) -> np.ndarray:
+        """
+        Return the sorted indices of a random sample of at most num_training_vectors vectors used to train
+        approximate indexes.
+
+        :param num_vectors: number of vectors to sample from
+        :return: sorted indices of the sampled vectors
+        """
+        return np.sort(np.random.default_rng(0).permutation(num_vectors)[:self._num_training_vectors])
+
+    def _embed_reviews(self, reviews: pd.Series, start: int, end: int, embedded_indices: np.ndarray,
+                       embeddings: np.ndarray) -> np.ndarray:
+        """
+        Embed the reviews from start up to (not including) end, reusing the embeddings of the reviews that
+        were already embedded.
+
+        :param reviews: reviews to embed
+        :param start: index of the first review to embed
+        :param end: index following the last review to embed
+        :param embedded_indices: sorted indices of the reviews that were already embedded
+        :param embeddings: embeddings of the reviews in embedded_indices, one per row
+        :return: embeddings of the reviews, one per row
+        """
+        review_indices = np.arange(start, end)
+        is_embedded = np.isin(review_indices, embedded_indices)
+        if not is_embedded.any():
+            return self._get_embedding_model().embed(reviews.iloc[start:end].to_list())
+
+        review_embeddings = np.empty((review_indices.size, embeddings.shape[1]), dtype=np.float32)
+        review_embeddings[is_embedded] = embeddings[np.searchsorted(embedded_indices, review_indices[is_embedded])]
+        if not is_embedded.all():
+            review_embeddings[~is_embedded] = self._get_embedding_model().embed(
+                reviews.iloc[review_indices[~is_embedded]].to_list())
+        return review_embeddings
+
+    def _create_index(self, dimension_size: int) -> faiss.Index:
+        """
+        Create an empty FAISS index of the configured type that scores vectors by inner product. Each vector is
+        identified by the index of its review, so that reviews can later be added and removed without rebuilding
+        the index. IVF indexes store these indices themselves, while the other indexes are wrapped in a
+        faiss.IndexIDMap2.
+
+        :param dimension_size: dimension of the embeddings
+        :return: empty FAISS index
+        """
+        if self._index_type == "flat":
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension_size))
+        elif self._index_type == "ivf flat":
+            index_description = f'IVF{self._nlist},Flat'
+        elif self._index_type == "ivf pq":
+            index_description = f'IVF{self._nlist},PQ{self._pq_m}'
+        elif self._index_type == "hnsw":
+            return faiss.IndexIDMap2(faiss.index_factory(dimension_size, f'HNSW{self._hnsw_m},Flat',
+                                                         faiss.METRIC_INNER_PRODUCT))
+        else:
+            raise ValueError(f'Unknown vector database index type: {self._index_type}')
+        return faiss.index_factory(dimension_size, index_description, faiss.METRIC_INNER_PRODUCT)
+
+    @staticmethod
+    def _add_embeddings(index: faiss.Index, embeddings: np.ndarray, first_vector_id: int = None) -> None:
+        """
+        Add embeddings identified by the index of their review, which follows the largest index in the index
+        unless it is given.
+
+        :param index: FAISS index
+        :param embeddings: embeddings to add, one per row
+        :param first_vector_id: index of the review of the first embedding
+        """
+        if first_vector_id is None:
+            first_vector_id = VectorDatabaseCreator._get_next_vector_id(index)
+        if isinstance(index, faiss.IndexIDMap2) or faiss.try_extract_index_ivf(index) is not None:
+            index.add_with_ids(embeddings, np.arange(first_vector_id, first_vector_id + embeddings.shape[0]))
+        elif first_vector_id == index.ntotal:
+            index.add(embeddings)
+        else:
+            raise ValueError("Embeddings can only be added after the last embedding of a database without ids")
+
+    @staticmethod
+    def _get_next_vector_id(index: faiss.Index) -> int:
+        """
+        Return the index following the largest index of a vector in the index, which is not the number of vectors
+        once vectors have been removed.
+
+        :param index: FAISS index
+        :return: index of the next vector
+        """
+        vector_ids = VectorDataBase.get_vector_ids(index)
+        if vector_ids is None:
+            return index.ntotal
+        return int(vector_ids.max()) + 1 if vector_ids.size > 0 else 0
@@ -1,5 +1,7 @@
+from information_retriever.filter.field_value_index import FieldValueIndex
 from information_retriever.filter.filter import Filter
 from state.state_manager import StateManager
+import numpy as np
 import pandas as pd
 import logging
 
@@ -19,19 +21,36 @@ class ExactWordMatchingFilter(Filter):
 
     _constraint_keys: list[str]
     _metadata_field: str
+    _indexed_metadata: pd.DataFrame | None
+    _field_value_index: FieldValueIndex | None
 
     def __init__(self, constraint_keys: list[str], metadata_field: str) -> None:
         self._constraint_keys = constraint_keys
         self._metadata_field = metadata_field
+        self._indexed_metadata = None
+        self._field_value_index = None
 
-    def filter(self, state_manager: StateManager,
-               metadata: pd.DataFrame) -> pd.DataFrame:
+    def prepare(self, metadata: pd.DataFrame) -> None:
         """
-        Return a filtered version of metadata pandas dataframe.
+        Index the words in the specified metadata field.
+
+        :param metadata: items' metadata
+        """
+        self._field_value_index = FieldValueIndex(metadata[self._metadata_field])
+        self._indexed_metadata = metadata
+
+    def get_mask(self, state_manager: StateManager, metadata: pd.DataFrame, mask: np.ndarray) -> np.ndarray:
+        """
+        Return a boolean mask that is true for the items that are kept. Items are kept if for all constraint
+        values, a word in the constraint matches exactly with a word in the specified metadata field (case
+        insensitive). If none of the items kept by the previous filters matches every constraint value, items
+        that match any constraint value are kept. Items whose value in the metadata field is neither a list nor
+        a string are always kept.
 
         :param state_manager: current state
         :param metadata: items' metadata
-        :return: filtered version of metadata pandas dataframe
+        :param mask: boolean mask that is true for the items kept by the previous filters
+        :return: boolean mask that is true for the items that are kept
         """
         constraint_values = []
         for constraint_key in self._constraint_keys:
@@ -41,70 +60,22 @@ class ExactWordMatchingFilter(Filter):
                 constraint_values.extend(constraint_value)
 
         if not constraint_values:
-            return metadata
+            return mask
 
-        item_match = metadata.apply(
-            self._does_item_match_constraint_fully, args=(constraint_values,), axis=1)
+        if metadata is not self._indexed_metadata:
+            self.prepare(metadata)
 
-        filtered_metadata = metadata.loc[item_match]
-        if filtered_metadata.shape[0] == 0:
-            logger.debug("Partial filtering applied")
-            item_match = metadata.apply(
-                self._does_item_match_constraint_partially, args=(constraint_values,), axis=1)
-            filtered_metadata = metadata.loc[item_match]
-
-        return filtered_metadata
-
-    def _does_item_match_constraint_fully(self,  row_of_df: pd.Series, constraint_values: list[str]) -> bool:
-        """
-        Return true if for all constraint values, a word in the constraint matches exactly with a word
-        in the specified metadata field or a word in the specified metadata field
-        matches exactly with a word in the constraint, false otherwise.
-        If the constraint of interest is empty, it will return true.
-        Might not work well if the value in the metadata filed is a dictionary.
+        # each item has each word at most once, so it matches every constraint value when it matches as many
+        # distinct constraint values as there are
+        distinct_constraint_values = dict.fromkeys(value.lower().strip() for value in constraint_values)
+        num_matches = np.zeros(metadata.shape[0], dtype=np.int64)
+        for constraint_value in distinct_constraint_values:
+            num_matches[self._field_value_index.get_positions(constraint_value)] += 1
 
-        :return: true if the item match the constraint, false otherwise
-        """
-        item_metadata_field_values = row_of_df[self._metadata_field]
-
-        if not isinstance(item_metadata_field_values, list):
-            if isinstance(item_metadata_field_values, str):
-                item_metadata_field_values = item_metadata_field_values.split(",")
-            else:
-                return True
-
-        for constraint_value in constraint_values:
-            is_constraint_in_metadata = False
-            for metadata_field_value in item_metadata_field_values:
-                if constraint_value.lower().strip() == metadata_field_value.lower().strip():
-                    is_constraint_in_metadata = True
-                    break
-            if not is_constraint_in_metadata:
-                return False
-        return True
-
-    def _does_item_match_constraint_partially(self, row_of_df: pd.Series, constraint_values: list[str]) -> bool:
-        """
-        Return true if there exists constraint value such that a word in the constraint matches exactly with a word
-        in the specified metadata field or a word in the specified metadata field
-        matches exactly with a word in the constraint, false otherwise.
-        If the constraint of interest is empty, it will return true.
-        Might not work well if the value in the metadata filed is a dictionary.
-
-        :return: true if the item match the constraint, false otherwise
-        """
-        item_metadata_field_values = row_of_df[self._metadata_field]
-
-        if not isinstance(item_metadata_field_values, list):
-            if isinstance(item_metadata_field_values, str):
-                item_metadata_field_values = item_metadata_field_values.split(",")
-            else:
-                return True
-
-        for metadata_field_value in item_metadata_field_values:
-            for constraint_value in constraint_values:
-
-                if constraint_value.lower().strip() == metadata_field_value.lower().strip():
-                    return True
+        unindexed_mask = self._field_value_index.get_unindexed_mask()
+        item_match = mask & (unindexed_mask | (num_matches == len(distinct_constraint_values)))
+        if not item_match.any():
+            logger.debug("Partial filtering applied")
+            item_match = mask & (unindexed_mask | (num_matches > 0))
 
-        return False
+        return item_match
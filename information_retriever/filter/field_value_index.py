@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+
+class FieldValueIndex:
+    """
+    Inverted index of the values of a metadata field. The value of each item is split into terms, which are the
+    elements of a list or the comma separated parts of a string, and each term is lower cased and stripped.
+    Each term has the positions of the items having it. Items whose value is neither a list nor a string have
+    no terms and are unindexed.
+
+    :param field_values: value of the metadata field of each item
+    """
+
+    _term_positions: dict[str, np.ndarray]
+    _is_unindexed: np.ndarray
+
+    def __init__(self, field_values: pd.Series):
+        term_positions = {}
+        self._is_unindexed = np.zeros(field_values.shape[0], dtype=bool)
+        for position, item_field_values in enumerate(field_values.to_numpy()):
+            if isinstance(item_field_values, str):
+                item_field_values = item_field_values.split(",")
+            elif not isinstance(item_field_values, list):
+                self._is_unindexed[position] = True
+                continue
+
+            for term in {value.lower().strip() for value in item_field_values if isinstance(value, str)}:
+                term_positions.setdefault(term, []).append(position)
+
+        self._term_positions = {term: np.array(positions, dtype=np.int64)
+                                for term, positions in term_positions.items()}
+
+    def get_terms(self) -> list[str]:
+        """
+        Return every term of the field.
+
+        :return: terms of the field
+        """
+        return list(self._term_positions)
+
+    def get_positions(self, term: str) -> np.ndarray:
+        """
+        Return the positions of the items having the term, each at most once.
+
+        :param term: lower cased and stripped term
+        :return: positions of the items having the term
+        """
+        return self._term_positions.get(term, np.zeros(0, dtype=np.int64))
+
+    def get_unindexed_mask(self) -> np.ndarray:
+        """
+        Return a boolean mask that is true for the items whose value is neither a list nor a string.
+
+        :return: boolean mask over the items
+        """
+        return self._is_unindexed
@@ -1,10 +1,17 @@
+from typing import Any, Callable
+
 from state.state_manager import StateManager
+import numpy as np
 import pandas as pd
 
 
 class Filter:
     """"
     Responsible to do filtering and return a filtered version of metadata pandas dataframe.
+
+    Filters implement either get_mask, which returns which items are kept without copying metadata, or filter.
+    Filters that only implement filter keep working with get_mask, which calls filter on a copy of the kept
+    items.
     """
 
     def filter(self, state_manager: StateManager,
@@ -16,4 +23,51 @@ class Filter:
         :param metadata: items' metadata
         :return: filtered version of metadata pandas dataframe
         """
-        raise NotImplementedError()
+        if type(self).get_mask is Filter.get_mask:
+            raise NotImplementedError()
+        return metadata.loc[self.get_mask(state_manager, metadata, np.ones(metadata.shape[0], dtype=bool))]
+
+    def prepare(self, metadata: pd.DataFrame) -> None:
+        """
+        Precompute the structures used to filter metadata, so that they are not computed for every query.
+        metadata is shared and must not be modified.
+
+        :param metadata: items' metadata
+        """
+
+    def get_mask(self, state_manager: StateManager, metadata: pd.DataFrame, mask: np.ndarray) -> np.ndarray:
+        """
+        Return a boolean mask over the rows of metadata that is true for the items that are kept. Only items
+        kept by the previous filters, for which mask is true, can be kept. metadata is shared and must not be
+        modified.
+
+        :param state_manager: current state
+        :param metadata: items' metadata
+        :param mask: boolean mask that is true for the items kept by the previous filters
+        :return: boolean mask that is true for the items that are kept
+        """
+        if type(self).filter is Filter.filter:
+            raise NotImplementedError()
+        filtered_metadata = self.filter(state_manager, metadata.loc[mask])
+        return mask & metadata.index.isin(filtered_metadata.index)
+
+    @staticmethod
+    def _get_mask_of_kept_items(field_values: pd.Series, mask: np.ndarray, does_item_match: Callable[..., bool],
+                                *args: Any) -> np.ndarray:
+        """
+        Return a boolean mask that is true for the items kept by mask whose value in the metadata field matches.
+        Items that are not kept by mask are not checked.
+
+        :param field_values: value of the metadata field of each item
+        :param mask: boolean mask that is true for the items kept by the previous filters
+        :param does_item_match: function returning whether an item is kept given its value in the metadata field
+        and args
+        :param args: other arguments of does_item_match
+        :return: boolean mask that is true for the items that are kept
+        """
+        field_values = field_values.to_numpy()
+        kept_positions = np.flatnonzero(mask)
+        new_mask = np.zeros(mask.shape[0], dtype=bool)
+        new_mask[kept_positions] = [bool(does_item_match(field_values[position], *args))
+                                    for position in kept_positions]
+        return new_mask
@@ -2,6 +2,7 @@ from information_retriever.metadata_wrapper import MetadataWrapper
 from information_retriever.filter.filter import Filter
 from state.state_manager import StateManager
 from information_retriever.item.recommended_item import RecommendedItem
+import numpy as np
 
 
 class FilterApplier:
@@ -19,6 +20,10 @@ class FilterApplier:
         self._metadata_wrapper = metadata_wrapper
         self.filters = filters
 
+        metadata = self._metadata_wrapper.get_metadata_view()
+        for filter_obj in self.filters:
+            filter_obj.prepare(metadata)
+
     def apply_filter(self, state_manager: StateManager) -> list[int]:
         """
         Return a numpy array that has item ids that must be kept.
@@ -26,15 +31,16 @@ class FilterApplier:
         :param state_manager: current state
         :return: item indices that must be kept
         """
-        metadata = self._metadata_wrapper.get_metadata()
+        metadata = self._metadata_wrapper.get_metadata_view()
+        mask = np.ones(metadata.shape[0], dtype=bool)
 
         for filter_obj in self.filters:
-            if metadata.shape[0] == 0:
+            if not mask.any():
                 break
 
-            metadata = filter_obj.filter(state_manager, metadata)
+            mask = filter_obj.get_mask(state_manager, metadata, mask)
 
-        indices_list = metadata.index.tolist()
+        indices_list = metadata.index[mask].tolist()
         return indices_list
 
     def filter_by_current_item(self, current_item: RecommendedItem) -> list[int]:
@@ -44,6 +50,6 @@ class FilterApplier:
         :param current_item: current item
         :return: item index that must be kept
         """
-        metadata = self._metadata_wrapper.get_metadata()
+        metadata = self._metadata_wrapper.get_metadata_view()
         index = metadata.index[metadata['item_id'] == current_item.get_id()].tolist()
         return index
@@ -1,6 +1,7 @@
 from information_retriever.filter.filter import Filter
 from state.state_manager import StateManager
 from information_retriever.item.recommended_item import RecommendedItem
+import numpy as np
 import pandas as pd
 from itertools import chain
 
@@ -20,47 +21,51 @@ class ItemFilter(Filter):
         self._key_in_state_manager = key_in_state_manager
         self._metadata_field = metadata_field
 
-    def filter(self, state_manager: StateManager,
-               metadata: pd.DataFrame) -> pd.DataFrame:
+    def get_mask(self, state_manager: StateManager, metadata: pd.DataFrame, mask: np.ndarray) -> np.ndarray:
         """
-        Return a filtered version of metadata pandas dataframe.
+        Return a boolean mask that is true for the items that are kept.
 
         :param state_manager: current state
         :param metadata: items' metadata
-        :return: filtered version of metadata pandas dataframe
+        :param mask: boolean mask that is true for the items kept by the previous filters
+        :return: boolean mask that is true for the items that are kept
         """
         item_nested_list = state_manager.get(self._key_in_state_manager)
 
         if item_nested_list is None or item_nested_list == []:
-            return metadata
+            return mask
 
-        metadata['is_item_not_in_item_list'] = metadata.apply(
-            self._is_item_not_in_item_list, args=(item_nested_list,), axis=1)
-        filtered_metadata = metadata.loc[metadata['is_item_not_in_item_list']]
-        filtered_metadata = filtered_metadata.drop('is_item_not_in_item_list', axis=1)
+        return self._get_mask_of_kept_items(metadata[self._metadata_field], mask, self._is_item_not_in_item_list,
+                                            self._get_values_of_items(item_nested_list))
 
-        return filtered_metadata
+    def _get_values_of_items(self, item_nested_list: list[list[RecommendedItem]]) -> set[str]:
+        """
+        Return the normalized values of the specified metadata field of the items in the item list.
 
-    def _is_item_not_in_item_list(self, row_of_df: pd.Series, item_nested_list: list[list[RecommendedItem]]) -> bool:
+        :param item_nested_list: items in the item list in interest
+        :return: set of the values of the items
         """
-        Return true if a word in the constraint matches exactly with a word
-        in the specified metadata field or a word in the specified metadata field
-        matches exactly with a word in the constraint, false otherwise.
-        If the constraint of interest is empty, it will return true.
-        Might not work well if the value in the metadata filed is a dictionary.
+        values = set()
+        for item in chain.from_iterable(item_nested_list):
+            if self._metadata_field == "item_id":
+                values.add(item.get_id().strip())
+            elif self._metadata_field == "name":
+                values.add(item.get_name().lower().strip())
+        return values
 
-        :return: true if the item match the constraint, false otherwise
+    def _is_item_not_in_item_list(self, item_metadata_field_value: str, values_of_items: set[str]) -> bool:
         """
-        item_list = list(chain.from_iterable(item_nested_list))
-        item_metadata_field_value = row_of_df[self._metadata_field]
+        Return true if the value of the specified metadata field of the item is not the value of any item
+        in the item list, false otherwise. Item ids are compared exactly and names are compared case insensitively.
 
-        for item in item_list:
-            if self._metadata_field == "item_id":
-                if item.get_id().strip() == item_metadata_field_value.strip():
-                    return False
+        :param item_metadata_field_value: value of the specified metadata field of the item
+        :param values_of_items: normalized values of the items in the item list
+        :return: true if the item is not in the item list, false otherwise
+        """
+        if self._metadata_field == "item_id":
+            return item_metadata_field_value.strip() not in values_of_items
 
-            elif self._metadata_field == "name":
-                if item.get_name().lower().strip() == item_metadata_field_value.lower().strip():
-                    return False
+        elif self._metadata_field == "name":
+            return item_metadata_field_value.lower().strip() not in values_of_items
 
         return True
@@ -1,7 +1,9 @@
 from information_retriever.filter.filter import Filter
 from state.state_manager import StateManager
+import numpy as np
 import pandas as pd
 import re
+from typing import Any
 
 
 class ValueRangeFilter(Filter):
@@ -20,28 +22,24 @@ class ValueRangeFilter(Filter):
         self._constraint_key = constraint_key
         self._metadata_field = metadata_field
 
-    def filter(self, state_manager: StateManager,
-               metadata: pd.DataFrame) -> pd.DataFrame:
+    def get_mask(self, state_manager: StateManager, metadata: pd.DataFrame, mask: np.ndarray) -> np.ndarray:
         """
-        Return a filtered version of metadata pandas dataframe.
+        Return a boolean mask that is true for the items that are kept.
 
         :param state_manager: current state
         :param metadata: items' metadata
-        :return: filtered version of metadata pandas dataframe
+        :param mask: boolean mask that is true for the items kept by the previous filters
+        :return: boolean mask that is true for the items that are kept
         """
         constraint_values = state_manager.get('hard_constraints').get(self._constraint_key)
 
         if constraint_values is None:
-            return metadata
+            return mask
 
-        metadata['does_item_match_constraint'] = metadata.apply(
-            self._does_item_match_constraint, args=(constraint_values,), axis=1)
-        filtered_metadata = metadata.loc[metadata['does_item_match_constraint']]
-        filtered_metadata = filtered_metadata.drop('does_item_match_constraint', axis=1)
+        return self._get_mask_of_kept_items(metadata[self._metadata_field], mask, self._does_item_match_constraint,
+                                            constraint_values)
 
-        return filtered_metadata
-
-    def _does_item_match_constraint(self, row_of_df: pd.Series, constraint_values: list[str]) -> bool:
+    def _does_item_match_constraint(self, item_metadata_field_values: Any, constraint_values: list[str]) -> bool:
         """
         Return true if a word in the constraint matches exactly with a word
         in the specified metadata field or a word in the specified metadata field
@@ -49,10 +47,10 @@ class ValueRangeFilter(Filter):
         If the constraint of interest is empty, it will return true.
         Might not work well if the value in the metadata filed is a dictionary.
 
+        :param item_metadata_field_values: value of the specified metadata field of the item
+        :param constraint_values: value ranges in constraint
         :return: true if the item match the constraint, false otherwise
         """
-        item_metadata_field_values = row_of_df[self._metadata_field]
-
         if not isinstance(item_metadata_field_values, list):
             if isinstance(item_metadata_field_values, str):
 
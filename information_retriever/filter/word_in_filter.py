@@ -1,5 +1,7 @@
+from information_retriever.filter.field_value_index import FieldValueIndex
 from information_retriever.filter.filter import Filter
 from state.state_manager import StateManager
+import numpy as np
 import pandas as pd
 import logging
 
@@ -18,19 +20,47 @@ class WordInFilter(Filter):
 
     _constraint_keys: list[str]
     _metadata_field: str
+    _indexed_metadata: pd.DataFrame | None
+    _field_value_index: FieldValueIndex | None
+    _plural_terms: dict[str, str]
 
     def __init__(self, constraint_keys: list[str], metadata_field: str) -> None:
         self._constraint_keys = constraint_keys
         self._metadata_field = metadata_field
+        self._indexed_metadata = None
+        self._field_value_index = None
+        self._plural_terms = {}
 
-    def filter(self, state_manager: StateManager,
-               metadata: pd.DataFrame) -> pd.DataFrame:
+    def prepare(self, metadata: pd.DataFrame) -> None:
         """
-        Return a filtered version of metadata pandas dataframe.
+        Index the words in the specified metadata field and their plural forms.
+
+        :param metadata: items' metadata
+        """
+        self._field_value_index = FieldValueIndex(metadata[self._metadata_field])
+        self._plural_terms = {term: self._convert_to_plural(term) for term in self._field_value_index.get_terms()}
+        self._indexed_metadata = metadata
+
+    def get_mask(self, state_manager: StateManager, metadata: pd.DataFrame, mask: np.ndarray) -> np.ndarray:
+        """
+        Return a boolean mask that is true for the items that are kept. Items are kept if for all constraint
+        values, a word in the constraint matches partially with a word in the specified metadata field or a word
+        in the specified metadata field matches partially with a value in the constraint. If none of the items
+        kept by the previous filters matches every constraint value, items that match any constraint value are
+        kept.
+
+        A constraint value is considered to be matching if...
+         - constraint value is substring of at least one metadata value
+         - at least one metadata value is substring of constraint value
+         - plural form of constraint value is substring of at least one metadata value
+         - at least one plural form of metadata value is substring of constraint value
+
+        Items whose value in the metadata field is neither a list nor a string are always kept.
 
         :param state_manager: current state
         :param metadata: items' metadata
-        :return: filtered version of metadata pandas dataframe
+        :param mask: boolean mask that is true for the items kept by the previous filters
+        :return: boolean mask that is true for the items that are kept
         """
         constraint_values = []
         for constraint_key in self._constraint_keys:
@@ -40,103 +70,39 @@ class WordInFilter(Filter):
                 constraint_values.extend(constraint_value)
 
         if not constraint_values:
-            return metadata
+            return mask
 
-        item_match = metadata.apply(
-            self._does_item_match_constraint_fully, args=(constraint_values,), axis=1)
+        if metadata is not self._indexed_metadata:
+            self.prepare(metadata)
 
-        filtered_metadata = metadata.loc[item_match]
-        if filtered_metadata.shape[0] == 0:
-            logger.debug("Partial filtering applied")
-            item_match = metadata.apply(
-                self._does_item_match_constraint_partially, args=(constraint_values,), axis=1)
-            filtered_metadata = metadata.loc[item_match]
-
-        return filtered_metadata
-
-    def _does_item_match_constraint_fully(self, row_of_df: pd.Series, constraint_values: list[str]) -> bool:
-        """
-        Return true if for all constraint values, a word in the constraint matches partially with a word
-        in the specified metadata field or a word in the specified metadata field
-        matches partially with a value in the constraint, false otherwise.
+        unindexed_mask = self._field_value_index.get_unindexed_mask()
+        constraint_masks = [
+            self._get_mask_of_matching_items(constraint_value)
+            for constraint_value in dict.fromkeys(value.lower().strip() for value in constraint_values)
+        ]
 
-        A constraint value is considered to be matching if...
-         - constraint value is substring of at least one metadata value
-         - at least one metadata value is substring of constraint value
-         - plural form of constraint value is substring of at least one metadata value
-         - at least one plural form of metadata value is substring of constraint value
+        item_match = mask & (unindexed_mask | np.logical_and.reduce(constraint_masks))
+        if not item_match.any():
+            logger.debug("Partial filtering applied")
+            item_match = mask & (unindexed_mask | np.logical_or.reduce(constraint_masks))
 
-        If the constraint of interest is empty, it will return true.
-        Might not work well if the value in the metadata filed is a dictionary.
+        return item_match
 
-        :return: true if the item match the constraint, false otherwise
-        """
-        item_metadata_field_values = row_of_df[self._metadata_field]
-
-        if not isinstance(item_metadata_field_values, list):
-            if isinstance(item_metadata_field_values, str):
-                item_metadata_field_values = item_metadata_field_values.split(",")
-            else:
-                return True
-
-        for constraint_value in constraint_values:
-            is_constraint_in_metadata = False
-            for metadata_field_value in item_metadata_field_values:
-                constraint_value_lower_stripped = constraint_value.lower().strip()
-                metadata_field_value_lower_stripped = metadata_field_value.lower().strip()
-
-                if constraint_value_lower_stripped in metadata_field_value_lower_stripped \
-                        or metadata_field_value_lower_stripped in constraint_value_lower_stripped \
-                        or self._convert_to_plural(
-                            constraint_value_lower_stripped) in metadata_field_value_lower_stripped \
-                        or self._convert_to_plural(
-                            metadata_field_value_lower_stripped) in constraint_value_lower_stripped:
-                    is_constraint_in_metadata = True
-                    break
-            if not is_constraint_in_metadata:
-                return False
-
-        return True
-
-    def _does_item_match_constraint_partially(self, row_of_df: pd.Series, constraint_values: list[str]) -> bool:
+    def _get_mask_of_matching_items(self, constraint_value: str) -> np.ndarray:
         """
-        Return true if there exists constraint value such that it matches partially with a word
-        in the specified metadata field or a word in the specified metadata field
-        matches partially with value in the constraint, false otherwise.
-
-        A constraint value is considered to be matching if...
-         - constraint value is substring of at least one metadata value
-         - at least one metadata value is substring of constraint value
-         - plural form of constraint value is substring of at least one metadata value
-         - at least one plural form of metadata value is substring of constraint value
-
-        If the constraint of interest is empty, it will return true.
-        Might not work well if the value in the metadata filed is a dictionary.
+        Return a boolean mask that is true for the items having a word in the specified metadata field that
+        matches the constraint value, found by matching the constraint value with each distinct word.
 
-        :return: true if the item match the constraint, false otherwise
+        :param constraint_value: lower cased and stripped constraint value
+        :return: boolean mask over the items
         """
-        item_metadata_field_values = row_of_df[self._metadata_field]
-
-        if not isinstance(item_metadata_field_values, list):
-            if isinstance(item_metadata_field_values, str):
-                item_metadata_field_values = item_metadata_field_values.split(",")
-            else:
-                return True
-
-        for metadata_field_value in item_metadata_field_values:
-            for constraint_value in constraint_values:
-                constraint_value_lower_stripped = constraint_value.lower().strip()
-                metadata_field_value_lower_stripped = metadata_field_value.lower().strip()
-
-                if constraint_value_lower_stripped in metadata_field_value_lower_stripped\
-                        or metadata_field_value_lower_stripped in constraint_value_lower_stripped\
-                        or self._convert_to_plural(
-                                constraint_value_lower_stripped) in metadata_field_value_lower_stripped\
-                        or self._convert_to_plural(
-                                metadata_field_value_lower_stripped) in constraint_value_lower_stripped:
-                    return True
-
-        return False
+        plural_constraint_value = self._convert_to_plural(constraint_value)
+        item_match = np.zeros(self._indexed_metadata.shape[0], dtype=bool)
+        for term, plural_term in self._plural_terms.items():
+            if constraint_value in term or term in constraint_value \
+                    or plural_constraint_value in term or plural_term in constraint_value:
+                item_match[self._field_value_index.get_positions(term)] = True
+        return item_match
 
     @staticmethod
     def _convert_to_plural(word: str) -> str:
@@ -1,8 +1,13 @@
+from typing import TYPE_CHECKING
+
 from information_retriever.item.recommended_item import RecommendedItem
-from information_retriever.search_engine.search_engine import SearchEngine
 from information_retriever.metadata_wrapper import MetadataWrapper
 from information_retriever.item.item_loader import ItemLoader
 
+if TYPE_CHECKING:
+    # search engines import torch, which only needs to be loaded once a search engine is created
+    from information_retriever.search_engine.search_engine import SearchEngine
+
 
 class InformationRetrieval:
     """
@@ -13,11 +18,11 @@ class InformationRetrieval:
     :param item_loader: used to load metadata to Item object
     """
 
-    _search_engine: SearchEngine
+    _search_engine: 'SearchEngine'
     _metadata_wrapper: MetadataWrapper
     _item_loader: ItemLoader
 
-    def __init__(self, search_engine: SearchEngine, metadata_wrapper: MetadataWrapper, item_loader: ItemLoader):
+    def __init__(self, search_engine: 'SearchEngine', metadata_wrapper: MetadataWrapper, item_loader: ItemLoader):
         self._search_engine = search_engine
         self._metadata_wrapper = metadata_wrapper
         self._item_loader = item_loader
@@ -60,6 +65,49 @@ class InformationRetrieval:
         
         return topk_most_relevant_reviews
     
+    def get_best_matching_items_batch(self, queries: list[str], topk_items: int, topk_reviews: int,
+                                      item_indices_to_keep: list[int], unacceptable_similarity_range: float = 0.5,
+                                      max_number_similar_items: int = 5) -> list[list[list[RecommendedItem]]]:
+        """
+        Get k items that match each query the best, searching for all queries in one pass.
+
+        :param queries: queries
+        :param topk_items: the number of items to return for each query
+        :param topk_reviews: the number of reviews to store in a RecommendedItem object
+        :param item_indices_to_keep: item indices must be kept
+        :param unacceptable_similarity_range: range of similarity scores that would be considered too small to be able to recommend right away
+        :param max_number_similar_items: max number of similar items
+        :return: most relevant items and reviews as a list of RecommendedItem objects for each query
+        """
+        search_results = self._search_engine.search_for_topk_batch(
+            queries, topk_items, topk_reviews, item_indices_to_keep, unacceptable_similarity_range,
+            max_number_similar_items)
+
+        return [self._create_recommended_items(query, topk_item_id, topk_most_relevant_reviews)
+                for query, (topk_item_id, topk_most_relevant_reviews) in zip(queries, search_results)]
+
+    def get_best_matching_reviews_of_item_batch(self, queries: list[str], num_of_reviews_to_return: int,
+                                                item_indices_to_keep: list[int],
+                                                unacceptable_similarity_range: float = 0.5,
+                                                max_number_similar_items: int = 5) -> list[list[list[list[str]]]]:
+        """
+        Get num_of_reviews_to_return number of reviews for items that match each query the best, searching for all
+        queries in one pass.
+
+        :param queries: queries
+        :param num_of_reviews_to_return: the number of reviews to return for each item
+        :param item_indices_to_keep: item indices must be kept
+        :param unacceptable_similarity_range: range of similarity scores that would be considered too small to be able to recommend right away
+        :param max_number_similar_items: max number of similar items
+        :return: most relevant reviews for each item for each query
+        """
+        topk_items = len(item_indices_to_keep)
+        search_results = self._search_engine.search_for_topk_batch(
+            queries, topk_items, num_of_reviews_to_return, item_indices_to_keep, unacceptable_similarity_range,
+            max_number_similar_items)
+
+        return [topk_most_relevant_reviews for _, topk_most_relevant_reviews in search_results]
+
     def _create_recommended_items(self, query: str, item_ids: list[list[str]],
                                   items_most_relevant_reviews: list[list[list[str]]]) -> list[list[RecommendedItem]]:
         """
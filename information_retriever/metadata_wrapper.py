@@ -5,14 +5,42 @@ from typing import Any
 class MetadataWrapper:
     """
     Metadata wrapper that is responsible to get item metadata as dictionary.
+    The metadata of each item is converted to a dictionary once, and lookups by item id or index find it in a
+    hash table, so they don't scan the metadata.
 
     :param items_metadata: metadata of all items
     """
 
     items_metadata: pd.DataFrame
+    _item_records: list[dict[str, Any]]
+    _item_id_positions: dict[str, int]
+    _index_positions: dict[int, int]
 
     def __init__(self, items_metadata: pd.DataFrame):
         self.items_metadata = items_metadata
+        self._item_records = items_metadata.to_dict('records')
+        # items that appear more than once are found at their first row, as with a scan of the metadata
+        self._item_id_positions = {}
+        for position, item_id in enumerate(items_metadata['item_id']):
+            self._item_id_positions.setdefault(item_id, position)
+        self._index_positions = {index: position for position, index in enumerate(items_metadata.index)}
+
+    def add_items(self, items_metadata: pd.DataFrame) -> None:
+        """
+        Append the metadata of new items, whose index must not already be in the metadata. The metadata dataframe
+        is replaced rather than changed in place, so views returned before keep the previous items.
+
+        :param items_metadata: metadata of the new items
+        """
+        if self.items_metadata.index.isin(items_metadata.index).any() or items_metadata.index.has_duplicates:
+            raise ValueError("The index of new items must not already be in the metadata")
+
+        position = len(self._item_records)
+        self.items_metadata = pd.concat((self.items_metadata, items_metadata))
+        self._item_records.extend(items_metadata.to_dict('records'))
+        for offset, (item_id, index) in enumerate(zip(items_metadata['item_id'], items_metadata.index)):
+            self._item_id_positions.setdefault(item_id, position + offset)
+            self._index_positions[index] = position + offset
 
     def get_item_dict_from_id(self, item_id: str) -> dict[str, Any]:
         """
@@ -21,8 +49,7 @@ class MetadataWrapper:
         :param item_id: item id
         :return: item metadata
         """
-        item_metadata = self.items_metadata.loc[self.items_metadata['item_id'] == item_id].iloc[0]
-        return item_metadata.to_dict()
+        return dict(self._item_records[self._item_id_positions[item_id]])
 
     def get_item_dict_from_index(self, index: int) -> dict[str, Any]:
         """
@@ -31,7 +58,7 @@ class MetadataWrapper:
         :param index: index to the item in the metadata
         :return: item metadata
         """
-        return self.items_metadata.loc[index].to_dict()
+        return dict(self._item_records[self._index_positions[index]])
 
     def get_metadata(self) -> pd.DataFrame:
         """
@@ -40,3 +67,11 @@ class MetadataWrapper:
         :return: metadata dataframe
         """
         return self.items_metadata.copy()
+
+    def get_metadata_view(self) -> pd.DataFrame:
+        """
+        Return the metadata dataframe without copying it. It is shared, so it must not be modified.
+
+        :return: metadata dataframe
+        """
+        return self.items_metadata
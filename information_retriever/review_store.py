@@ -0,0 +1,160 @@
+import functools
+import json
+import os
+import shutil
+import zlib
+
+import numpy as np
+
+
+class ReviewStore:
+    """
+    Class that stores the texts of the reviews on disk and reads only the reviews that are requested.
+    Reviews are UTF-8 encoded and concatenated into a single memory mapped file, and offsets into that file locate
+    each review. If the store is compressed, consecutive reviews are compressed together in blocks, and only the
+    blocks holding the requested reviews are decompressed.
+
+    :param path_to_store: path to the directory storing the reviews
+    :param num_cached_blocks: number of decompressed blocks kept in memory when the store is compressed
+    """
+
+    _num_reviews: int
+    _block_size: int
+    _is_compressed: bool
+    _blob: np.ndarray
+    _review_offsets: np.ndarray
+    _block_offsets: np.ndarray | None
+    _item_ids: np.ndarray
+    _appended_reviews: list[str]
+
+    def __init__(self, path_to_store: str, num_cached_blocks: int = 64):
+        with open(os.path.join(path_to_store, 'store.json')) as f:
+            store_info = json.load(f)
+        self._num_reviews = store_info['num_reviews']
+        self._block_size = store_info['block_size']
+        self._is_compressed = store_info['is_compressed']
+
+        path_to_blob = os.path.join(path_to_store, 'reviews.bin')
+        # an empty file can't be memory mapped
+        self._blob = np.memmap(path_to_blob, dtype=np.uint8, mode='r') if os.path.getsize(path_to_blob) > 0 \
+            else np.zeros(0, dtype=np.uint8)
+        self._review_offsets = np.load(os.path.join(path_to_store, 'review_offsets.npy'), mmap_mode='r')
+        self._block_offsets = np.load(os.path.join(path_to_store, 'block_offsets.npy'), mmap_mode='r') \
+            if self._is_compressed else None
+        self._item_ids = np.load(os.path.join(path_to_store, 'item_ids.npy'))
+        self._appended_reviews = []
+        self._decompress_block = functools.lru_cache(maxsize=num_cached_blocks)(self._decompress_block)
+
+    @classmethod
+    def create(cls, reviews: list[str], review_item_ids: np.ndarray, path_to_store: str, block_size: int = 64,
+               compression_level: int = None) -> 'ReviewStore':
+        """
+        Write reviews to path_to_store, replacing the store saved there, and open the new store.
+
+        :param reviews: texts of the reviews
+        :param review_item_ids: item ids corresponding to reviews
+        :param path_to_store: path to the directory storing the reviews
+        :param block_size: number of consecutive reviews compressed together
+        :param compression_level: zlib compression level of the blocks. If it is None, reviews are not compressed.
+        :return: review store reading from path_to_store
+        """
+        encoded_reviews = [str(review).encode('utf-8') for review in reviews]
+        review_offsets = np.zeros(len(encoded_reviews) + 1, dtype=np.int64)
+        np.cumsum([len(review) for review in encoded_reviews], out=review_offsets[1:])
+
+        # write to a temporary directory first so that an interrupted write never leaves a partial store behind
+        path_to_tmp_store = f'{path_to_store}.{os.getpid()}.tmp'
+        os.makedirs(path_to_tmp_store, exist_ok=True)
+        with open(os.path.join(path_to_tmp_store, 'reviews.bin'), 'wb') as f:
+            if compression_level is None:
+                f.write(b''.join(encoded_reviews))
+            else:
+                block_offsets = [0]
+                for start in range(0, len(encoded_reviews), block_size):
+                    block = zlib.compress(b''.join(encoded_reviews[start:start + block_size]), compression_level)
+                    f.write(block)
+                    block_offsets.append(block_offsets[-1] + len(block))
+                np.save(os.path.join(path_to_tmp_store, 'block_offsets.npy'), np.array(block_offsets, dtype=np.int64))
+
+        np.save(os.path.join(path_to_tmp_store, 'review_offsets.npy'), review_offsets)
+        review_item_ids = np.asarray(review_item_ids)
+        # fixed width strings are saved without pickling
+        np.save(os.path.join(path_to_tmp_store, 'item_ids.npy'),
+                review_item_ids.astype(str) if review_item_ids.dtype == object else review_item_ids)
+        with open(os.path.join(path_to_tmp_store, 'store.json'), 'w') as f:
+            json.dump({'num_reviews': len(encoded_reviews), 'block_size': block_size,
+                       'is_compressed': compression_level is not None}, f)
+
+        if os.path.exists(path_to_store):
+            shutil.rmtree(path_to_store)
+        os.replace(path_to_tmp_store, path_to_store)
+        return cls(path_to_store)
+
+    def __len__(self) -> int:
+        return self._num_reviews + len(self._appended_reviews)
+
+    def __getitem__(self, index: int) -> str:
+        """
+        Return the text of a review. Negative indices count from the last review, as with numpy arrays.
+
+        :param index: index of the review
+        :return: text of the review
+        """
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f'Review index {index} is out of range for {len(self)} reviews')
+        if index >= self._num_reviews:
+            return self._appended_reviews[index - self._num_reviews]
+
+        start, end = int(self._review_offsets[index]), int(self._review_offsets[index + 1])
+        if not self._is_compressed:
+            return self._blob[start:end].tobytes().decode('utf-8')
+
+        block = index // self._block_size
+        block_start = int(self._review_offsets[block * self._block_size])
+        return self._decompress_block(block)[start - block_start:end - block_start].decode('utf-8')
+
+    def get_reviews(self, indices: list[int]) -> list[str]:
+        """
+        Return the texts of the given reviews.
+
+        :param indices: indices of the reviews
+        :return: texts of the reviews in the order of indices
+        """
+        return [self[index] for index in indices]
+
+    def get_item_ids(self) -> np.ndarray:
+        """
+        Return the item id corresponding to each review written to the store.
+
+        :return: item ids corresponding to reviews
+        """
+        return self._item_ids
+
+    def is_compressed(self) -> bool:
+        """
+        Return whether the reviews written to the store are compressed.
+
+        :return: whether the store is compressed
+        """
+        return self._is_compressed
+
+    def append(self, reviews: list[str]) -> None:
+        """
+        Append reviews after the last review. Appended reviews are kept in memory and are not written to the
+        store.
+
+        :param reviews: texts of the reviews
+        """
+        self._appended_reviews.extend(str(review) for review in reviews)
+
+    def _decompress_block(self, block: int) -> bytes:
+        """
+        Decompress a block of consecutive reviews.
+
+        :param block: index of the block
+        :return: concatenated UTF-8 encoded reviews of the block
+        """
+        return zlib.decompress(self._blob[self._block_offsets[block]:self._block_offsets[block + 1]].tobytes())
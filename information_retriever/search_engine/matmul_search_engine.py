@@ -1,25 +1,97 @@
 import numpy as np
 import torch
-from information_retriever.embedder.bert_embedder import BERT_model
+from information_retriever.embedder.embedder import Embedder
 from information_retriever.metadata_wrapper import MetadataWrapper
+from information_retriever.review_store import ReviewStore
 from information_retriever.search_engine.search_engine import SearchEngine
 
 
 class MatMulSearchEngine(SearchEngine):
     """
-    Class that is responsible for searching for topk most relevant items using BERT_model.
+    Class that is responsible for searching for topk most relevant items using Embedder.
 
-    :param embedder: BERT_model to embed query
+    :param embedder: Embedder to embed query
+    :param review_item_ids: item ids corresponding to reviews
+    :param reviews: reviews of the items, either in memory or in a review store reading them from disk on demand
+    :param reviews_embedding_matrix: matrix storing the embedding of each review
+    :param metadata_wrapper: holds metadata of the items
+    :param score_candidates_only: whether to only multiply the review embeddings of the items that must be kept
+    :param item_embedding_matrix: matrix storing the pooled embedding of each item, used to pick coarse candidates
+    :param num_coarse_candidate_items: number of items picked with item_embedding_matrix whose reviews are scored.
+    If it is 0, the reviews of every kept item are scored.
+    :param precision: precision used to store the review embeddings, one of "float32", "float16", "int8 row"
+    (int8 with one scale per review) or "int8 dimension" (int8 with one scale per embedding dimension)
+    :param num_rescored_items: number of most similar items whose score is recomputed with the float32 review
+    embeddings when precision is not "float32". If it is 0, scores are not recomputed.
+    :param chunk_size: number of reviews converted back to float32 at once when scoring int8 embeddings
+    :param exact_reviews_embedding_matrix: float32 review embeddings used to rescore the most similar items,
+    usually a memory mapped .npy file, so that only the rows of those items are read and the float32 matrix is
+    not kept in memory next to the reduced precision one. It is required when items are rescored.
+    Reviews added with add_reviews are appended to the review embeddings, while the rows of removed reviews are
+    kept but never scored, since removed reviews belong to no item.
     """
-    _embedder: BERT_model
+    _embedder: Embedder
     _review_item_ids: np.ndarray
-    _reviews: np.ndarray
+    _reviews: np.ndarray | ReviewStore
     _reviews_embedding_matrix: torch.Tensor
+    _reviews_embedding_scale: torch.Tensor | None
+    _exact_reviews_embedding_matrix: np.ndarray | None
+    _added_exact_reviews_embedding_matrix: np.ndarray
+    _precision: str
+    _num_rescored_items: int
+    _chunk_size: int
 
-    def __init__(self, embedder: BERT_model, review_item_ids: np.ndarray, reviews: np.ndarray,
-                 reviews_embedding_matrix: torch.Tensor, metadata_wrapper: MetadataWrapper):
-        super().__init__(embedder, review_item_ids, reviews, metadata_wrapper)
-        self._reviews_embedding_matrix = reviews_embedding_matrix
+    def __init__(self, embedder: Embedder, review_item_ids: np.ndarray, reviews: np.ndarray | ReviewStore,
+                 reviews_embedding_matrix: torch.Tensor, metadata_wrapper: MetadataWrapper,
+                 score_candidates_only: bool = False, item_embedding_matrix: torch.Tensor = None,
+                 num_coarse_candidate_items: int = 0, precision: str = "float32", num_rescored_items: int = 0,
+                 chunk_size: int = 256, exact_reviews_embedding_matrix: np.ndarray = None):
+        super().__init__(embedder, review_item_ids, reviews, metadata_wrapper, score_candidates_only,
+                         item_embedding_matrix, num_coarse_candidate_items)
+        self._precision = precision
+        self._reviews_embedding_matrix, self._reviews_embedding_scale = self._quantize(reviews_embedding_matrix,
+                                                                                       precision)
+        self._num_rescored_items = num_rescored_items if precision != "float32" else 0
+        if self._num_rescored_items > 0 and exact_reviews_embedding_matrix is None:
+            raise ValueError("Rescoring items requires the float32 review embeddings")
+        self._exact_reviews_embedding_matrix = exact_reviews_embedding_matrix \
+            if self._num_rescored_items > 0 else None
+        self._added_exact_reviews_embedding_matrix = np.zeros((0, reviews_embedding_matrix.size(1)),
+                                                              dtype=np.float32)
+        self._chunk_size = chunk_size
+
+    def _add_review_embeddings(self, embeddings: np.ndarray, review_indices: np.ndarray) -> None:
+        """
+        Append the embeddings of new reviews, which follow the last review, to the review embeddings in their
+        precision. With "int8 dimension", new embeddings are quantized with the scale of each dimension computed
+        when the search engine was created, and values outside of its range are clipped. The float32 embeddings
+        of new reviews are kept in memory to rescore items, since the float32 matrix is read only.
+
+        :param embeddings: embeddings of the reviews, one per row
+        :param review_indices: indices of the reviews
+        """
+        embeddings = torch.from_numpy(np.ascontiguousarray(embeddings, dtype=np.float32))
+        if self._precision == "int8 dimension":
+            quantized = torch.round(embeddings / self._reviews_embedding_scale).clamp(-127, 127).to(torch.int8)
+            scale = self._reviews_embedding_scale
+        else:
+            quantized, scale = self._quantize(embeddings, self._precision)
+            if self._precision == "int8 row":
+                scale = torch.cat((self._reviews_embedding_scale, scale))
+
+        self._reviews_embedding_matrix = torch.cat((self._reviews_embedding_matrix, quantized))
+        self._reviews_embedding_scale = scale
+        if self._exact_reviews_embedding_matrix is not None:
+            self._added_exact_reviews_embedding_matrix = np.concatenate(
+                (self._added_exact_reviews_embedding_matrix, embeddings.numpy()))
+
+    def _remove_review_embeddings(self, review_indices: np.ndarray) -> None:
+        """
+        Leave the embeddings of removed reviews in place. Removed reviews belong to no item, so they are never
+        fused into an item score or returned, and keeping their rows keeps the index of every other review.
+
+        :param review_indices: indices of the reviews
+        """
 
     def _similarity_score_each_review(self, query: torch.Tensor) -> torch.Tensor:
         """
@@ -28,5 +100,190 @@ class MatMulSearchEngine(SearchEngine):
         :param query: A tensor containing the query embedding
         :return: A pytorch tensor that contains the similarity score for each review
         """
+        if self._precision != "float32":
+            return self._similarity_score_quantized(query.unsqueeze(0))[0]
         similarity_score = torch.matmul(self._reviews_embedding_matrix, query)
         return similarity_score
+
+    def _similarity_score_reviews_subset(self, query: torch.Tensor, review_indices: torch.Tensor) -> torch.Tensor:
+        """
+        This function finds and returns a tensor that contains the similarity score for the given reviews only,
+        by only multiplying the rows of the embedding matrix corresponding to those reviews.
+
+        :param query: A tensor containing the query embedding
+        :param review_indices: A tensor containing the indices of the reviews to score
+        :return: A pytorch tensor that contains the similarity score for each review in review_indices
+        """
+        if self._precision != "float32":
+            return self._similarity_score_quantized(query.unsqueeze(0), review_indices)[0]
+        return torch.matmul(self._reviews_embedding_matrix[review_indices], query)
+
+    def _similarity_score_each_review_batch(self, queries: torch.Tensor) -> torch.Tensor:
+        """
+        This function finds and returns a tensor that contains the similarity score between each query and
+        each review with a single matrix-matrix product.
+
+        :param queries: A tensor containing one query embedding per row
+        :return: A pytorch tensor whose row i contains the similarity score for each review with query i
+        """
+        if self._precision != "float32":
+            return self._similarity_score_quantized(queries)
+        return torch.matmul(queries, self._reviews_embedding_matrix.T)
+
+    def _similarity_score_reviews_subset_batch(self, queries: torch.Tensor,
+                                               review_indices: torch.Tensor) -> torch.Tensor:
+        """
+        This function finds and returns a tensor that contains the similarity score between each query and
+        the given reviews only, gathering the rows of those reviews once for all queries.
+
+        :param queries: A tensor containing one query embedding per row
+        :param review_indices: A tensor containing the indices of the reviews to score
+        :return: A pytorch tensor whose row i contains the similarity score for each review in review_indices
+                with query i
+        """
+        if self._precision != "float32":
+            return self._similarity_score_quantized(queries, review_indices)
+        return torch.matmul(queries, self._reviews_embedding_matrix[review_indices].T)
+
+    def _similarity_score_kept_items(self, query: torch.Tensor, k: int,
+                                     item_indices_to_keep: list[int]) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        This function finds the similarity score for each item, where items that are not kept have score 0.
+        If num_rescored_items is set, the score of the most similar items is recomputed with the float32
+        review embeddings.
+
+        :param query: A tensor containing the query embedding
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: Returning a tuple with element 0 being a tensor that contains the similarity score for each item
+                and element 1 being a tensor that contains the index of top k reviews for each item
+        """
+        similarity_score_item, index_most_similar_review = super()._similarity_score_kept_items(
+            query, k, item_indices_to_keep)
+        if self._num_rescored_items <= 0:
+            return similarity_score_item, index_most_similar_review
+        return self._rescore_most_similar_items(query, k, similarity_score_item, index_most_similar_review)
+
+    def _similarity_score_kept_items_batch(self, queries: torch.Tensor, k: int, item_indices_to_keep: list[int]) \
+            -> list[tuple[torch.Tensor, torch.Tensor]]:
+        """
+        This function does the same as _similarity_score_kept_items for each query, scoring all queries in one pass.
+
+        :param queries: A tensor containing one query embedding per row
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: A list containing the output of _similarity_score_kept_items for each query
+        """
+        output = super()._similarity_score_kept_items_batch(queries, k, item_indices_to_keep)
+        if self._num_rescored_items <= 0:
+            return output
+        return [self._rescore_most_similar_items(query, k, similarity_score_item, index_most_similar_review)
+                for query, (similarity_score_item, index_most_similar_review) in zip(queries, output)]
+
+    def _rescore_most_similar_items(self, query: torch.Tensor, k: int, similarity_score_item: torch.Tensor,
+                                    index_most_similar_review: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Recompute the score of the num_rescored_items most similar items with the float32 review embeddings.
+
+        :param query: A tensor containing the query embedding
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :param similarity_score_item: A tensor that contains the reduced precision similarity score for each item
+        :param index_most_similar_review: A tensor that contains the index of top k reviews for each item
+        :return: Returning a tuple with element 0 being a tensor that contains the similarity score for each item
+                and element 1 being a tensor that contains the index of top k reviews for each item
+        """
+        is_scored = similarity_score_item != 0
+        num_items = min(self._num_rescored_items, int(is_scored.sum()))
+        if num_items == 0:
+            return similarity_score_item, index_most_similar_review
+
+        most_similar_items = torch.topk(
+            torch.where(is_scored, similarity_score_item, -torch.inf), num_items).indices
+        candidate_reviews = self._get_candidate_reviews(most_similar_items)
+        exact_review_embeddings = self._get_exact_review_embeddings(candidate_reviews[1].numpy())
+        exact_similarity_score_review = torch.matmul(torch.from_numpy(exact_review_embeddings),
+                                                     query.to(torch.float32))
+        exact_similarity_score_item, exact_index_most_similar_review = self._similarity_score_candidate_items(
+            exact_similarity_score_review, k, *candidate_reviews)
+
+        similarity_score_item = similarity_score_item.clone()
+        similarity_score_item[most_similar_items] = exact_similarity_score_item[most_similar_items]
+        index_most_similar_review = index_most_similar_review.clone()
+        index_most_similar_review[most_similar_items] = exact_index_most_similar_review[most_similar_items]
+        return similarity_score_item, index_most_similar_review
+
+    def _get_exact_review_embeddings(self, review_indices: np.ndarray) -> np.ndarray:
+        """
+        Read the float32 embeddings of the given reviews. Only the rows of those reviews are read from the
+        float32 matrix, and reviews added afterwards are read from memory.
+
+        :param review_indices: indices of the reviews
+        :return: float32 embeddings of the reviews, one per row
+        """
+        num_reviews = self._exact_reviews_embedding_matrix.shape[0]
+        is_added = review_indices >= num_reviews
+        exact_review_embeddings = np.empty((review_indices.size, self._added_exact_reviews_embedding_matrix.shape[1]),
+                                           dtype=np.float32)
+        exact_review_embeddings[~is_added] = self._exact_reviews_embedding_matrix[review_indices[~is_added]]
+        exact_review_embeddings[is_added] = self._added_exact_reviews_embedding_matrix[
+            review_indices[is_added] - num_reviews]
+        return exact_review_embeddings
+
+    def _similarity_score_quantized(self, queries: torch.Tensor, review_indices: torch.Tensor = None) -> torch.Tensor:
+        """
+        Compute the similarity score between each query and the reduced precision review embeddings. float16
+        embeddings are multiplied directly, while int8 embeddings are converted back to float32 chunk_size
+        reviews at a time so that each converted chunk stays in the CPU cache.
+
+        :param queries: A tensor containing one query embedding per row
+        :param review_indices: A tensor containing the indices of the reviews to score. If it is None, every
+        review is scored.
+        :return: A pytorch tensor whose row i contains the similarity score for each review with query i
+        """
+        if self._precision == "float16":
+            matrix = self._reviews_embedding_matrix if review_indices is None \
+                else self._reviews_embedding_matrix[review_indices]
+            return torch.matmul(queries.to(torch.float16), matrix.T).to(torch.float32)
+
+        queries = queries.to(torch.float32)
+        if self._precision == "int8 dimension":
+            # the scale of each dimension can be applied to the queries once instead of to every review
+            queries = queries * self._reviews_embedding_scale
+
+        num_reviews = self._reviews_embedding_matrix.size(0) if review_indices is None else review_indices.size(0)
+        similarity_score = torch.empty((queries.size(0), num_reviews), dtype=torch.float32)
+        for start in range(0, num_reviews, self._chunk_size):
+            end = min(start + self._chunk_size, num_reviews)
+            rows = slice(start, end) if review_indices is None else review_indices[start:end]
+            similarity_score[:, start:end] = torch.matmul(
+                queries, self._reviews_embedding_matrix[rows].to(torch.float32).T)
+            if self._precision == "int8 row":
+                similarity_score[:, start:end] *= self._reviews_embedding_scale[rows]
+        return similarity_score
+
+    @staticmethod
+    def _quantize(reviews_embedding_matrix: torch.Tensor,
+                  precision: str) -> tuple[torch.Tensor, torch.Tensor | None]:
+        """
+        Convert the review embeddings to the given precision.
+
+        :param reviews_embedding_matrix: matrix storing the embedding of each review
+        :param precision: precision used to store the review embeddings
+        :return: Returning a tuple with element 0 being the converted embeddings and element 1 being the scale of
+                each review or of each dimension for int8 precisions, None otherwise
+        """
+        if precision == "float32":
+            return reviews_embedding_matrix, None
+        elif precision == "float16":
+            return reviews_embedding_matrix.to(torch.float16), None
+        elif precision == "int8 row":
+            scale = reviews_embedding_matrix.abs().amax(dim=1).to(torch.float32) / 127
+        elif precision == "int8 dimension":
+            scale = reviews_embedding_matrix.abs().amax(dim=0).to(torch.float32) / 127
+        else:
+            raise ValueError(f'Unknown review embedding precision: {precision}')
+
+        scale = scale.clamp(min=torch.finfo(torch.float32).tiny)
+        divisor = scale.unsqueeze(1) if precision == "int8 row" else scale
+        quantized = torch.round(reviews_embedding_matrix.to(torch.float32) / divisor).to(torch.int8)
+        return quantized, scale
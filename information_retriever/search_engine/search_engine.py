@@ -1,27 +1,55 @@
 import numpy as np
+import pandas as pd
 import torch
 
-from information_retriever.embedder.bert_embedder import BERT_model
+from information_retriever.embedder.embedder import Embedder
 from information_retriever.metadata_wrapper import MetadataWrapper
+from information_retriever.review_store import ReviewStore
 
 
 class SearchEngine:
     """
     Class that searches for topk most relevant items.
     
-    :param embedder: BERT_model to embed query
+    :param embedder: Embedder to embed query
+    :param review_item_ids: item ids corresponding to reviews
+    :param reviews: reviews of the items, either in memory or in a review store reading them from disk on demand
+    :param metadata_wrapper: holds metadata of the items
+    :param score_candidates_only: whether to only score the reviews of the items that must be kept
+    :param item_embedding_matrix: matrix storing the pooled embedding of each item, used to pick coarse candidates
+    :param num_coarse_candidate_items: number of items picked with item_embedding_matrix whose reviews are scored.
+    If it is 0, the reviews of every kept item are scored.
     """
 
-    _embedder: BERT_model
+    _embedder: Embedder
     _review_item_ids: np.ndarray
-    _reviews: np.ndarray
+    _reviews: np.ndarray | ReviewStore
+    _item_ids: np.ndarray
+    _review_item_index: torch.Tensor
+    _item_review_indices: torch.Tensor
+    _item_review_offsets: torch.Tensor
+    _is_item_active: torch.Tensor
+    _item_name_ids: torch.Tensor
+    _score_candidates_only: bool
+    _item_embedding_matrix: torch.Tensor | None
+    _num_coarse_candidate_items: int
 
-    def __init__(self, embedder: BERT_model, review_item_ids: np.ndarray, reviews: np.ndarray,
-                 metadata_wrapper: MetadataWrapper):
+    def __init__(self, embedder: Embedder, review_item_ids: np.ndarray, reviews: np.ndarray | ReviewStore,
+                 metadata_wrapper: MetadataWrapper, score_candidates_only: bool = False,
+                 item_embedding_matrix: torch.Tensor = None, num_coarse_candidate_items: int = 0):
         self._embedder = embedder
         self._review_item_ids = review_item_ids
         self._reviews = reviews
         self._metadata_wrapper = metadata_wrapper
+        review_item_index, self._item_ids = pd.factorize(review_item_ids)
+        self._review_item_index = torch.from_numpy(review_item_index.astype(np.int64))
+        self._item_review_indices, self._item_review_offsets = self._create_item_review_postings(
+            self._review_item_index, self._item_ids.size)
+        self._is_item_active = torch.ones(self._item_ids.size, dtype=torch.bool)
+        self._item_name_ids = self._create_item_name_ids()
+        self._score_candidates_only = score_candidates_only
+        self._item_embedding_matrix = item_embedding_matrix
+        self._num_coarse_candidate_items = num_coarse_candidate_items if item_embedding_matrix is not None else 0
 
     def search_for_topk(self, query: str, topk_items: int, topk_reviews: int,
                         item_indices_to_keep: list[int], unacceptable_similarity_range: float, 
@@ -41,10 +69,215 @@ class SearchEngine:
         reviews for the corresponding item
         """
         query_embedding = self._embedder.get_tensor_embedding(query)
-        similarity_score_review = self._similarity_score_each_review(query_embedding)
-        similarity_score_item, index_most_similar_review = self._similarity_score_each_item(
-            similarity_score_review, topk_reviews)
-        similarity_score_item = self._filter_item_similarity_score(similarity_score_item, item_indices_to_keep)
+        similarity_score_item, index_most_similar_review = self._similarity_score_kept_items(
+            query_embedding, topk_reviews, self._get_active_items(item_indices_to_keep))
+        return self._get_topk_items_and_reviews(similarity_score_item, index_most_similar_review, topk_items,
+                                                unacceptable_similarity_range, max_number_similar_items)
+
+    def search_for_topk_batch(self, queries: list[str], topk_items: int, topk_reviews: int,
+                              item_indices_to_keep: list[int], unacceptable_similarity_range: float,
+                              max_number_similar_items: int) -> list[tuple[list[list[str]], list[list[list[str]]]]]:
+        """
+        This function does the same as search_for_topk for each query, but embeds all the queries at once and
+        scores them against the reviews in a single pass.
+
+        :param queries: The inputs information retriever gets
+        :param topk_items: Number of items to be returned for each query
+        :param topk_reviews: Number of reviews for each item
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :param unacceptable_similarity_range: range of similarity scores that would be considered too small to be able to recommend right away
+        :param max_number_similar_items: max number of similar items
+        :return: Return a list containing the output of search_for_topk for each query, in the order of queries
+        """
+        query_embeddings = self._embedder.get_tensor_embeddings(queries)
+        return [
+            self._get_topk_items_and_reviews(similarity_score_item, index_most_similar_review, topk_items,
+                                             unacceptable_similarity_range, max_number_similar_items)
+            for similarity_score_item, index_most_similar_review in self._similarity_score_kept_items_batch(
+                query_embeddings, topk_reviews, self._get_active_items(item_indices_to_keep))
+        ]
+
+    def add_reviews(self, review_item_ids: np.ndarray, reviews: np.ndarray,
+                    items_metadata: pd.DataFrame = None) -> None:
+        """
+        Embed and add reviews of new or existing items without rebuilding the index of the other reviews.
+        New items get the indices following the last item, in the order they first appear in review_item_ids,
+        and their metadata is added to the metadata with these indices. The pooled embedding of every item
+        with new reviews is updated.
+
+        :param review_item_ids: item ids corresponding to reviews
+        :param reviews: reviews to add
+        :param items_metadata: metadata of the new items, found by their "item_id". It can only be None if the
+        search engine has no metadata.
+        """
+        review_item_ids = np.asarray(review_item_ids)
+        num_items = self._item_ids.size
+        new_item_ids = pd.Index(pd.unique(review_item_ids)).difference(self._item_ids, sort=False)
+        new_items_metadata = self._get_new_items_metadata(new_item_ids, num_items, items_metadata)
+
+        first_review_index = self._review_item_index.size(0)
+        review_indices = np.arange(first_review_index, first_review_index + review_item_ids.size)
+        embeddings = self._embedder.embed(list(reviews))
+        if new_items_metadata is not None:
+            self._metadata_wrapper.add_items(new_items_metadata)
+        self._add_review_embeddings(embeddings, review_indices)
+
+        self._item_ids = pd.Index(self._item_ids).append(new_item_ids).to_numpy()
+        new_review_item_index = torch.from_numpy(pd.Index(self._item_ids).get_indexer(review_item_ids))
+        if self._item_embedding_matrix is not None:
+            self._add_to_item_embedding_matrix(embeddings, new_review_item_index)
+        # deleted reviews belong to the item following the last item, which moves when items are added
+        review_item_index = self._review_item_index.masked_fill(self._review_item_index == num_items,
+                                                                self._item_ids.size)
+
+        self._review_item_ids = np.concatenate((self._review_item_ids, review_item_ids))
+        if isinstance(self._reviews, ReviewStore):
+            self._reviews.append(reviews)
+        else:
+            self._reviews = np.concatenate((self._reviews, reviews))
+        self._review_item_index = torch.cat((review_item_index, new_review_item_index))
+        self._is_item_active = torch.cat((self._is_item_active,
+                                          torch.ones(self._item_ids.size - num_items, dtype=torch.bool)))
+        self._update_item_reviews()
+
+    def remove_items(self, item_ids: list[str]) -> None:
+        """
+        Remove the reviews of the given items, so that they are never scored again, and deactivate the items.
+        If the embeddings of reviews can't be removed, as in HNSW databases, the items are only deactivated.
+
+        :param item_ids: ids of the items to remove
+        """
+        if not self._can_remove_review_embeddings():
+            self.set_items_active(item_ids, False)
+            return
+
+        item_indices = torch.from_numpy(pd.Index(self._item_ids).get_indexer(item_ids))
+        item_indices = item_indices[item_indices >= 0]
+        is_removed_review = torch.isin(self._review_item_index, item_indices)
+        self._remove_review_embeddings(torch.nonzero(is_removed_review).squeeze(1).numpy())
+
+        self._review_item_index = self._review_item_index.masked_fill(is_removed_review, self._item_ids.size)
+        self._is_item_active[item_indices] = False
+        self._update_item_reviews()
+
+    def set_items_active(self, item_ids: list[str], is_active: bool) -> None:
+        """
+        Deactivate the given items, so that they are never returned, or activate them again. Unlike removed
+        items, the reviews of deactivated items are kept.
+
+        :param item_ids: ids of the items
+        :param is_active: whether the items can be returned
+        """
+        item_indices = torch.from_numpy(pd.Index(self._item_ids).get_indexer(item_ids))
+        self._is_item_active[item_indices[item_indices >= 0]] = is_active
+
+    def _add_review_embeddings(self, embeddings: np.ndarray, review_indices: np.ndarray) -> None:
+        """
+        Store the embeddings of new reviews.
+
+        :param embeddings: embeddings of the reviews, one per row
+        :param review_indices: indices of the reviews
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support adding reviews')
+
+    def _can_remove_review_embeddings(self) -> bool:
+        """
+        Return whether the embeddings of reviews can be removed.
+
+        :return: whether the embeddings of reviews can be removed
+        """
+        return True
+
+    def _remove_review_embeddings(self, review_indices: np.ndarray) -> None:
+        """
+        Remove the embeddings of the given reviews.
+
+        :param review_indices: indices of the reviews
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support removing reviews')
+
+    def _get_new_items_metadata(self, new_item_ids: pd.Index, num_items: int,
+                                items_metadata: pd.DataFrame | None) -> pd.DataFrame | None:
+        """
+        Return the metadata of the new items indexed by the indices they get, which follow the last item.
+
+        :param new_item_ids: ids of the new items, in the order they get their indices
+        :param num_items: number of items before adding the new items
+        :param items_metadata: metadata of the new items, found by their "item_id"
+        :return: metadata of the new items, or None if the search engine has no metadata
+        """
+        if self._metadata_wrapper is None:
+            return None
+        if items_metadata is None:
+            items_metadata = pd.DataFrame({'item_id': []})
+
+        positions = pd.Index(items_metadata['item_id']).get_indexer_for(new_item_ids)
+        if (positions < 0).any() or positions.size != new_item_ids.size:
+            raise ValueError("The metadata of every new item must be given once")
+
+        new_items_metadata = items_metadata.iloc[positions]
+        new_items_metadata.index = pd.RangeIndex(num_items, num_items + new_item_ids.size)
+        return new_items_metadata
+
+    def _add_to_item_embedding_matrix(self, embeddings: np.ndarray, review_item_index: torch.Tensor) -> None:
+        """
+        Update the pooled embedding of the items of new reviews, with a new row for each new item, so that each
+        row stays the mean of the embeddings of the reviews of its item.
+
+        :param embeddings: embeddings of the new reviews, one per row
+        :param review_item_index: index of the item of each new review
+        """
+        num_new_items = self._item_ids.size - self._item_embedding_matrix.size(0)
+        item_embedding_matrix = torch.cat((self._item_embedding_matrix,
+                                           self._item_embedding_matrix.new_zeros(num_new_items,
+                                                                                 self._item_embedding_matrix.size(1))))
+        review_counts = torch.cat((torch.diff(self._item_review_offsets),
+                                   torch.zeros(num_new_items, dtype=torch.int64)))
+
+        updated_items, updated_item_position, num_new_reviews = torch.unique(
+            review_item_index, return_inverse=True, return_counts=True)
+        num_reviews = review_counts[updated_items]
+        pooled_embeddings = (item_embedding_matrix[updated_items].to(torch.float32) *
+                             num_reviews.unsqueeze(1)).index_add_(0, updated_item_position,
+                                                                  torch.from_numpy(embeddings).to(torch.float32))
+        pooled_embeddings /= (num_reviews + num_new_reviews).unsqueeze(1)
+        item_embedding_matrix[updated_items] = pooled_embeddings.to(item_embedding_matrix.dtype)
+        self._item_embedding_matrix = item_embedding_matrix
+
+    def _update_item_reviews(self) -> None:
+        """
+        Update the structures that depend on the items and their reviews after items or reviews changed.
+        """
+        self._item_review_indices, self._item_review_offsets = self._create_item_review_postings(
+            self._review_item_index, self._item_ids.size)
+        self._item_name_ids = self._create_item_name_ids()
+
+    def _get_active_items(self, item_indices_to_keep: list[int]) -> list[int]:
+        """
+        Return the items to keep that are not deactivated.
+
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: the items in item_indices_to_keep that are active
+        """
+        if bool(self._is_item_active.all()):
+            return item_indices_to_keep
+        item_indices_to_keep = torch.as_tensor(item_indices_to_keep, dtype=torch.int64)
+        return item_indices_to_keep[self._is_item_active[item_indices_to_keep]].tolist()
+
+    def _get_topk_items_and_reviews(self, similarity_score_item: torch.Tensor,
+                                    index_most_similar_review: torch.Tensor, topk_items: int,
+                                    unacceptable_similarity_range: float,
+                                    max_number_similar_items: int) -> tuple[list[list[str]], list[list[list[str]]]]:
+        """
+        Select the most similar items from the item similarity scores and return their item ids and reviews.
+
+        :param similarity_score_item: The similarity score for each item
+        :param index_most_similar_review: A tensor that contains the index of top k reviews for each item
+        :param topk_items: Number of items to be returned
+        :param unacceptable_similarity_range: range of similarity scores that would be considered too small to be able to recommend right away
+        :param max_number_similar_items: max number of similar items
+        :return: Return a tuple with element 0 being the grouped item ids and element 1 being the grouped reviews
+        """
         most_similar_item_index = self._most_similar_item(similarity_score_item, topk_items,
                                                           unacceptable_similarity_range, max_number_similar_items)
         list_of_item_id = self._get_topk_item_id(most_similar_item_index, index_most_similar_review)
@@ -61,6 +294,202 @@ class SearchEngine:
         """
         raise NotImplementedError()
 
+    def _similarity_score_each_review_batch(self, queries: torch.Tensor) -> torch.Tensor:
+        """
+        This function finds and returns a tensor that contains the similarity score between each query and
+        each review. Subclasses should override this when they can score all queries in one pass.
+
+        :param queries: A tensor containing one query embedding per row
+        :return: A pytorch tensor whose row i contains the similarity score for each review with query i
+        """
+        return torch.stack([self._similarity_score_each_review(query) for query in queries])
+
+    def _similarity_score_reviews_subset(self, query: torch.Tensor, review_indices: torch.Tensor) -> torch.Tensor:
+        """
+        This function finds and returns a tensor that contains the similarity score for the given reviews only.
+        Subclasses should override this when they can score a subset of reviews without scoring all of them.
+
+        :param query: A tensor containing the query embedding
+        :param review_indices: A tensor containing the indices of the reviews to score
+        :return: A pytorch tensor that contains the similarity score for each review in review_indices
+        """
+        return self._similarity_score_each_review(query)[review_indices]
+
+    def _similarity_score_reviews_subset_batch(self, queries: torch.Tensor,
+                                               review_indices: torch.Tensor) -> torch.Tensor:
+        """
+        This function finds and returns a tensor that contains the similarity score between each query and
+        the given reviews only.
+
+        :param queries: A tensor containing one query embedding per row
+        :param review_indices: A tensor containing the indices of the reviews to score
+        :return: A pytorch tensor whose row i contains the similarity score for each review in review_indices
+                with query i
+        """
+        return self._similarity_score_each_review_batch(queries)[:, review_indices]
+
+    def _similarity_score_kept_items(self, query: torch.Tensor, k: int,
+                                     item_indices_to_keep: list[int]) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        This function finds the similarity score for each item, where items that are not kept have score 0.
+        When coarse retrieval is enabled, kept items that are not coarse candidates also have score 0.
+
+        :param query: A tensor containing the query embedding
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: Returning a tuple with element 0 being a tensor that contains the similarity score for each item
+                and element 1 being a tensor that contains the index of top k reviews for each item
+        """
+        if self._should_retrieve_coarse_candidates(item_indices_to_keep):
+            item_indices_to_keep = self._get_coarse_candidate_items(query.unsqueeze(0), item_indices_to_keep)[0]
+        elif not self._should_score_candidates_only(item_indices_to_keep):
+            similarity_score_review = self._similarity_score_each_review(query)
+            return self._similarity_score_filtered_items(similarity_score_review, k, item_indices_to_keep)
+
+        candidate_reviews = self._get_candidate_reviews(item_indices_to_keep)
+        similarity_score_review = self._similarity_score_reviews_subset(query, candidate_reviews[1])
+        return self._similarity_score_candidate_items(similarity_score_review, k, *candidate_reviews)
+
+    def _similarity_score_kept_items_batch(self, queries: torch.Tensor, k: int, item_indices_to_keep: list[int]) \
+            -> list[tuple[torch.Tensor, torch.Tensor]]:
+        """
+        This function does the same as _similarity_score_kept_items for each query, scoring all queries in one pass.
+
+        :param queries: A tensor containing one query embedding per row
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: A list containing the output of _similarity_score_kept_items for each query
+        """
+        if self._should_retrieve_coarse_candidates(item_indices_to_keep):
+            # every query has its own candidate items, so their reviews are scored separately
+            output = []
+            for query, candidate_items in zip(queries,
+                                              self._get_coarse_candidate_items(queries, item_indices_to_keep)):
+                candidate_reviews = self._get_candidate_reviews(candidate_items)
+                similarity_score_review = self._similarity_score_reviews_subset(query, candidate_reviews[1])
+                output.append(self._similarity_score_candidate_items(similarity_score_review, k, *candidate_reviews))
+            return output
+
+        if self._should_score_candidates_only(item_indices_to_keep):
+            candidate_reviews = self._get_candidate_reviews(item_indices_to_keep)
+            similarity_score_reviews = self._similarity_score_reviews_subset_batch(queries, candidate_reviews[1])
+            return [self._similarity_score_candidate_items(similarity_score_review, k, *candidate_reviews)
+                    for similarity_score_review in similarity_score_reviews]
+
+        similarity_score_reviews = self._similarity_score_each_review_batch(queries)
+        return [self._similarity_score_filtered_items(similarity_score_review, k, item_indices_to_keep)
+                for similarity_score_review in similarity_score_reviews]
+
+    def _should_score_candidates_only(self, item_indices_to_keep: list[int]) -> bool:
+        """
+        Return whether only the reviews of the kept items should be scored.
+
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: whether only the reviews of the kept items should be scored
+        """
+        return self._score_candidates_only and len(item_indices_to_keep) < self._item_review_offsets.size(0) - 1
+
+    def _should_retrieve_coarse_candidates(self, item_indices_to_keep: list[int]) -> bool:
+        """
+        Return whether the items whose reviews are scored should first be narrowed down using the item embeddings.
+
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: whether coarse candidate items should be retrieved
+        """
+        return 0 < self._num_coarse_candidate_items < len(item_indices_to_keep)
+
+    def _get_coarse_candidate_items(self, queries: torch.Tensor,
+                                    item_indices_to_keep: list[int]) -> list[torch.Tensor]:
+        """
+        Pick the kept items whose pooled embedding is the most similar to each query.
+
+        :param queries: A tensor containing one query embedding per row
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: A list containing, for each query, a tensor with the indices of its num_coarse_candidate_items
+                most similar kept items
+        """
+        kept_items = torch.unique(torch.as_tensor(item_indices_to_keep, dtype=torch.int64))
+        similarity_score_kept_item = torch.matmul(
+            queries.to(self._item_embedding_matrix.dtype), self._item_embedding_matrix[kept_items].T)
+        num_candidates = min(self._num_coarse_candidate_items, kept_items.size(0))
+        candidate_positions = torch.topk(similarity_score_kept_item, num_candidates, dim=1).indices
+        return list(kept_items[candidate_positions])
+
+    def _similarity_score_filtered_items(self, similarity_score_review: torch.Tensor, k: int,
+                                         item_indices_to_keep: list[int]) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        This function fuses the similarity score of every review into item similarity scores and zeroes the
+        items that are not kept.
+
+        :param similarity_score_review: A tensor of similarity score between each review and the query
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: Returning a tuple with element 0 being a tensor that contains the similarity score for each item
+                and element 1 being a tensor that contains the index of top k reviews for each item
+        """
+        similarity_score_item, index_most_similar_review = self._similarity_score_each_item(
+            similarity_score_review, k)
+        similarity_score_item = self._filter_item_similarity_score(similarity_score_item, item_indices_to_keep)
+        return similarity_score_item, index_most_similar_review
+
+    def _get_candidate_reviews(self, item_indices_to_keep: list[int]) \
+            -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Gather the reviews of the items to keep.
+
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: Returning a tuple with element 0 being the sorted unique indices of the items to keep and
+                elements 1 to 3 being the output of _get_reviews_of_items for those items
+        """
+        candidate_items = torch.unique(torch.as_tensor(item_indices_to_keep, dtype=torch.int64))
+        return candidate_items, *self._get_reviews_of_items(candidate_items)
+
+    def _similarity_score_candidate_items(self, similarity_score_review: torch.Tensor, k: int,
+                                          candidate_items: torch.Tensor, review_indices: torch.Tensor,
+                                          review_item_position: torch.Tensor,
+                                          review_offsets: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        This function fuses the similarity score of the reviews of the candidate items into item similarity scores.
+        The output has the same structure as when every review is scored and non kept items are zeroed.
+
+        :param similarity_score_review: A tensor of similarity score between each review in review_indices and the query
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :param candidate_items: A tensor containing the indices of the candidate items
+        :param review_indices: A tensor containing the indices of the reviews of the candidate items
+        :param review_item_position: A tensor containing the position in candidate_items of the item each review belongs to
+        :param review_offsets: A tensor containing the offsets of the reviews of each candidate item in review_indices
+        :return: Returning a tuple with element 0 being a tensor that contains the similarity score for each item
+                and element 1 being a tensor that contains the index of top k reviews for each item
+        """
+        num_items = self._item_review_offsets.size(0) - 1
+        candidate_score, candidate_review_position = self._late_fusion(
+            similarity_score_review, review_item_position, review_offsets, k)
+
+        similarity_score_item = torch.zeros(num_items, dtype=similarity_score_review.dtype)
+        similarity_score_item[candidate_items] = candidate_score
+        index_most_similar_review = torch.full((num_items, k), -1, dtype=torch.int64)
+        index_most_similar_review[candidate_items] = torch.where(
+            candidate_review_position >= 0, review_indices[candidate_review_position.clamp(min=0)], -1)
+        return similarity_score_item, index_most_similar_review
+
+    def _get_reviews_of_items(self, item_indices: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Gather the review ranges of the given items using the item review offsets.
+
+        :param item_indices: A tensor containing indices of the items
+        :return: Returning a tuple with element 0 being the indices of the reviews of the given items,
+                element 1 being the position in item_indices of the item each of those reviews belongs to and
+                element 2 being the offsets of the reviews of each given item within element 0
+        """
+        review_starts = self._item_review_offsets[item_indices]
+        review_counts = self._item_review_offsets[item_indices + 1] - review_starts
+        review_offsets = torch.cat((torch.zeros(1, dtype=torch.int64), review_counts.cumsum(0)))
+        review_item_position = torch.repeat_interleave(torch.arange(item_indices.size(0)), review_counts)
+        review_indices = self._item_review_indices[review_starts[review_item_position] +
+                                                   torch.arange(review_item_position.size(0)) -
+                                                   review_offsets[review_item_position]]
+        return review_indices, review_item_position, review_offsets
+
     def _similarity_score_each_item(self, similarity_score: torch.Tensor,
                                     k: int) -> tuple[torch.Tensor, torch.Tensor]:
         """
@@ -71,31 +500,94 @@ class SearchEngine:
         :return: Returning a tuple with element 0 being a tensor that contains the similarity score for each item
                 and element 1 being a tensor that contains the index of top k reviews for each item
         """
-        prev_id = self._review_item_ids[0]
-        item_score = []
-        item_index = []
-        index_start = 0
-        for i in range(self._review_item_ids.size + 1):
-            if i == self._review_item_ids.size or self._review_item_ids[i] != prev_id:
-                similarity_score_item = similarity_score[index_start:i]
-                k_actual = min(i - index_start, k)
-                values, index_topk = similarity_score_item.topk(k_actual)
-                index_topk += index_start
-                item_score.append(values.mean(dim=0))
-
-                if index_topk.size()[0] != k:
-                    padding = torch.full((k - index_topk.size()[0],), -1, dtype=torch.int64)
-                    index_topk = torch.cat((index_topk, padding), dim=0)
-                item_index.append(index_topk)
-
-                index_start = i
-            if i != self._review_item_ids.size:
-                prev_id = self._review_item_ids[i]
-
-        item_score = torch.stack(item_score)
-        item_index = torch.stack(item_index)
+        if self._item_review_indices.size(0) == self._review_item_index.size(0):
+            return self._late_fusion(similarity_score, self._review_item_index, self._item_review_offsets, k)
+
+        # removed reviews belong to an extra item following the last item, which is dropped after late fusion
+        item_review_offsets = torch.cat((self._item_review_offsets, torch.tensor([self._review_item_index.size(0)])))
+        similarity_score_item, index_most_similar_review = self._late_fusion(
+            similarity_score, self._review_item_index, item_review_offsets, k)
+        return similarity_score_item[:-1], index_most_similar_review[:-1]
+
+    @staticmethod
+    def _late_fusion(similarity_score: torch.Tensor, review_item_index: torch.Tensor,
+                     item_review_offsets: torch.Tensor, k: int) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Compute the mean of the top k review scores of each item and the indices of those reviews with
+        batched tensor operations.
+
+        :param similarity_score: A tensor of similarity score between each review and the query
+        :param review_item_index: A tensor storing the index of the item each review belongs to
+        :param item_review_offsets: A tensor where reviews of item i start at offset i and end before offset i + 1
+        once the reviews are grouped by item
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :return: Returning a tuple with element 0 being a tensor that contains the similarity score for each item
+                and element 1 being a tensor that contains the index of top k reviews for each item, padded with -1
+        """
+        num_items = item_review_offsets.size(0) - 1
+
+        # order reviews by item and, within each item, from the most similar to the least similar review
+        review_order = torch.argsort(similarity_score, descending=True, stable=True)
+        review_order = review_order[torch.argsort(review_item_index[review_order], stable=True)]
+        sorted_item_index = review_item_index[review_order]
+        review_rank = torch.arange(review_order.size(0)) - item_review_offsets[sorted_item_index]
+
+        is_topk = review_rank < k
+        topk_review_index = review_order[is_topk]
+        topk_item_index = sorted_item_index[is_topk]
+        topk_review_rank = review_rank[is_topk]
+
+        item_index = torch.full((num_items, k), -1, dtype=torch.int64)
+        item_index[topk_item_index, topk_review_rank] = topk_review_index
+
+        topk_values = torch.zeros((num_items, k), dtype=similarity_score.dtype)
+        topk_values[topk_item_index, topk_review_rank] = similarity_score[topk_review_index]
+        # items without reviews get a score of 0
+        num_topk_reviews = item_review_offsets.diff().clamp(min=1, max=k)
+        item_score = topk_values.sum(dim=1) / num_topk_reviews
+
         return item_score, item_index
 
+    @staticmethod
+    def _create_item_review_postings(review_item_index: torch.Tensor,
+                                     num_items: int) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Create CSR style postings of the reviews of each item, so that reviews of the same item don't need to be
+        stored next to each other.
+
+        :param review_item_index: A tensor storing the index of the item each review belongs to, where removed
+        reviews belong to item num_items
+        :param num_items: number of items
+        :return: Returning a tuple with element 0 being a tensor storing the indices of the reviews grouped by item
+                and element 1 being a tensor where the reviews of item i are stored in element 0 from offset i up to
+                (not including) offset i + 1
+        """
+        review_counts = torch.bincount(review_item_index, minlength=num_items + 1)[:num_items]
+        item_review_offsets = torch.cat((torch.zeros(1, dtype=torch.int64), review_counts.cumsum(0)))
+        # removed reviews are sorted last and dropped
+        item_review_indices = torch.argsort(review_item_index, stable=True)[:int(item_review_offsets[-1])]
+        return item_review_indices, item_review_offsets
+
+    def _create_item_name_ids(self) -> torch.Tensor:
+        """
+        Create a tensor storing an integer id of the name of each item, such that items with the same name
+        have the same id.
+
+        :return: A tensor whose element i is the id of the name of item i
+        """
+        num_items = self._item_review_offsets.size(0) - 1
+        if self._metadata_wrapper is None:
+            return -1 - torch.arange(num_items)
+
+        names = self._metadata_wrapper.items_metadata['name']
+        name_ids = pd.Series(pd.factorize(names)[0], index=names.index).reindex(range(num_items))
+
+        # items missing from the metadata never share a name with another item
+        missing_items = name_ids.isna().to_numpy()
+        name_ids = name_ids.to_numpy(dtype=np.float64, na_value=0).astype(np.int64)
+        name_ids[missing_items] = -1 - np.flatnonzero(missing_items)
+        return torch.from_numpy(name_ids)
+
     def _most_similar_item(self, similarity_score_item: torch.Tensor, top_k_items: int,
                            unacceptable_similarity_range: float, max_number_similar_items: int) -> torch.Tensor:
         """
@@ -109,49 +601,68 @@ class SearchEngine:
         Indices are grouped by similarity scores, so if values are too close together they will be considered 1 group.
         It returns at most top_k_items *  max_number_similar_items indices.
         """
-        values, indices = torch.sort(similarity_score_item, descending=True)
-
-        num_non_zero_value = torch.nonzero(values).size(0)
-        if num_non_zero_value == 0:
+        if not torch.any(similarity_score_item != 0):
             raise Exception("There are no items that match.")
-        
-        topk_indices = torch.full((top_k_items, max_number_similar_items), -1)
-        topk_indices[0][0] = indices[0]
-        item_name = self._metadata_wrapper.get_item_dict_from_index(int(indices[0]))['name']
-        item_names = {item_name}
 
-        item_score = values[0]
-        
+        # only the best items can end up in a group, so select a few more than the number of slots and
+        # select more when zeros or items with already selected names leave some groups unfilled
+        num_items = similarity_score_item.size(0)
+        num_candidates = min(2 * top_k_items * max_number_similar_items, num_items)
+        while True:
+            values, indices = torch.topk(similarity_score_item, num_candidates)
+            topk_indices, is_complete = self._group_similar_items(
+                values, indices, top_k_items, unacceptable_similarity_range, max_number_similar_items)
+            if is_complete or num_candidates == num_items:
+                return topk_indices
+            num_candidates = min(2 * num_candidates, num_items)
+
+    def _group_similar_items(self, values: torch.Tensor, indices: torch.Tensor, top_k_items: int,
+                             unacceptable_similarity_range: float,
+                             max_number_similar_items: int) -> tuple[torch.Tensor, bool]:
+        """
+        Group the given items sorted from the most similar to the least similar.
+
+        :param values: The similarity score of the items sorted in descending order
+        :param indices: The indices of the items corresponding to values
+        :param top_k_items: Number of groups to return
+        :param unacceptable_similarity_range: range of similarity scores that would be considered too small to be able to recommend right away
+        :param max_number_similar_items: max number of items in a group
+        :return: Returning a tuple with element 0 being the grouped indices of the items padded with -1 and
+                element 1 being whether more items could not change the groups
+        """
+        topk_indices = torch.full((top_k_items, max_number_similar_items), -1, dtype=torch.int64)
+
+        # the most similar item is always used, other items are used when they have non zero score and a name
+        # that is not used by a more similar item
+        is_usable = values != 0
+        is_usable[0] = True
+        usable_position = torch.nonzero(is_usable).squeeze(1)
+        _, name_group = torch.unique(self._item_name_ids[indices[usable_position]], return_inverse=True)
+        first_position = torch.full((int(name_group.max()) + 1,), usable_position.size(0), dtype=torch.int64)
+        first_position.scatter_reduce_(0, name_group, torch.arange(usable_position.size(0)), reduce="amin")
+        usable_position = usable_position[torch.sort(first_position).values]
+        values = values[usable_position]
+        indices = indices[usable_position]
+
         # A group: a group of indices that would be considred 1 "1 item" so where there similarity score is less than 0.5
         # number of groups = number of top k items
-        # max values (or items) per group 
+        # max values (or items) per group
+        group_start = 0
         num_groups = 0
-        num_vals = 0
-        
-        for iteration in range(1, len(values)):
-            if values[iteration] != 0:
-                item_name = self._metadata_wrapper.get_item_dict_from_index(int(indices[iteration]))['name']
-                if item_name in item_names:
-                    continue
-
-                if item_score - values[iteration] <= unacceptable_similarity_range and \
-                        num_vals <= max_number_similar_items - 2:
-                    num_vals += 1
-
-                else:
-                    item_score = values[iteration]
-                    num_groups += 1
-                    num_vals = 0
-                    
-                    # If it exceeds max number of items per group
-                    if num_groups == top_k_items:
-                        break
-
-                item_names.add(item_name)
-                topk_indices[num_groups][num_vals] = indices[iteration]
-
-        # sometimes indices are a float for whatever reason
-        return topk_indices.to(torch.int64)
+        is_last_group_full = False
+        while group_start < values.size(0) and num_groups < top_k_items:
+            item_score = values[group_start]
+            followers = values[group_start + 1:group_start + max_number_similar_items]
+            num_followers = int(torch.cumprod(item_score - followers <= unacceptable_similarity_range, dim=0).sum())
+            group_end = group_start + 1 + num_followers
+
+            topk_indices[num_groups][:group_end - group_start] = indices[group_start:group_end]
+            is_last_group_full = group_end - group_start == max_number_similar_items
+            num_groups += 1
+            group_start = group_end
+
+        is_complete = num_groups == top_k_items and (is_last_group_full or group_start < values.size(0))
+        return topk_indices, is_complete
 
     @staticmethod
     def _filter_item_similarity_score(similarity_score_item: torch.Tensor, id_index: list[int]) -> torch.Tensor:
@@ -175,7 +686,7 @@ class SearchEngine:
             id_group = []
             for j in range(len(most_similar_item_index[i])):
                 if int(most_similar_item_index[i][j]) != -1:
-                    id_group.append(self._review_item_ids[index_most_similar_review[int(most_similar_item_index[i][j])][0]])
+                    id_group.append(self._item_ids[int(most_similar_item_index[i][j])])
             if id_group != []:
                 list_of_id.append(id_group)
         return list_of_id
@@ -197,7 +708,9 @@ class SearchEngine:
                 if index != -1:
                     item_review_list = []
                     for j in index_most_similar_review[index]:
-                        item_review_list.append(self._reviews[j])
+                        # items with fewer than k scored reviews are padded with -1, which is not a review
+                        if j >= 0:
+                            item_review_list.append(self._reviews[j])
                     item_group_review_list.append(item_review_list)
             if item_group_review_list != []:
                 review_list.append(item_group_review_list)
@@ -1,29 +1,67 @@
 import torch
 import numpy as np
-from information_retriever.embedder.bert_embedder import BERT_model
+from information_retriever.embedder.embedder import Embedder
 from information_retriever.metadata_wrapper import MetadataWrapper
+from information_retriever.review_store import ReviewStore
 from information_retriever.vector_database import VectorDataBase
 from information_retriever.search_engine.search_engine import SearchEngine
 
 
 class VectorDatabaseSearchEngine(SearchEngine):
     """
-    Class that is responsible for searching for topk most relevant items using BERT_model.
+    Class that is responsible for searching for topk most relevant items using Embedder.
 
-    :param embedder: BERT_model to embed query
+    :param embedder: Embedder to embed query
     :param review_item_ids: item ids corresponding to reviews
-    :param reviews: reviews of the items
+    :param reviews: reviews of the items, either in memory or in a review store reading them from disk on demand
     :param database: FAISS database containing embeddings of the reviews
+    :param metadata_wrapper: holds metadata of the items
+    :param num_candidate_reviews: number of most similar reviews retrieved from the database to do late fusion on.
+    If it is 0, every review in the database is scored.
+    :param score_candidates_only: whether to only score the reviews of the items that must be kept
+    :param item_embedding_matrix: matrix storing the pooled embedding of each item, used to pick coarse candidates
+    :param num_coarse_candidate_items: number of items picked with item_embedding_matrix whose reviews are scored.
+    If it is 0, the reviews of every kept item are scored.
     """
-    _embedder: BERT_model
+    _embedder: Embedder
     _review_item_ids: np.ndarray
-    _reviews: np.ndarray
+    _reviews: np.ndarray | ReviewStore
     _database: VectorDataBase
+    _num_candidate_reviews: int
 
-    def __init__(self, embedder: BERT_model, review_item_ids: np.ndarray, reviews: np.ndarray,
-                 database: VectorDataBase, metadata_wrapper: MetadataWrapper):
-        super().__init__(embedder, review_item_ids, reviews, metadata_wrapper)
+    def __init__(self, embedder: Embedder, review_item_ids: np.ndarray, reviews: np.ndarray | ReviewStore,
+                 database: VectorDataBase, metadata_wrapper: MetadataWrapper, num_candidate_reviews: int = 0,
+                 score_candidates_only: bool = False, item_embedding_matrix: torch.Tensor = None,
+                 num_coarse_candidate_items: int = 0):
+        super().__init__(embedder, review_item_ids, reviews, metadata_wrapper, score_candidates_only,
+                         item_embedding_matrix, num_coarse_candidate_items)
         self._database = database
+        self._num_candidate_reviews = num_candidate_reviews
+
+    def _add_review_embeddings(self, embeddings: np.ndarray, review_indices: np.ndarray) -> None:
+        """
+        Add the embeddings of new reviews to the database.
+
+        :param embeddings: embeddings of the reviews, one per row
+        :param review_indices: indices of the reviews
+        """
+        self._database.add_vectors(embeddings, review_indices)
+
+    def _can_remove_review_embeddings(self) -> bool:
+        """
+        Return whether the embeddings of reviews can be removed from the database.
+
+        :return: whether vectors can be removed from the database
+        """
+        return self._database.can_remove_vectors()
+
+    def _remove_review_embeddings(self, review_indices: np.ndarray) -> None:
+        """
+        Remove the embeddings of the given reviews from the database.
+
+        :param review_indices: indices of the reviews
+        """
+        self._database.remove_vectors(review_indices)
 
     def _similarity_score_each_review(self, query: torch.Tensor) -> torch.Tensor:
         """
@@ -33,3 +71,105 @@ class VectorDatabaseSearchEngine(SearchEngine):
         :return: A pytorch tensor that contains the similarity score for each review
         """
         return self._database.find_similarity_vector(query)
+
+    def _similarity_score_each_review_batch(self, queries: torch.Tensor) -> torch.Tensor:
+        """
+        Return a tensor that contains the similarity score between each query and each review using a single
+        batched search in the database.
+
+        :param queries: A tensor containing one query embedding per row
+        :return: A pytorch tensor whose row i contains the similarity score for each review with query i
+        """
+        return self._database.find_similarity_matrix(queries)
+
+    def _similarity_score_reviews_subset(self, query: torch.Tensor, review_indices: torch.Tensor) -> torch.Tensor:
+        """
+        Return a tensor that contains the similarity score for the given reviews only
+
+        :param query: A tensor containing the query embedding
+        :param review_indices: A tensor containing the indices of the reviews to score
+        :return: A pytorch tensor that contains the similarity score for each review in review_indices
+        """
+        return self._database.find_similarity_subset(query, review_indices)[0]
+
+    def _similarity_score_reviews_subset_batch(self, queries: torch.Tensor,
+                                               review_indices: torch.Tensor) -> torch.Tensor:
+        """
+        Return a tensor that contains the similarity score between each query and the given reviews only
+
+        :param queries: A tensor containing one query embedding per row
+        :param review_indices: A tensor containing the indices of the reviews to score
+        :return: A pytorch tensor whose row i contains the similarity score for each review in review_indices
+                with query i
+        """
+        return self._database.find_similarity_subset(queries, review_indices)
+
+    def _similarity_score_kept_items(self, query: torch.Tensor, k: int,
+                                     item_indices_to_keep: list[int]) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Return the similarity score for each item, where items that are not kept have score 0. If
+        num_candidate_reviews is set, late fusion is done on the most similar reviews retrieved from the
+        database only.
+
+        :param query: A tensor containing the query embedding
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: Returning a tuple with element 0 being a tensor that contains the similarity score for each item
+                and element 1 being a tensor that contains the index of top k reviews for each item
+        """
+        if self._num_candidate_reviews <= 0:
+            return super()._similarity_score_kept_items(query, k, item_indices_to_keep)
+
+        similarity_score_review, review_indices = \
+            self._database.find_most_similar_vectors(query, self._num_candidate_reviews)[0]
+        return self._similarity_score_retrieved_reviews(query, similarity_score_review, review_indices, k,
+                                                        item_indices_to_keep)
+
+    def _similarity_score_kept_items_batch(self, queries: torch.Tensor, k: int, item_indices_to_keep: list[int]) \
+            -> list[tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Return the output of _similarity_score_kept_items for each query, searching the database for all
+        queries at once.
+
+        :param queries: A tensor containing one query embedding per row
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: A list containing the output of _similarity_score_kept_items for each query
+        """
+        if self._num_candidate_reviews <= 0:
+            return super()._similarity_score_kept_items_batch(queries, k, item_indices_to_keep)
+
+        return [
+            self._similarity_score_retrieved_reviews(query, similarity_score_review, review_indices, k,
+                                                     item_indices_to_keep)
+            for query, (similarity_score_review, review_indices) in zip(
+                queries, self._database.find_most_similar_vectors(queries, self._num_candidate_reviews))
+        ]
+
+    def _similarity_score_retrieved_reviews(self, query: torch.Tensor, similarity_score_review: torch.Tensor,
+                                            review_indices: torch.Tensor, k: int,
+                                            item_indices_to_keep: list[int]) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Do late fusion on the reviews retrieved from the database. If none of the kept items has a retrieved
+        review, every review is scored instead.
+
+        :param query: A tensor containing the query embedding
+        :param similarity_score_review: A tensor of similarity score between each retrieved review and the query
+        :param review_indices: A tensor containing the indices of the retrieved reviews
+        :param k: A number that tells the number of most similar tensors to look at when doing late fusion(k)
+        :param item_indices_to_keep: Stores the item id to keep in a list of int
+        :return: Returning a tuple with element 0 being a tensor that contains the similarity score for each item
+                and element 1 being a tensor that contains the index of top k reviews for each item
+        """
+        candidate_items, review_item_position = torch.unique(
+            self._review_item_index[review_indices], return_inverse=True)
+        review_offsets = torch.cat((torch.zeros(1, dtype=torch.int64),
+                                    torch.bincount(review_item_position, minlength=candidate_items.size(0)).cumsum(0)))
+
+        similarity_score_item, index_most_similar_review = self._similarity_score_candidate_items(
+            similarity_score_review, k, candidate_items, review_indices, review_item_position, review_offsets)
+        similarity_score_item = self._filter_item_similarity_score(similarity_score_item, item_indices_to_keep)
+
+        if not torch.any(similarity_score_item != 0):
+            return super()._similarity_score_kept_items(query, k, item_indices_to_keep)
+        return similarity_score_item, index_most_similar_review
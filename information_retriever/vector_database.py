@@ -1,20 +1,30 @@
+import numpy as np
 import torch
 import faiss
 
 
 class VectorDataBase:
     """
-    This class wraps around FAISS vector database that stores embeddings corresponding to the reviews
+    This class wraps around FAISS vector database that stores embeddings corresponding to the reviews.
+    Each vector is identified by the index of its review. If the database is an IVF index or is wrapped in a
+    faiss.IndexIDMap2, vectors can be added and removed without changing the index of the other reviews,
+    otherwise the index of a review is the position of its vector in the database.
 
     :param storage: Stores the vector database
+    :param nprobe: number of inverted lists visited by a search when the database is an IVF index
+    :param ef_search: size of the candidate list explored by a search when the database is an HNSW index
     """
 
     _ntotal: int
     _storage: faiss.Index
+    _vector_ids: np.ndarray | None
+    _vector_positions: np.ndarray | None
 
-    def __init__(self, storage: faiss.Index):
+    def __init__(self, storage: faiss.Index, nprobe: int = None, ef_search: int = None):
         self._storage = storage
         self._ntotal = self._storage.ntotal
+        self._update_vector_ids()
+        self._set_search_parameters(nprobe, ef_search)
 
     def find_similarity_vector(self, query: torch.Tensor) -> torch.Tensor:
         """
@@ -23,16 +33,233 @@ class VectorDataBase:
         :param query: query embedding
         :return: The similarity score between the query and each vector in the database in respect to the index.
         """
-        query = query.reshape(-1, self._storage.d)
-        D, I = self._storage.search(query, self._storage.ntotal)
-        D = D[0]
-        I = I[0]  # For some reason FAISS return a numpy within a numpy that contains all the answer.
+        return self.find_similarity_matrix(query)[0]
 
-        output = [False] * self._ntotal
-        for i, index in enumerate(I):
-            output[index] = D[i]
+    def find_similarity_matrix(self, queries: torch.Tensor) -> torch.Tensor:
+        """
+        This function finds the similarity between each query and the vectors in the database with a single
+        batched search.
+
+        :param queries: query embeddings, one per row
+        :return: The similarity score between each query and each vector in the database in respect to the index,
+        where row i corresponds to query i.
+        """
+        queries = np.ascontiguousarray(queries.reshape(-1, self._storage.d), dtype=np.float32)
+
+        vectors = self._get_flat_vectors()
+        if vectors is not None:
+            # the inner product with every vector is exactly what an exhaustive search computes, without the sort
+            similarity_score = np.matmul(queries, vectors.T)
+            if self._vector_ids is not None:
+                similarity_score_by_id = np.zeros((queries.shape[0], self._ntotal), dtype=np.float32)
+                similarity_score_by_id[:, self._vector_ids] = similarity_score
+                similarity_score = similarity_score_by_id
+            return torch.from_numpy(similarity_score)
+
+        index_ivf = faiss.try_extract_index_ivf(self._storage)
+        if index_ivf is not None:
+            # visit every inverted list so that every vector gets a score
+            search_parameters = faiss.SearchParametersIVF()
+            search_parameters.nprobe = index_ivf.nlist
+            D, I = self._storage.search(queries, self._storage.ntotal, params=search_parameters)
+        else:
+            D, I = self._storage.search(queries, self._storage.ntotal)
+        return torch.from_numpy(self._scatter_search_result(D, I))
+
+    def find_similarity_subset(self, queries: torch.Tensor, vector_indices: torch.Tensor) -> torch.Tensor:
+        """
+        This function finds the similarity between each query and the given vectors in the database only.
+        If the vectors are stored in a flat index, only those vectors are multiplied with the queries.
+
+        :param queries: query embeddings, one per row
+        :param vector_indices: indices of the vectors in the database to score
+        :return: The similarity score between each query and each vector in vector_indices, where row i
+        corresponds to query i.
+        """
+        vectors = self._get_flat_vectors()
+        if vectors is None:
+            return self.find_similarity_matrix(queries)[:, vector_indices]
+
+        vector_positions = np.asarray(vector_indices)
+        if self._vector_positions is not None:
+            vector_positions = self._vector_positions[vector_positions]
+        queries = np.ascontiguousarray(queries.reshape(-1, self._storage.d), dtype=np.float32)
+        return torch.from_numpy(np.matmul(queries, vectors[vector_positions].T))
+
+    def find_most_similar_vectors(self, queries: torch.Tensor, k: int) -> list[tuple[torch.Tensor, torch.Tensor]]:
+        """
+        This function searches the database for the k vectors most similar to each query. Unlike
+        find_similarity_vector, only the returned vectors are scored, so approximate indexes never visit
+        the whole database.
+
+        :param queries: query embeddings, one per row
+        :param k: number of vectors to return for each query
+        :return: For each query, a tuple with element 0 being the similarity scores of the most similar vectors
+        in descending order and element 1 being the indices of those vectors in the database
+        """
+        queries = np.ascontiguousarray(queries.reshape(-1, self._storage.d), dtype=np.float32)
+        D, I = self._storage.search(queries, min(k, self._storage.ntotal))
+
+        most_similar_vectors = []
+        for distances, indices in zip(D, I):
+            is_found = indices >= 0
+            most_similar_vectors.append((torch.from_numpy(distances[is_found]), torch.from_numpy(indices[is_found])))
+        return most_similar_vectors
+
+    def add_vectors(self, vectors: np.ndarray, vector_indices: np.ndarray) -> None:
+        """
+        Add vectors to the database with the given indices. Unless the database is an IVF index or is wrapped in
+        a faiss.IndexIDMap2, the indices must follow the last vector in the database.
+
+        :param vectors: vectors to add, one per row
+        :param vector_indices: index of each vector
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        vector_indices = np.asarray(vector_indices, dtype=np.int64)
+        if self._has_vector_ids():
+            self._storage.add_with_ids(vectors, vector_indices)
+        elif np.array_equal(vector_indices, np.arange(self._storage.ntotal, self._storage.ntotal + len(vectors))):
+            self._storage.add(vectors)
+        else:
+            raise ValueError("Vectors can only be added with arbitrary indices to an IVF or ID mapped database")
+        self._update_vector_ids()
+
+    def remove_vectors(self, vector_indices: np.ndarray) -> None:
+        """
+        Remove the vectors with the given indices from the database. Indices of the other vectors don't change.
+        Only IVF databases and databases wrapped in a faiss.IndexIDMap2 whose index supports removal, which
+        excludes HNSW, can remove vectors.
+
+        :param vector_indices: indices of the vectors to remove
+        """
+        if not self.can_remove_vectors():
+            raise ValueError("Vectors can only be removed from an IVF or ID mapped database that isn't HNSW")
+        self._storage.remove_ids(np.asarray(vector_indices, dtype=np.int64))
+        self._update_vector_ids()
+
+    def can_remove_vectors(self) -> bool:
+        """
+        Return whether vectors can be removed from the database.
+
+        :return: whether the database is an IVF index or is wrapped in a faiss.IndexIDMap2, and isn't HNSW
+        """
+        return self._has_vector_ids() and not isinstance(self._get_unmapped_storage(), faiss.IndexHNSW)
+
+    def save(self, output_filepath: str) -> None:
+        """
+        Save the database to output_filepath.
+
+        :param output_filepath: file path to save the database
+        """
+        faiss.write_index(self._storage, output_filepath)
+
+    def _update_vector_ids(self) -> None:
+        """
+        Update the mapping between the index of each vector and its position in the database. Scores are
+        returned for every index up to the largest index ever stored, where removed vectors have no position.
+        """
+        self._vector_ids = None
+        self._vector_positions = None
+        vector_ids = self.get_vector_ids(self._storage)
+        if vector_ids is None:
+            self._ntotal = self._storage.ntotal
+            return
+
+        index_ivf = faiss.try_extract_index_ivf(self._storage)
+        self._ntotal = max(self._ntotal, int(vector_ids.max()) + 1 if vector_ids.size > 0 else 0)
+        if index_ivf is not None and index_ivf.direct_map.type == faiss.DirectMap.Array:
+            # an array direct map only allows adding vectors in order, while a hashtable allows any index
+            index_ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        if not isinstance(self._storage, faiss.IndexIDMap2) or np.array_equal(vector_ids, np.arange(self._ntotal)):
+            # the position of each vector is its index, as in databases that were never changed
+            return
+
+        self._vector_ids = vector_ids
+        self._vector_positions = np.full(self._ntotal, -1, dtype=np.int64)
+        self._vector_positions[vector_ids] = np.arange(vector_ids.size)
+
+    @staticmethod
+    def get_vector_ids(storage: faiss.Index) -> np.ndarray | None:
+        """
+        Return the index of each vector stored in a database that stores vectors with their index.
+
+        :param storage: FAISS index
+        :return: index of each vector in the order they are stored, or None if the database is neither an IVF
+        index nor wrapped in a faiss.IndexIDMap2, so that the index of each vector is its position
+        """
+        if isinstance(storage, faiss.IndexIDMap2):
+            return faiss.vector_to_array(storage.id_map)
+
+        index_ivf = faiss.try_extract_index_ivf(storage)
+        if index_ivf is None:
+            return None
+        # IVF indexes store the index of each vector in its inverted list, and are never searched by position
+        invlists = index_ivf.invlists
+        return np.concatenate([np.zeros(0, dtype=np.int64)] + [
+            faiss.rev_swig_ptr(invlists.get_ids(i), invlists.list_size(i)).copy() for i in range(index_ivf.nlist)
+        ])
+
+    def _has_vector_ids(self) -> bool:
+        """
+        Return whether vectors are stored with their index, so that they can be added and removed in any order.
+
+        :return: whether the database is an IVF index or is wrapped in a faiss.IndexIDMap2
+        """
+        return isinstance(self._storage, faiss.IndexIDMap2) or faiss.try_extract_index_ivf(self._storage) is not None
 
-        output = torch.tensor(output)
+    def _set_search_parameters(self, nprobe: int | None, ef_search: int | None) -> None:
+        """
+        Set the parameters used by approximate indexes when searching.
+
+        :param nprobe: number of inverted lists visited by a search when the database is an IVF index
+        :param ef_search: size of the candidate list explored by a search when the database is an HNSW index
+        """
+        if nprobe is not None:
+            index_ivf = faiss.try_extract_index_ivf(self._storage)
+            if index_ivf is not None:
+                index_ivf.nprobe = nprobe
+
+        storage = self._get_unmapped_storage()
+        if ef_search is not None and isinstance(storage, faiss.IndexHNSW):
+            storage.hnsw.efSearch = ef_search
 
-        return output
+    def _get_unmapped_storage(self) -> faiss.Index:
+        """
+        Return the database without the faiss.IndexIDMap2 mapping indices to vectors, if it has one.
+
+        :return: database storing the vectors
+        """
+        if isinstance(self._storage, faiss.IndexIDMap2):
+            return faiss.downcast_index(self._storage.index)
+        return self._storage
 
+    def _get_flat_vectors(self) -> np.ndarray | None:
+        """
+        Return the vectors stored in the database as a (ntotal, d) numpy array that shares memory with the
+        database, if the database or the storage of the HNSW database is an exhaustive inner product index.
+        Row i is the vector at position i, which is the vector with index i unless the database has been changed.
+
+        :return: vectors stored in the database or None if they are not stored in a flat inner product index
+        """
+        storage = self._get_unmapped_storage()
+        if isinstance(storage, faiss.IndexHNSW):
+            storage = faiss.downcast_index(storage.storage)
+
+        if not isinstance(storage, faiss.IndexFlat) or storage.metric_type != faiss.METRIC_INNER_PRODUCT:
+            return None
+        return faiss.rev_swig_ptr(storage.get_xb(), storage.ntotal * storage.d).reshape(storage.ntotal, storage.d)
+
+    def _scatter_search_result(self, D: np.ndarray, I: np.ndarray) -> np.ndarray:
+        """
+        Put the distances returned by a search back in the order of the vectors in the database. Vectors that
+        were not returned by the search get a score of 0.
+
+        :param D: distances returned by the search, one row per query
+        :param I: indices of the vectors corresponding to D, where -1 means no vector
+        :return: array where element (i, j) is the distance between query i and vector j
+        """
+        # vectors that were not found are written to an extra column that is dropped afterwards
+        I = np.where(I < 0, self._ntotal, I)
+        output = np.zeros((D.shape[0], self._ntotal + 1), dtype=np.float32)
+        np.put_along_axis(output, I, D, axis=1)
+        return output[:, :self._ntotal]
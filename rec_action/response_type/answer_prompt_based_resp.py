@@ -4,7 +4,6 @@ from information_retriever.item.recommended_item import RecommendedItem
 from information_retriever.filter.filter_applier import FilterApplier
 from information_retriever.information_retrieval import InformationRetrieval
 from intelligence.llm_wrapper import LLMWrapper
-from domain_specific_config_loader import DomainSpecificConfigLoader
 from utility.thread_utility import start_thread
 from warning_observer import WarningObserver
 
@@ -109,14 +108,19 @@ class AnswerPromptBasedResponse(Response):
 
             user_questions = self._separate_input_into_multiple_qs(state_manager)
 
+            categories = self._extract_categories(user_questions, curr_mentioned_items)
+
+            prefetched_reviews = self._prefetch_reviews(user_questions, curr_mentioned_items, categories)
+
             thread_list = []
 
             for question in user_questions:
                 if self._enable_threading:
                     thread_list.append(threading.Thread(
-                        target=self._get_resp_one_q, args=(question, curr_mentioned_items, answers)))
+                        target=self._get_resp_one_q,
+                        args=(question, curr_mentioned_items, answers, categories, prefetched_reviews)))
                 else:
-                    self._get_resp_one_q(question, curr_mentioned_items, answers)
+                    self._get_resp_one_q(question, curr_mentioned_items, answers, categories, prefetched_reviews)
 
             if self._enable_threading:
                 start_thread(thread_list)
@@ -128,13 +132,16 @@ class AnswerPromptBasedResponse(Response):
 
         return self._format_multiple_qs_resp(state_manager, answers)
 
-    def _get_resp_one_q(self, question: str, curr_mentioned_items: list[RecommendedItem], answers: dict) -> None:
+    def _get_resp_one_q(self, question: str, curr_mentioned_items: list[RecommendedItem], answers: dict,
+                        categories: dict = None, prefetched_reviews: dict = None) -> None:
         """
         Get the response for one question
 
         :param question: question extracted from user input
         :param curr_mentioned_items: list of recommended items that user is referring to
         :answers: list of answers to each question / item the user has mentioned
+        :param categories: categories already extracted for (question, item id) pairs
+        :param prefetched_reviews: reviews already retrieved for (question, item id) pairs
         :return: response to be returned to user
         """
         logger.debug(f'The question is {question}')
@@ -144,8 +151,11 @@ class AnswerPromptBasedResponse(Response):
         for curr_mentioned_item in curr_mentioned_items:
             logger.debug(
                 f'The recommended {self._domain} is {curr_mentioned_item.get_name()}')
-            category = self._extract_category_from_input(
-                question, curr_mentioned_item)
+            if categories and (question, curr_mentioned_item.get_id()) in categories:
+                category = categories[(question, curr_mentioned_item.get_id())]
+            else:
+                category = self._extract_category_from_input(
+                    question, curr_mentioned_item)
 
             logger.debug(f'The category is {category}')
 
@@ -167,7 +177,7 @@ class AnswerPromptBasedResponse(Response):
                 logger.debug("Non metadata question!")
 
                 ir_resp = self._create_resp_from_ir(
-                    question, curr_mentioned_item)
+                    question, curr_mentioned_item, prefetched_reviews)
 
                 if "I do not know" in ir_resp:
                     ir_resp = "I don't have access to the information to answer the question."
@@ -200,14 +210,147 @@ class AnswerPromptBasedResponse(Response):
 
         return resp.split('\n')
 
-    def _create_resp_from_ir(self, question: str, curr_mentioned_item: RecommendedItem) -> str:
+    def _extract_categories(self, questions: list[str], curr_mentioned_items: list[RecommendedItem]) \
+            -> dict[tuple[str, str], str]:
+        """
+        Extract the category of each question for each item, so that the questions answered with information
+        retrieval are known before any review is retrieved.
+
+        :param questions: questions extracted from the users input
+        :param curr_mentioned_items: list of recommended items that user is referring to
+        :return: dictionary mapping (question, item id) to the category corresponding to the question
+        """
+        categories = {}
+
+        thread_list = []
+        for question in questions:
+            for curr_mentioned_item in curr_mentioned_items:
+                if self._enable_threading:
+                    thread_list.append(threading.Thread(
+                        target=self._extract_category_one_item,
+                        args=(question, curr_mentioned_item, categories)))
+                else:
+                    self._extract_category_one_item(question, curr_mentioned_item, categories)
+
+        if self._enable_threading:
+            start_thread(thread_list)
+
+        return categories
+
+    def _extract_category_one_item(self, question: str, curr_mentioned_item: RecommendedItem,
+                                   categories: dict) -> None:
+        """
+        Extract the category of the question for one item and store it in categories.
+
+        :param question: the question extracted from the users input
+        :param curr_mentioned_item: one of the recommended item user is currently referring to
+        :param categories: dictionary mapping (question, item id) to the category corresponding to the question
+        """
+        categories[(question, curr_mentioned_item.get_id())] = self._extract_category_from_input(
+            question, curr_mentioned_item)
+
+    def _is_answered_by_ir(self, question: str, category: str, recommended_item: RecommendedItem) -> bool:
+        """
+        Returns whether the question is answered using information retrieval, which is when the category is not
+        valid or the metadata doesn't know the answer.
+
+        :param question: the question extracted from the users input
+        :param category: category the LLM classified the question into
+        :param recommended_item: object representing the recommended item user is referring to
+        :return: whether the question is answered using information retrieval
+        """
+        return not self._is_category_valid(category, recommended_item) or \
+            "I do not know" in self._create_resp_from_metadata(question, category, recommended_item)
+
+    def _prefetch_reviews(self, questions: list[str], curr_mentioned_items: list[RecommendedItem],
+                          categories: dict[tuple[str, str], str]) -> dict[tuple[str, str], list[str]]:
+        """
+        Retrieve the most relevant reviews of each item for all the questions answered with information
+        retrieval at once, so a turn with multiple such questions embeds and scores all of them in one pass.
+
+        :param questions: questions extracted from the users input
+        :param curr_mentioned_items: list of recommended items that user is referring to
+        :param categories: dictionary mapping (question, item id) to the category corresponding to the question
+        :return: dictionary mapping (question, item id) to the most relevant reviews of the item
+        """
+        ir_questions_of_each_item = {}
+        for curr_mentioned_item in curr_mentioned_items:
+            ir_questions = [question for question in dict.fromkeys(questions)
+                            if self._is_answered_by_ir(question, categories[(question, curr_mentioned_item.get_id())],
+                                                       curr_mentioned_item)]
+            if len(ir_questions) >= 2:
+                ir_questions_of_each_item[curr_mentioned_item.get_id()] = ir_questions
+
+        # queries only depend on the question, so each of them is built once, in parallel
+        queries = self._convert_questions_to_queries(list(dict.fromkeys(
+            question for ir_questions in ir_questions_of_each_item.values() for question in ir_questions)))
+
+        prefetched_reviews = {}
+        for curr_mentioned_item in curr_mentioned_items:
+            ir_questions = ir_questions_of_each_item.get(curr_mentioned_item.get_id())
+            if ir_questions is None:
+                continue
+
+            item_index = self._filter_applier.filter_by_current_item(curr_mentioned_item)
+            try:
+                reviews_of_each_query = self._information_retriever.get_best_matching_reviews_of_item_batch(
+                    [queries[question] for question in ir_questions], self._num_of_reviews_to_return, item_index,
+                    0, 1)
+            except Exception as e:
+                logger.debug(f'There is an error: {e}')
+                continue
+
+            for question, reviews in zip(ir_questions, reviews_of_each_query):
+                prefetched_reviews[(question, curr_mentioned_item.get_id())] = reviews[0][0]
+
+        return prefetched_reviews
+
+    def _convert_questions_to_queries(self, questions: list[str]) -> dict[str, str]:
+        """
+        Convert each question to the query used for information retrieval, in a thread per question when
+        multithreading is enabled, since converting a question may call the LLM.
+
+        :param questions: questions extracted from the users input
+        :return: dictionary mapping each question to its query
+        """
+        queries = {}
+
+        thread_list = []
+        for question in questions:
+            if self._enable_threading:
+                thread_list.append(threading.Thread(
+                    target=self._convert_question_to_query, args=(question, queries)))
+            else:
+                self._convert_question_to_query(question, queries)
+
+        if self._enable_threading:
+            start_thread(thread_list)
+
+        return queries
+
+    def _convert_question_to_query(self, question: str, queries: dict) -> None:
+        """
+        Convert the question to the query used for information retrieval and store it in queries.
+
+        :param question: the question extracted from the users input
+        :param queries: dictionary mapping each question to its query
+        """
+        queries[question] = self.convert_state_to_query(question)
+
+    def _create_resp_from_ir(self, question: str, curr_mentioned_item: RecommendedItem,
+                             prefetched_reviews: dict = None) -> str:
         """
         Returns the string to be returned to the user when using information retrieval
 
         :param question: the question extracted from the users input
         :param curr_mentioned_item: one of the recommended item user is currently referring to
+        :param prefetched_reviews: reviews already retrieved for (question, item id) pairs
         :returns: response to user.
         """
+        if prefetched_reviews and (question, curr_mentioned_item.get_id()) in prefetched_reviews:
+            return self._format_review_resp(
+                question, prefetched_reviews[(question, curr_mentioned_item.get_id())], curr_mentioned_item)
+
         query = self.convert_state_to_query(
             question)
 
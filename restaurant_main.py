@@ -18,42 +18,45 @@ Runs restaurant conversational recommendation system in terminal
 """
 
 
-warnings.simplefilter("default")
-logging.config.fileConfig('logging.conf')
-with open('system_config.yaml') as f:
-    config = yaml.load(f, Loader=yaml.FullLoader)
+# the sharded embedding pipeline starts worker processes that import this module, so the system is only
+# created when the module is run
+if __name__ == '__main__':
+    warnings.simplefilter("default")
+    logging.config.fileConfig('logging.conf')
+    with open('system_config.yaml') as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
 
-config['PATH_TO_DOMAIN_CONFIGS'] = "domain_specific/configs/restaurant_configs"
+    config['PATH_TO_DOMAIN_CONFIGS'] = "domain_specific/configs/restaurant_configs"
 
-with open(f"{config['PATH_TO_DOMAIN_CONFIGS']}/domain_specific_config.yaml") as f:
-    domain_specific_config = yaml.load(f, Loader=yaml.FullLoader)
+    with open(f"{config['PATH_TO_DOMAIN_CONFIGS']}/domain_specific_config.yaml") as f:
+        domain_specific_config = yaml.load(f, Loader=yaml.FullLoader)
 
-load_dotenv()
+    load_dotenv()
 
-openai_api_key_or_gradio_url = os.environ['OPENAI_API_KEY']
+    openai_api_key_or_gradio_url = os.environ['OPENAI_API_KEY']
 
-if 'GOOGLE_API_KEY' not in os.environ:
-    geocoder = NominatimWrapper(location_bias=domain_specific_config.get("LOCATION_BIAS"))
-    
-    if geocoder.geocode("edmonton") is None:
-        geocoder = None
-else:
-    geocoder = GoogleV3Wrapper()
+    if 'GOOGLE_API_KEY' not in os.environ:
+        geocoder = NominatimWrapper(location_bias=domain_specific_config.get("LOCATION_BIAS"))
 
-if geocoder is None:
-    user_filter_objects = [WordInFilter(["location"], "address")]
+        if geocoder.geocode("edmonton") is None:
+            geocoder = None
+    else:
+        geocoder = GoogleV3Wrapper()
 
-    conv_rec_system = ConvRecSystem(
-        config, openai_api_key_or_gradio_url,
-        user_defined_filter=user_filter_objects)
-else:
-    user_constraint_merger_objects = [LocationConstraintMerger(geocoder)]
-    user_constraint_status_objects = [LocationStatus(geocoder)]
-    user_filter_objects = [LocationFilter("location", ["latitude", "longitude"], 3, geocoder)]
+    if geocoder is None:
+        user_filter_objects = [WordInFilter(["location"], "address")]
 
-    conv_rec_system = ConvRecSystem(
-        config, openai_api_key_or_gradio_url, user_defined_constraint_mergers=user_constraint_merger_objects,
-        user_constraint_status_objects=user_constraint_status_objects,
-        user_defined_filter=user_filter_objects)
+        conv_rec_system = ConvRecSystem(
+            config, openai_api_key_or_gradio_url,
+            user_defined_filter=user_filter_objects)
+    else:
+        user_constraint_merger_objects = [LocationConstraintMerger(geocoder)]
+        user_constraint_status_objects = [LocationStatus(geocoder)]
+        user_filter_objects = [LocationFilter("location", ["latitude", "longitude"], 3, geocoder)]
 
-conv_rec_system.run()
+        conv_rec_system = ConvRecSystem(
+            config, openai_api_key_or_gradio_url, user_defined_constraint_mergers=user_constraint_merger_objects,
+            user_constraint_status_objects=user_constraint_status_objects,
+            user_defined_filter=user_filter_objects)
+
+    conv_rec_system.run()
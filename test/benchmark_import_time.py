@@ -0,0 +1,79 @@
+"""
+Report how long importing the main modules takes and which heavy dependencies they load, using the
+`python -X importtime` report of a fresh interpreter for each module.
+
+Run from the root of the repository:
+
+    python -m test.benchmark_import_time [module ...]
+
+Each module is imported several times and the fastest import is reported, since the first import also pays
+for filling the OS file cache.
+"""
+import subprocess
+import sys
+
+import pandas as pd
+
+MODULES = [
+    "conv_rec_system",
+    "domain_specific_config_loader",
+    "state.common_state_manager",
+    "information_retriever.filter.filter_applier",
+    "domain_specific.classes.restaurants.location_filter",
+]
+HEAVY_DEPENDENCIES = ["tensorflow", "torch", "transformers", "faiss", "gradio", "openai", "geopy"]
+NUM_RUNS = 3
+
+
+def measure_import_time(module: str) -> tuple[float, dict[str, float], str | None]:
+    """
+    Import module in a fresh interpreter and return the time the import took.
+
+    :param module: name of the module to import
+    :return: Returning a tuple with element 0 being the number of seconds importing module took, element 1
+    being the number of seconds importing each top level package took, including the packages it imports, and
+    element 2 being the error raised by the import or None if it succeeded
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    error = result.stderr.strip().splitlines()[-1] if result.returncode != 0 else None
+
+    total_time = 0.0
+    package_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        cumulative_time = int(cumulative) / 1e6
+        if name.strip() == module:
+            total_time = cumulative_time
+        # packages are imported the first time by the outermost import of one of their modules
+        package = name.strip().split(".")[0]
+        package_times[package] = max(package_times.get(package, 0.0), cumulative_time)
+    return total_time, package_times, error
+
+
+def benchmark_import_time(modules: list[str], num_runs: int = NUM_RUNS) -> pd.DataFrame:
+    """
+    Return the fastest import time of each module over num_runs runs, and the time spent importing each heavy
+    dependency it loads.
+
+    :param modules: names of the modules to import
+    :param num_runs: number of times each module is imported
+    :return: data frame with one row per module, where heavy dependencies that aren't loaded are empty
+    """
+    rows = []
+    for module in modules:
+        total_time, package_times, error = min((measure_import_time(module) for _ in range(num_runs)),
+                                               key=lambda measurement: measurement[0])
+        row = {'module': module, 'import_s': round(total_time, 3)}
+        for dependency in HEAVY_DEPENDENCIES:
+            row[dependency] = round(package_times[dependency], 3) if dependency in package_times else ""
+        row['error'] = error or ""
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    with pd.option_context('display.width', 200):
+        print(benchmark_import_time(sys.argv[1:] or MODULES).to_string(index=False))
@@ -0,0 +1,26 @@
+import pytest
+
+vocabulary = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "great", "food", "slow", "service", "the", "was",
+              "would", "come", "back"] + list("abcdefghijklmnopqrstuvwxyz")
+
+
+@pytest.fixture(scope="session")
+def small_language_model(tmp_path_factory) -> str:
+    """
+    Save a DistilBERT with a single layer and random weights, and its tokenizer, so that embedders can be tested
+    without downloading a model.
+
+    :return: path to the directory storing the model and the tokenizer
+    """
+    import torch
+    from transformers import DistilBertConfig, DistilBertModel, DistilBertTokenizer
+
+    path_to_model = tmp_path_factory.mktemp("small_language_model")
+    path_to_vocabulary = path_to_model / "vocab.txt"
+    path_to_vocabulary.write_text("\n".join(vocabulary))
+    DistilBertTokenizer(str(path_to_vocabulary)).save_pretrained(path_to_model)
+
+    torch.manual_seed(0)
+    config = DistilBertConfig(vocab_size=len(vocabulary), dim=768, n_layers=1, n_heads=12, hidden_dim=64)
+    DistilBertModel(config).save_pretrained(path_to_model)
+    return str(path_to_model)
@@ -0,0 +1,117 @@
+"""
+Compare recall and latency of MatMulSearchEngine when the review embeddings are stored with reduced precision
+against the float32 engine, using the 50 restaurants test data and the queries in PMD.csv.
+
+Run from the root of the repository:
+
+    python -m test.information_retriever.evaluation.compare_review_embedding_precision [path_to_embedding_matrix]
+
+If the embedding matrix doesn't exist yet, the reviews are embedded and the matrix is saved to the given path.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from information_retriever.embedder.embedder_factory import create_embedder
+from information_retriever.embedder.embedding_matrix_creator import EmbeddingMatrixCreator
+from information_retriever.embedder.statics import BERT_MODELS, TOEKNIZER_MODELS
+from information_retriever.metadata_wrapper import MetadataWrapper
+from information_retriever.search_engine.matmul_search_engine import MatMulSearchEngine
+
+PATH_TO_DATA = "test/information_retriever/data"
+PATH_TO_QUERIES = "test/information_retriever/evaluation/data/PMD.csv"
+DEFAULT_PATH_TO_EMBEDDING_MATRIX = f"{PATH_TO_DATA}/50_restaurants_reviews_embedding_matrix.pt"
+SETTINGS = [
+    ("float16", 0),
+    ("int8 row", 0),
+    ("int8 row", 20),
+    ("int8 dimension", 0),
+    ("int8 dimension", 20),
+]
+
+
+def compare_review_embedding_precision(review_item_ids: np.ndarray, reviews_embedding_matrix: torch.Tensor,
+                                       metadata_wrapper: MetadataWrapper, query_embeddings: torch.Tensor,
+                                       settings: list[tuple[str, int]], topk_items: int = 10,
+                                       topk_reviews: int = 3) -> pd.DataFrame:
+    """
+    Return recall and latency of each setting, where recall is the fraction of the topk items of the float32
+    engine that are also returned with the setting.
+
+    :param review_item_ids: item ids corresponding to reviews
+    :param reviews_embedding_matrix: matrix storing the float32 embedding of each review
+    :param metadata_wrapper: holds metadata of the items
+    :param query_embeddings: tensor containing one query embedding per row
+    :param settings: list of (precision, num_rescored_items) to compare
+    :param topk_items: number of items returned for each query
+    :param topk_reviews: number of reviews used for late fusion
+    :return: data frame with one row per setting including the float32 engine
+    """
+    def create_search_engine(precision: str, num_rescored_items: int) -> MatMulSearchEngine:
+        return MatMulSearchEngine(None, review_item_ids, None, reviews_embedding_matrix, metadata_wrapper,
+                                  precision=precision, num_rescored_items=num_rescored_items,
+                                  exact_reviews_embedding_matrix=reviews_embedding_matrix.numpy())
+
+    def search(search_engine: MatMulSearchEngine) -> tuple[list[set[int]], float]:
+        item_indices_to_keep = list(range(search_engine._item_review_offsets.size(0) - 1))
+        topk_item_indices = []
+        start = time.perf_counter()
+        for query_embedding in query_embeddings:
+            similarity_score_item, _ = search_engine._similarity_score_kept_items(
+                query_embedding, topk_reviews, item_indices_to_keep)
+            topk_item_indices.append(set(torch.topk(similarity_score_item, topk_items).indices.tolist()))
+        latency = (time.perf_counter() - start) / query_embeddings.size(0)
+        return topk_item_indices, latency
+
+    float32_search_engine = create_search_engine("float32", 0)
+    expected_item_indices, float32_latency = search(float32_search_engine)
+    rows = [{
+        'precision': "float32",
+        'num_rescored_items': 0,
+        'matrix_size_mb': reviews_embedding_matrix.element_size() * reviews_embedding_matrix.nelement() / 2 ** 20,
+        f'recall@{topk_items}': 1.0,
+        'latency_ms': float32_latency * 1000,
+    }]
+
+    for precision, num_rescored_items in settings:
+        search_engine = create_search_engine(precision, num_rescored_items)
+        item_indices, latency = search(search_engine)
+        matrix = search_engine._reviews_embedding_matrix
+        recall = np.mean([len(expected & actual) / topk_items
+                          for expected, actual in zip(expected_item_indices, item_indices)])
+        rows.append({
+            'precision': precision,
+            'num_rescored_items': num_rescored_items,
+            'matrix_size_mb': matrix.element_size() * matrix.nelement() / 2 ** 20,
+            f'recall@{topk_items}': recall,
+            'latency_ms': latency * 1000,
+        })
+    return pd.DataFrame(rows)
+
+
+def main(path_to_embedding_matrix: str) -> None:
+    reviews_df = pd.read_csv(f'{PATH_TO_DATA}/50_restaurants_reviews.csv')
+    metadata_wrapper = MetadataWrapper(pd.read_json(f'{PATH_TO_DATA}/50_restaurants_metadata.json',
+                                                    orient='records', lines=True))
+    embedder = create_embedder("torch", BERT_MODELS['TASB'], TOEKNIZER_MODELS['TASB'])
+
+    if os.path.exists(path_to_embedding_matrix):
+        reviews_embedding_matrix = torch.load(path_to_embedding_matrix)
+    else:
+        reviews_embedding_matrix = EmbeddingMatrixCreator(embedder).create_embedding_matrix_from_reviews(
+            reviews_df, path_to_embedding_matrix)
+
+    queries = pd.read_csv(PATH_TO_QUERIES)['query'].unique().tolist()
+    query_embeddings = embedder.get_tensor_embeddings(queries)
+
+    result = compare_review_embedding_precision(reviews_df['item_id'].to_numpy(), reviews_embedding_matrix,
+                                                metadata_wrapper, query_embeddings, SETTINGS)
+    print(result.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH_TO_EMBEDDING_MATRIX)
@@ -0,0 +1,86 @@
+from information_retriever.filter.exact_word_matching_filter import ExactWordMatchingFilter
+from information_retriever.filter.filter import Filter
+from information_retriever.filter.filter_applier import FilterApplier
+from information_retriever.filter.word_in_filter import WordInFilter
+from information_retriever.metadata_wrapper import MetadataWrapper
+from state.common_state_manager import CommonStateManager
+from state.state_manager import StateManager
+import pandas as pd
+import pytest
+
+metadata = pd.read_json("test/information_retriever/filter/50_restaurants_metadata.json", orient='records', lines=True)
+
+
+class OpenItemFilter(Filter):
+    """
+    Filter that only implements filter, adding a temporary column to the metadata it is given.
+    """
+
+    def filter(self, state_manager: StateManager, metadata: pd.DataFrame) -> pd.DataFrame:
+        metadata['is_kept'] = metadata['is_open'] == 1
+        return metadata.loc[metadata['is_kept']].drop('is_kept', axis=1)
+
+
+test_data = [
+    ([OpenItemFilter()], None),
+    ([WordInFilter(["cuisine type"], "categories"), OpenItemFilter()], ["pizza"]),
+    ([OpenItemFilter(), WordInFilter(["cuisine type"], "categories")], ["pizza"]),
+]
+
+
+class TestFilter:
+
+    @pytest.mark.parametrize("filters, cuisine_type", test_data)
+    def test_filter_only_implementing_filter(self, filters: list[Filter], cuisine_type: list[str]):
+        """
+        Test that filters only implementing filter are applied with filters returning masks, keeping the same
+        items as applying filter of each filter in turn, without modifying the shared metadata.
+
+        :param filters: filters to apply
+        :param cuisine_type: cuisine type constraint, where None means no constraint
+        """
+        hard_constraints = {} if cuisine_type is None else {"cuisine type": cuisine_type}
+        state_manager = CommonStateManager({}, data={"hard_constraints": hard_constraints})
+        columns = metadata.columns.tolist()
+
+        actual_indices = FilterApplier(MetadataWrapper(metadata), filters).apply_filter(state_manager)
+
+        expected_metadata = metadata.copy()
+        for filter_obj in filters:
+            expected_metadata = filter_obj.filter(state_manager, expected_metadata)
+        assert actual_indices == expected_metadata.index.tolist()
+        assert 0 < len(actual_indices) < metadata.shape[0]
+        assert metadata.columns.tolist() == columns
+
+    def test_filter_without_implementation(self):
+        """
+        Test that a filter implementing neither filter nor get_mask raises NotImplementedError.
+        """
+        with pytest.raises(NotImplementedError):
+            Filter().filter(CommonStateManager({}, data={}), metadata)
+
+
+prepare_test_data = [
+    (WordInFilter(["cuisine type"], "categories"), ["pizza"]),
+    (WordInFilter(["cuisine type"], "categories"), ["sandwiches", "bar"]),
+    (ExactWordMatchingFilter(["cuisine type"], "categories"), ["Pizza"]),
+    (ExactWordMatchingFilter(["cuisine type"], "categories"), ["pizza", "bars"]),
+]
+
+
+class TestPrepare:
+
+    @pytest.mark.parametrize("filter_obj, cuisine_type", prepare_test_data)
+    def test_filter_other_metadata(self, filter_obj: Filter, cuisine_type: list[str]):
+        """
+        Test that a filter prepared for some metadata filters other metadata as if it was prepared for it.
+
+        :param filter_obj: filter to apply
+        :param cuisine_type: cuisine type constraint
+        """
+        state_manager = CommonStateManager({}, data={"hard_constraints": {"cuisine type": cuisine_type}})
+        expected_indices = filter_obj.filter(state_manager, metadata).index.tolist()
+
+        filter_obj.prepare(metadata.iloc[::2])
+        assert filter_obj.filter(state_manager, metadata).index.tolist() == expected_indices
+        assert FilterApplier(MetadataWrapper(metadata), [filter_obj]).apply_filter(state_manager) == expected_indices
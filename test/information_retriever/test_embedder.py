@@ -0,0 +1,98 @@
+from information_retriever.embedder.bert_embedder import BERT_model
+from information_retriever.embedder.embedder import Embedder
+from information_retriever.embedder.torch_embedder import TorchEmbedder
+import numpy as np
+import os
+import pytest
+import torch
+from transformers import AutoModel, AutoTokenizer
+
+texts = ["great food", "slow service", "the food was great but the service was slow", "",
+         "would come back " * 200]
+
+
+@pytest.fixture(scope="module")
+def converted_model_cache_dir(tmp_path_factory) -> str:
+    """
+    :return: directory caching models converted from PyTorch checkpoints
+    """
+    return str(tmp_path_factory.mktemp("converted_models"))
+
+
+@pytest.fixture(scope="module")
+def tensorflow_embedder(small_language_model: str, converted_model_cache_dir: str) -> BERT_model:
+    """
+    :return: TensorFlow embedder converting the small language model and caching its forward pass
+    """
+    return BERT_model(small_language_model, small_language_model, converted_model_cache_dir=converted_model_cache_dir)
+
+
+@pytest.fixture(scope="module")
+def torch_embedder(small_language_model: str) -> TorchEmbedder:
+    """
+    :return: PyTorch embedder of the small language model
+    """
+    return TorchEmbedder(small_language_model, small_language_model)
+
+
+def embed_padded_to_max_length(path_to_model: str, texts: list[str]) -> np.ndarray:
+    """
+    Embed texts as the CLS embedding of the language model, padding every text to 512 tokens.
+
+    :param path_to_model: path to the language model and its tokenizer
+    :param texts: texts to embed
+    :return: embeddings of texts
+    """
+    tokenizer = AutoTokenizer.from_pretrained(path_to_model)
+    model = AutoModel.from_pretrained(path_to_model).eval()
+    tokenized_texts = tokenizer(texts, max_length=512, padding="max_length", truncation=True, return_tensors="pt")
+    with torch.inference_mode():
+        return model(**tokenized_texts).last_hidden_state[:, 0, :].numpy()
+
+
+class TestEmbedder:
+
+    @pytest.mark.parametrize("backend", ["tensorflow", "torch"])
+    def test_embed(self, request, small_language_model: str, backend: str):
+        """
+        Test that texts embedded in batches padded to their longest text, and queries embedded one at a time,
+        have the embeddings of texts padded to 512 tokens.
+
+        :param small_language_model: path to a small language model
+        :param backend: runtime running the language model
+        """
+        embedder: Embedder = request.getfixturevalue(f'{backend}_embedder')
+        expected_embeddings = embed_padded_to_max_length(small_language_model, texts)
+
+        embeddings = embedder.embed(texts, bs=2)
+        query_embeddings = np.stack([embedder.get_tensor_embedding(text).cpu().numpy() for text in texts])
+
+        assert embeddings.shape == (len(texts), 768)
+        assert np.allclose(embeddings, expected_embeddings, atol=1e-4)
+        assert np.allclose(query_embeddings, expected_embeddings, atol=1e-4)
+        timing = embedder.get_last_query_timing()
+        assert timing['tokenize'] > 0 and timing['forward'] > 0
+
+    def test_backends_agree(self, tensorflow_embedder: BERT_model, torch_embedder: TorchEmbedder):
+        """
+        Test that the TensorFlow and PyTorch embedders return the same embeddings.
+        """
+        assert np.allclose(tensorflow_embedder.embed(texts), torch_embedder.embed(texts), atol=1e-4)
+
+    def test_converted_model_cache(self, monkeypatch, small_language_model: str, converted_model_cache_dir: str,
+                                   tensorflow_embedder: BERT_model):
+        """
+        Test that an embedder created again loads the forward pass saved by the first one instead of converting
+        the model.
+        """
+        assert len(os.listdir(converted_model_cache_dir)) == 1
+
+        def create_model(*args, **kwargs):
+            raise AssertionError("The model must be loaded from the converted model cache")
+
+        monkeypatch.setattr(BERT_model, '_create_model', create_model)
+        cached_embedder = BERT_model(small_language_model, small_language_model,
+                                     converted_model_cache_dir=converted_model_cache_dir)
+
+        assert np.allclose(cached_embedder.embed(texts), tensorflow_embedder.embed(texts), atol=1e-5)
+        assert len(os.listdir(converted_model_cache_dir)) == 1
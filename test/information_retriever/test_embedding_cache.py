@@ -0,0 +1,93 @@
+from information_retriever.embedder.embedder import Embedder
+from information_retriever.embedder.embedding_cache import EmbeddingCache
+import numpy as np
+import pytest
+import torch
+
+
+class LengthEmbedder(Embedder):
+    """
+    Embedder that embeds every text as a vector filled with its length and counts the texts it embeds, without
+    loading a language model.
+    """
+
+    num_embedded_texts: int
+
+    def __init__(self):
+        self._bert_name = "model"
+        self._tokenizer = None
+        self._device = torch.device("cpu")
+        self._embedding_cache = None
+        self.num_embedded_texts = 0
+
+    def embed(self, texts: list[str], bs=48, verbose=0) -> np.ndarray:
+        self.num_embedded_texts += len(texts)
+        return np.repeat(np.array([[len(text)] for text in texts], dtype=np.float32), 768, axis=1)
+
+
+test_data = [
+    (2, None, ["a", "b", "a", "c"], ["a", "b", "c"], [True, False, True]),
+    (1, None, ["a", "b"], ["a", "b"], [False, True]),
+    (2, 0.0, ["a"], ["a"], [False]),
+]
+
+
+class TestEmbeddingCache:
+
+    @pytest.mark.parametrize("max_size, ttl, keys_to_put, keys_to_get, expected_is_hit", test_data)
+    def test_embedding_cache(self, max_size: int, ttl: float | None, keys_to_put: list[str],
+                             keys_to_get: list[str], expected_is_hit: list[bool]):
+        """
+        Test that the cache evicts the least recently used embeddings and expired embeddings, and counts hits
+        and misses.
+
+        :param max_size: maximum number of embeddings stored in the cache
+        :param ttl: number of seconds an embedding stays in the cache
+        :param keys_to_put: keys whose embedding is read from the cache in order, and put in it if missing
+        :param keys_to_get: keys whose embedding is read afterwards
+        :param expected_is_hit: whether each key in keys_to_get is expected to be found
+        """
+        embedding_cache = EmbeddingCache(max_size, ttl)
+        for key in keys_to_put:
+            if embedding_cache.get(key) is None:
+                embedding_cache.put(key, torch.tensor([float(ord(key))]))
+        num_hits, num_misses = embedding_cache.get_num_hits(), embedding_cache.get_num_misses()
+
+        embeddings = [embedding_cache.get(key) for key in keys_to_get]
+        assert [embedding is not None for embedding in embeddings] == expected_is_hit
+        assert all(embedding.item() == ord(key) for key, embedding in zip(keys_to_get, embeddings)
+                   if embedding is not None)
+        assert embedding_cache.get_num_hits() == num_hits + sum(expected_is_hit)
+        assert embedding_cache.get_num_misses() == num_misses + len(expected_is_hit) - sum(expected_is_hit)
+        assert len(embedding_cache) <= max_size
+
+
+per_consumer_test_data = [
+    (["a", "bb", "a"], 2),
+    (["a", "a"], 1),
+    ([], 0),
+]
+
+
+class TestEmbedderWithEmbeddingCache:
+
+    @pytest.mark.parametrize("queries, expected_num_cached", per_consumer_test_data)
+    def test_with_embedding_cache(self, queries: list[str], expected_num_cached: int):
+        """
+        Test that an embedder using its own cache fills only that cache and leaves the shared embedder it was
+        created from without a cache.
+
+        :param queries: queries embedded twice by the embedder using the cache
+        :param expected_num_cached: number of distinct queries expected in the cache
+        """
+        shared_embedder = LengthEmbedder()
+        embedding_cache = EmbeddingCache(10)
+        embedder = shared_embedder.with_embedding_cache(embedding_cache)
+
+        for _ in range(2):
+            for query in queries:
+                assert embedder.get_tensor_embeddings([query])[0, 0].item() == len(query)
+
+        assert len(embedding_cache) == expected_num_cached
+        assert embedder.num_embedded_texts == expected_num_cached
+        assert shared_embedder._embedding_cache is None
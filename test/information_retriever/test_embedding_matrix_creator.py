@@ -0,0 +1,146 @@
+import os
+
+from information_retriever.embedder.embedder import Embedder
+from information_retriever.embedder.embedding_matrix_creator import EmbeddingMatrixCreator
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+
+class ConstantEmbedder(Embedder):
+    """
+    Embedder that embeds every text as a vector of ones, without loading a language model.
+    """
+
+    def __init__(self):
+        pass
+
+    def embed(self, texts: list[str], bs=48, verbose=0) -> np.ndarray:
+        return np.ones((len(texts), 768), dtype=np.float32)
+
+
+test_data = [
+    (3, 3, 0),
+    (3, 5, 1),
+    (0, 2, 1),
+]
+
+
+class TestEmbeddingMatrixCreator:
+
+    @pytest.mark.parametrize("num_saved_reviews, num_reviews, expected_num_loads", test_data)
+    def test_model_is_only_loaded_to_embed_reviews(self, tmp_path, num_saved_reviews: int, num_reviews: int,
+                                                    expected_num_loads: int):
+        """
+        Test that the model given as a function is only loaded when there are reviews that are not in the saved
+        embedding matrix yet.
+
+        :param num_saved_reviews: number of reviews in the saved embedding matrix, where 0 means no saved matrix
+        :param num_reviews: number of reviews to embed
+        :param expected_num_loads: expected number of times the model is loaded
+        """
+        path_to_embedding_matrix = str(tmp_path / "embedding_matrix.pt")
+        if num_saved_reviews > 0:
+            torch.save(torch.zeros(num_saved_reviews, 768), path_to_embedding_matrix)
+
+        num_loads = 0
+
+        def load_embedder() -> Embedder:
+            nonlocal num_loads
+            num_loads += 1
+            return ConstantEmbedder()
+
+        reviews_df = pd.DataFrame({'Review': [f'review {i}' for i in range(num_reviews)]})
+        embedding_matrix = EmbeddingMatrixCreator(load_embedder).create_embedding_matrix_from_reviews(
+            reviews_df, path_to_embedding_matrix, batch_size=1)
+
+        assert num_loads == expected_num_loads
+        assert embedding_matrix.shape == (num_reviews, 768)
+        assert torch.all(embedding_matrix[num_saved_reviews:] == 1)
+
+    @pytest.mark.parametrize("num_reviews, num_reviews_before_interruption, k", [(7, 4, 2), (7, 1, 2), (5, 3, 1)])
+    def test_resume_from_chunks(self, tmp_path, num_reviews: int, num_reviews_before_interruption: int, k: int):
+        """
+        Test that an interrupted run resumes after the last saved chunk and that the chunks are removed once the
+        matrix is saved.
+
+        :param num_reviews: number of reviews to embed
+        :param num_reviews_before_interruption: number of reviews embedded before the first run is interrupted
+        :param k: number of batches in between saving chunks
+        """
+        path_to_embedding_matrix = str(tmp_path / "embedding_matrix.pt")
+        reviews_df = pd.DataFrame({'Review': [f'review {i}' for i in range(num_reviews)]})
+        embedded_reviews = []
+
+        class InterruptedEmbedder(ConstantEmbedder):
+
+            def embed(self, texts: list[str], bs=48, verbose=0) -> np.ndarray:
+                if len(embedded_reviews) == num_reviews_before_interruption:
+                    raise KeyboardInterrupt()
+                embedded_reviews.extend(texts)
+                return np.full((len(texts), 768), len(embedded_reviews), dtype=np.float32)
+
+        with pytest.raises(KeyboardInterrupt):
+            EmbeddingMatrixCreator(InterruptedEmbedder()).create_embedding_matrix_from_reviews(
+                reviews_df, path_to_embedding_matrix, batch_size=1, k=k)
+        num_saved_reviews = num_reviews_before_interruption // k * k
+
+        embedded_reviews.clear()
+        num_reviews_before_interruption = -1
+        embedding_matrix = EmbeddingMatrixCreator(InterruptedEmbedder()).create_embedding_matrix_from_reviews(
+            reviews_df, path_to_embedding_matrix, batch_size=1, k=k)
+
+        assert embedded_reviews == reviews_df['Review'].to_list()[num_saved_reviews:]
+        assert embedding_matrix[num_saved_reviews:, 0].tolist() == list(range(1, num_reviews - num_saved_reviews + 1))
+        assert torch.equal(torch.load(path_to_embedding_matrix), embedding_matrix)
+        assert not os.path.exists(f'{path_to_embedding_matrix}.chunks')
+
+    @pytest.mark.parametrize("index_description", ["Flat", "HNSW8,Flat", "IVF4,Flat"])
+    def test_create_embedding_matrix_from_database(self, index_description: str):
+        """
+        Test that the embedding matrix recovered from the database stores the embeddings added to it in order.
+
+        :param index_description: FAISS description of the database
+        """
+        import faiss
+
+        embeddings = np.random.default_rng(0).standard_normal((100, 768)).astype(np.float32)
+        database = faiss.index_factory(768, index_description, faiss.METRIC_INNER_PRODUCT)
+        database.train(embeddings)
+        database.add(embeddings)
+
+        embedding_matrix = EmbeddingMatrixCreator.create_embedding_matrix_from_database(database)
+
+        assert torch.equal(embedding_matrix, torch.from_numpy(embeddings))
+
+    @pytest.mark.parametrize("index_description", ["IDMap2,Flat", "IDMap2,HNSW8,Flat", "IVF4,Flat"])
+    def test_create_embedding_matrix_from_database_after_removal(self, index_description: str):
+        """
+        Test that the embedding matrix recovered from a database whose vectors were removed and added again stores
+        each embedding at the index of its vector, and 0 for removed vectors.
+
+        :param index_description: FAISS description of the database
+        """
+        import faiss
+        from information_retriever.embedder.vector_database_creator import VectorDatabaseCreator
+
+        embeddings = np.random.default_rng(0).standard_normal((100, 768)).astype(np.float32)
+        database = faiss.index_factory(768, index_description, faiss.METRIC_INNER_PRODUCT)
+        database.train(embeddings)
+        VectorDatabaseCreator._add_embeddings(database, embeddings[:90])
+        removed_indices = np.array([1, 50, 88])
+        if "HNSW" in index_description:
+            # HNSW can't remove vectors, so they are left out when added
+            database = faiss.index_factory(768, index_description, faiss.METRIC_INNER_PRODUCT)
+            kept_indices = np.setdiff1d(np.arange(90), removed_indices)
+            database.add_with_ids(embeddings[kept_indices], kept_indices)
+        else:
+            database.remove_ids(removed_indices)
+        VectorDatabaseCreator._add_embeddings(database, embeddings[90:])
+
+        embedding_matrix = EmbeddingMatrixCreator.create_embedding_matrix_from_database(database)
+
+        expected_embedding_matrix = embeddings.copy()
+        expected_embedding_matrix[removed_indices] = 0
+        assert torch.equal(embedding_matrix, torch.from_numpy(expected_embedding_matrix))
@@ -0,0 +1,338 @@
+from information_retriever.embedder.embedding_matrix_creator import EmbeddingMatrixCreator
+from information_retriever.embedder.vector_database_creator import VectorDatabaseCreator
+from information_retriever.search_engine.matmul_search_engine import MatMulSearchEngine
+from information_retriever.search_engine.search_engine import SearchEngine
+from information_retriever.search_engine.vector_database_search_engine import VectorDatabaseSearchEngine
+from information_retriever.metadata_wrapper import MetadataWrapper
+from information_retriever.vector_database import VectorDataBase
+import faiss
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+review_item_ids = np.array(["a", "a", "a", "b", "c", "c"], dtype=object)
+metadata_wrapper = MetadataWrapper(pd.DataFrame({"item_id": ["a", "b", "c"], "name": ["A", "B", "C"]}))
+
+grouping_metadata_wrapper = MetadataWrapper(pd.DataFrame({
+    "item_id": ["a", "b", "c", "d", "e", "f"],
+    "name": ["A", "B", "C", "A", "E", "F"]
+}))
+similarity_score_item = torch.tensor([9.0, 8.8, 8.0, 8.9, 0.0, 7.9])
+
+grouping_test_data = [
+    (2, 0.5, 5, [[0, 1, -1, -1, -1], [2, 5, -1, -1, -1]]),
+    (2, 0.5, 1, [[0], [1]]),
+    (3, 0.0, 2, [[0, -1], [1, -1], [2, -1]]),
+    (2, 2.0, 2, [[0, 1], [2, 5]]),
+]
+
+
+class TestMostSimilarItem:
+
+    @pytest.mark.parametrize("top_k_items, unacceptable_similarity_range, max_number_similar_items, expected_indices",
+                             grouping_test_data)
+    def test_most_similar_item(self, top_k_items: int, unacceptable_similarity_range: float,
+                               max_number_similar_items: int, expected_indices: list[list[int]]):
+        """
+        Test that items are grouped by similarity score, skipping items with score 0 and items whose name was
+        already used by a more similar item.
+
+        :param top_k_items: number of groups
+        :param unacceptable_similarity_range: range of similarity scores that puts items in the same group
+        :param max_number_similar_items: max number of items in a group
+        :param expected_indices: expected grouped item indices padded with -1
+        """
+        search_engine = SearchEngine(None, np.array(["a", "b", "c", "d", "e", "f"], dtype=object), None,
+                                     grouping_metadata_wrapper)
+        most_similar_item_index = search_engine._most_similar_item(
+            similarity_score_item, top_k_items, unacceptable_similarity_range, max_number_similar_items)
+        assert most_similar_item_index.tolist() == expected_indices
+
+
+reviews_embedding_matrix = torch.tensor([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0], [0.0, 3.0], [2.0, 0.0], [0.0, 0.0]])
+query_embedding = torch.tensor([1.0, 0.0])
+
+coarse_retrieval_test_data = [
+    ([0, 1, 2], 1, [0.0, 0.0, 2.0]),
+    ([0, 1, 2], 2, [1.0, 0.0, 2.0]),
+    ([0, 1, 2], 3, [1.0, 0.0, 2.0]),
+    ([0, 1], 1, [1.0, 0.0, 0.0]),
+]
+
+
+class TestCoarseRetrieval:
+
+    @pytest.mark.parametrize("item_indices_to_keep, num_coarse_candidate_items, expected_item_score",
+                             coarse_retrieval_test_data)
+    def test_similarity_score_kept_items(self, item_indices_to_keep: list[int], num_coarse_candidate_items: int,
+                                         expected_item_score: list[float]):
+        """
+        Test that only the kept items whose pooled embedding is the most similar to the query are scored.
+
+        :param item_indices_to_keep: indices of the items to keep
+        :param num_coarse_candidate_items: number of items picked with the item embeddings
+        :param expected_item_score: expected similarity score of each item
+        """
+        item_embedding_matrix = EmbeddingMatrixCreator.create_item_embedding_matrix(reviews_embedding_matrix,
+                                                                                    review_item_ids)
+        search_engine = MatMulSearchEngine(None, review_item_ids, None, reviews_embedding_matrix, metadata_wrapper,
+                                           item_embedding_matrix=item_embedding_matrix,
+                                           num_coarse_candidate_items=num_coarse_candidate_items)
+        item_score, _ = search_engine._similarity_score_kept_items(query_embedding, 1, item_indices_to_keep)
+        assert item_score.tolist() == expected_item_score
+
+    def test_create_item_embedding_matrix_non_contiguous_reviews(self):
+        """
+        Test that row i of the item embedding matrix pools the reviews of item i of the search engine when the
+        reviews of an item are not next to each other.
+        """
+        non_contiguous_review_item_ids = np.array(["c", "a", "b", "a", "c", "a"], dtype=object)
+        item_embedding_matrix = EmbeddingMatrixCreator.create_item_embedding_matrix(reviews_embedding_matrix,
+                                                                                    non_contiguous_review_item_ids)
+        search_engine = SearchEngine(None, non_contiguous_review_item_ids, None, metadata_wrapper)
+        expected_item_embedding_matrix = torch.stack([
+            reviews_embedding_matrix[torch.from_numpy(non_contiguous_review_item_ids == item_id)].mean(dim=0)
+            for item_id in search_engine._item_ids
+        ])
+        assert torch.equal(item_embedding_matrix, expected_item_embedding_matrix)
+
+
+score_candidates_only_test_data = [
+    ([0], 1),
+    ([0, 2], 2),
+    ([2, 1], 3),
+    ([1], 2),
+]
+
+
+class TestScoreCandidatesOnly:
+
+    @pytest.mark.parametrize("item_indices_to_keep, k", score_candidates_only_test_data)
+    def test_similarity_score_kept_items(self, item_indices_to_keep: list[int], k: int):
+        """
+        Test that scoring only the reviews of the kept items gives the same item scores and top k review indices
+        for the kept items as scoring every review.
+
+        :param item_indices_to_keep: indices of the items to keep
+        :param k: number of reviews used for late fusion
+        """
+        search_engine = MatMulSearchEngine(None, review_item_ids, None, reviews_embedding_matrix, metadata_wrapper,
+                                           score_candidates_only=True)
+        full_search_engine = MatMulSearchEngine(None, review_item_ids, None, reviews_embedding_matrix,
+                                                metadata_wrapper, score_candidates_only=False)
+        item_score, review_index = search_engine._similarity_score_kept_items(query_embedding, k,
+                                                                              item_indices_to_keep)
+        expected_item_score, expected_review_index = full_search_engine._similarity_score_kept_items(
+            query_embedding, k, item_indices_to_keep)
+        assert search_engine._should_score_candidates_only(item_indices_to_keep)
+        assert item_score.tolist() == expected_item_score.tolist()
+        assert review_index[item_indices_to_keep].tolist() == expected_review_index[item_indices_to_keep].tolist()
+
+
+precision_test_data = [
+    ("float16", 0),
+    ("int8 row", 0),
+    ("int8 dimension", 0),
+    ("int8 dimension", 3),
+]
+
+
+class TestReviewEmbeddingPrecision:
+
+    @pytest.mark.parametrize("precision, num_rescored_items", precision_test_data)
+    def test_similarity_score_kept_items(self, precision: str, num_rescored_items: int):
+        """
+        Test that item scores computed from reduced precision review embeddings are close to the float32 scores,
+        and equal to them when the most similar items are rescored.
+
+        :param precision: precision used to store the review embeddings
+        :param num_rescored_items: number of most similar items rescored with float32 review embeddings
+        """
+        search_engine = MatMulSearchEngine(None, review_item_ids, None, reviews_embedding_matrix, metadata_wrapper,
+                                           precision=precision, num_rescored_items=num_rescored_items,
+                                           exact_reviews_embedding_matrix=reviews_embedding_matrix.numpy())
+        item_score, review_index = search_engine._similarity_score_kept_items(query_embedding, 2, [0, 1, 2])
+        expected_item_score = torch.tensor([1.0, 0.0, 1.0])
+        if num_rescored_items > 0:
+            assert torch.equal(item_score, expected_item_score)
+        else:
+            assert torch.allclose(item_score, expected_item_score, atol=0.02)
+        assert review_index[:, 0].tolist() == [0, 3, 4]
+
+
+class ReviewEmbedder:
+    """
+    Embedder that embeds reviews written as comma separated numbers as the vector of those numbers.
+    """
+
+    def embed(self, texts: list[str], bs=48, verbose=0) -> np.ndarray:
+        return np.array([[float(x) for x in text.split(",")] for text in texts], dtype=np.float32)
+
+    def get_tensor_embedding(self, query: str) -> torch.Tensor:
+        return torch.from_numpy(self.embed([query])[0])
+
+    def get_tensor_embeddings(self, queries: list[str]) -> torch.Tensor:
+        return torch.from_numpy(self.embed(queries))
+
+
+new_items_metadata = pd.DataFrame({"item_id": ["e", "d"], "name": ["E", "D"]})
+
+incremental_update_test_data = [
+    ("vector database", "Flat", 0),
+    ("vector database", "Flat", 20),
+    ("vector database", "IVF2,Flat", 0),
+    ("vector database", "HNSW8,Flat", 0),
+    ("matmul", "float32", 0),
+    ("matmul", "float16", 0),
+    ("matmul", "int8 dimension", 5),
+]
+
+
+class TestIncrementalUpdate:
+
+    @pytest.mark.parametrize("search_engine_type, description, num_candidate_reviews_or_rescored_items",
+                             incremental_update_test_data)
+    def test_add_reviews_and_remove_items(self, search_engine_type: str, description: str,
+                                          num_candidate_reviews_or_rescored_items: int):
+        """
+        Test that added reviews are scored with the reviews of their item, that new items are scored after the
+        existing items and that removed and deactivated items are never scored. Items removed from an HNSW
+        database, which can't remove vectors, are deactivated instead.
+
+        :param search_engine_type: type of search engine
+        :param description: FAISS description of the database, or precision of the review embeddings of the
+        matmul search engine
+        :param num_candidate_reviews_or_rescored_items: number of most similar reviews retrieved from the
+        database, or number of items rescored by the matmul search engine
+        """
+        embeddings = reviews_embedding_matrix.numpy()
+        reviews = np.array([",".join(map(str, embedding)) for embedding in embeddings.tolist()], dtype=object)
+        if search_engine_type == "matmul":
+            search_engine = MatMulSearchEngine(ReviewEmbedder(), review_item_ids, reviews, reviews_embedding_matrix,
+                                               MetadataWrapper(metadata_wrapper.get_metadata()),
+                                               precision=description,
+                                               num_rescored_items=num_candidate_reviews_or_rescored_items,
+                                               exact_reviews_embedding_matrix=embeddings)
+        else:
+            index = faiss.index_factory(2, description, faiss.METRIC_INNER_PRODUCT)
+            if faiss.try_extract_index_ivf(index) is None:
+                index = faiss.IndexIDMap2(index)
+            index.train(embeddings)
+            VectorDatabaseCreator._add_embeddings(index, embeddings)
+            search_engine = VectorDatabaseSearchEngine(
+                ReviewEmbedder(), review_item_ids, reviews, VectorDataBase(index),
+                MetadataWrapper(metadata_wrapper.get_metadata()),
+                num_candidate_reviews=num_candidate_reviews_or_rescored_items)
+
+        search_engine.add_reviews(np.array(["d", "a"], dtype=object), np.array(["4,0", "3,0"], dtype=object),
+                                  new_items_metadata)
+        search_engine.remove_items(["c"])
+        search_engine.add_reviews(np.array(["e"], dtype=object), np.array(["0.5,0"], dtype=object),
+                                  new_items_metadata)
+        search_engine.set_items_active(["b"], False)
+
+        item_score, review_index = search_engine._similarity_score_kept_items(
+            query_embedding, 1, search_engine._get_active_items([0, 1, 2, 3, 4]))
+        assert item_score.tolist() == [3.0, 0.0, 0.0, 4.0, 0.5]
+        assert review_index[[0, 3, 4], 0].tolist() == [7, 6, 8]
+        assert search_engine._get_topk_item_id(torch.tensor([[3, 0]]), review_index) == [["d", "a"]]
+        assert search_engine._metadata_wrapper.get_item_dict_from_id("e") == {"item_id": "e", "name": "E"}
+        assert search_engine._metadata_wrapper.get_metadata_view().index[3:].tolist() == [3, 4]
+
+    def test_add_reviews_with_item_embedding_matrix(self):
+        """
+        Test that the pooled embedding of items with new reviews is updated, that new items get a pooled
+        embedding and that they are picked as coarse candidates.
+        """
+        embeddings = reviews_embedding_matrix.numpy()
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(2))
+        VectorDatabaseCreator._add_embeddings(index, embeddings)
+        reviews = np.array([",".join(map(str, embedding)) for embedding in embeddings.tolist()], dtype=object)
+        item_embedding_matrix = EmbeddingMatrixCreator.create_item_embedding_matrix(reviews_embedding_matrix,
+                                                                                    review_item_ids)
+        search_engine = VectorDatabaseSearchEngine(ReviewEmbedder(), review_item_ids, reviews, VectorDataBase(index),
+                                                   MetadataWrapper(metadata_wrapper.get_metadata()),
+                                                   item_embedding_matrix=item_embedding_matrix,
+                                                   num_coarse_candidate_items=1)
+
+        search_engine.add_reviews(np.array(["d", "b", "d"], dtype=object),
+                                  np.array(["4,0", "1,1", "2,2"], dtype=object), new_items_metadata)
+
+        expected_item_embedding_matrix = EmbeddingMatrixCreator.create_item_embedding_matrix(
+            torch.cat((reviews_embedding_matrix, torch.tensor([[4.0, 0.0], [1.0, 1.0], [2.0, 2.0]]))),
+            np.concatenate((review_item_ids, np.array(["d", "b", "d"], dtype=object))))
+        assert torch.allclose(search_engine._item_embedding_matrix, expected_item_embedding_matrix)
+        item_score, review_index = search_engine._similarity_score_kept_items(query_embedding, 1, [0, 1, 2, 3])
+        assert item_score.tolist() == [0.0, 0.0, 0.0, 4.0]
+        assert review_index[3, 0].item() == 6
+
+
+reviews = np.array([",".join(map(str, embedding)) for embedding in reviews_embedding_matrix.tolist()], dtype=object)
+queries = ["1,0", "0,1", "1,1", "-1,2"]
+
+search_batch_test_data = [
+    ("matmul", False, [0, 1, 2]),
+    ("matmul", True, [0, 2]),
+    ("vector database", False, [0, 1, 2]),
+    ("vector database", True, [1, 2]),
+]
+
+
+class TestSearchBatch:
+
+    @pytest.mark.parametrize("search_engine_type, score_candidates_only, item_indices_to_keep",
+                             search_batch_test_data)
+    def test_search_for_topk_batch(self, search_engine_type: str, score_candidates_only: bool,
+                                   item_indices_to_keep: list[int]):
+        """
+        Test that searching for several queries at once returns the same items and reviews as searching for
+        each query separately.
+
+        :param search_engine_type: type of search engine
+        :param score_candidates_only: whether to only score the reviews of the kept items
+        :param item_indices_to_keep: indices of the items to keep
+        """
+        if search_engine_type == "matmul":
+            search_engine = MatMulSearchEngine(ReviewEmbedder(), review_item_ids, reviews, reviews_embedding_matrix,
+                                               metadata_wrapper, score_candidates_only)
+        else:
+            index = faiss.IndexFlatIP(2)
+            index.add(reviews_embedding_matrix.numpy())
+            search_engine = VectorDatabaseSearchEngine(ReviewEmbedder(), review_item_ids, reviews,
+                                                       VectorDataBase(index), metadata_wrapper,
+                                                       score_candidates_only=score_candidates_only)
+
+        expected_output = [search_engine.search_for_topk(query, 2, 2, item_indices_to_keep, 0.5, 2)
+                           for query in queries]
+        assert search_engine.search_for_topk_batch(queries, 2, 2, item_indices_to_keep, 0.5, 2) == expected_output
+
+
+retrieved_reviews_test_data = [
+    ("1,0", 1),
+    ("1,0", 2),
+    ("0,1", 3),
+]
+
+
+class TestRetrievedReviews:
+
+    @pytest.mark.parametrize("query, num_candidate_reviews", retrieved_reviews_test_data)
+    def test_search_for_topk(self, query: str, num_candidate_reviews: int):
+        """
+        Test that items with fewer retrieved reviews than the number of reviews to return only return their
+        own retrieved reviews.
+
+        :param query: query to search for
+        :param num_candidate_reviews: number of most similar reviews retrieved from the database
+        """
+        index = faiss.IndexFlatIP(2)
+        index.add(reviews_embedding_matrix.numpy())
+        search_engine = VectorDatabaseSearchEngine(ReviewEmbedder(), review_item_ids, reviews, VectorDataBase(index),
+                                                   metadata_wrapper, num_candidate_reviews=num_candidate_reviews)
+        review_item_id = dict(zip(reviews, review_item_ids))
+
+        item_ids, item_reviews = search_engine.search_for_topk(query, 3, 3, [0, 1, 2], 0.5, 1)
+        assert sum(len(group_reviews[0]) for group_reviews in item_reviews) == num_candidate_reviews
+        for group_item_ids, group_reviews in zip(item_ids, item_reviews):
+            assert all(review_item_id[review] == group_item_ids[0] for review in group_reviews[0])
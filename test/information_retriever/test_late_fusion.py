@@ -0,0 +1,31 @@
+from information_retriever.search_engine.search_engine import SearchEngine
+import numpy as np
+import pytest
+import torch
+
+review_item_ids = np.array(["a", "a", "a", "b", "c", "c"], dtype=object)
+similarity_score = torch.tensor([1.0, 3.0, 2.0, 5.0, 4.0, 6.0])
+
+test_data = [
+    (1, [3.0, 5.0, 6.0], [[1], [3], [5]]),
+    (2, [2.5, 5.0, 5.0], [[1, 2], [3, -1], [5, 4]]),
+    (4, [2.0, 5.0, 5.0], [[1, 2, 0, -1], [3, -1, -1, -1], [5, 4, -1, -1]]),
+]
+
+
+class TestLateFusion:
+
+    @pytest.mark.parametrize("k, expected_item_score, expected_review_index", test_data)
+    def test_similarity_score_each_item(self, k: int, expected_item_score: list[float],
+                                        expected_review_index: list[list[int]]):
+        """
+        Test that late fusion returns the mean of the top k review scores and the top k review indices of each item.
+
+        :param k: number of reviews used for late fusion
+        :param expected_item_score: expected similarity score of each item
+        :param expected_review_index: expected indices of the top k reviews of each item padded with -1
+        """
+        search_engine = SearchEngine(None, review_item_ids, None, None)
+        item_score, review_index = search_engine._similarity_score_each_item(similarity_score, k)
+        assert item_score.tolist() == expected_item_score
+        assert review_index.tolist() == expected_review_index
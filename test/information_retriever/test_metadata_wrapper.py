@@ -0,0 +1,71 @@
+from information_retriever.metadata_wrapper import MetadataWrapper
+import pandas as pd
+import pytest
+
+items_metadata = pd.DataFrame({
+    "item_id": ["a", "b", "c", "b"],
+    "name": ["A", "B", "C", "D"],
+    "stars": [4.5, 3.0, 5.0, 1.0],
+    "optional": [{"parking": True}, {}, {}, {}],
+}, index=[10, 11, 12, 13])
+
+test_data = [
+    ("a", 10),
+    ("c", 12),
+    ("b", 11),
+]
+
+
+class TestMetadataWrapper:
+
+    @pytest.mark.parametrize("item_id, index", test_data)
+    def test_get_item_dict(self, item_id: str, index: int):
+        """
+        Test that the metadata returned from item id and from index is the first row of the item in the metadata.
+
+        :param item_id: id of the item
+        :param index: index of the first row of the item in the metadata
+        """
+        metadata_wrapper = MetadataWrapper(items_metadata)
+        expected_item_dict = items_metadata.loc[index].to_dict()
+        assert metadata_wrapper.get_item_dict_from_id(item_id) == expected_item_dict
+        assert metadata_wrapper.get_item_dict_from_index(index) == expected_item_dict
+
+    def test_returned_dict_is_a_copy(self):
+        """
+        Test that removing keys from a returned dictionary, as ItemLoader does, doesn't change later lookups.
+        """
+        metadata_wrapper = MetadataWrapper(items_metadata)
+        metadata_wrapper.get_item_dict_from_id("a").pop("name")
+        assert metadata_wrapper.get_item_dict_from_id("a")["name"] == "A"
+
+    @pytest.mark.parametrize("item_id, index", [("d", 14), ("a", 10), ("b", 11)])
+    def test_add_items(self, item_id: str, index: int):
+        """
+        Test that added items are found from their id and index, while items already in the metadata are still
+        found at their first row, and that views returned before adding the items don't change.
+
+        :param item_id: id of the item
+        :param index: index of the first row of the item in the metadata
+        """
+        metadata_wrapper = MetadataWrapper(items_metadata)
+        metadata_view = metadata_wrapper.get_metadata_view()
+        new_items_metadata = pd.DataFrame({"item_id": ["d", "a"], "name": ["E", "F"], "stars": [2.0, 2.5],
+                                           "optional": [{}, {}]}, index=[14, 15])
+        metadata_wrapper.add_items(new_items_metadata)
+
+        expected_metadata = pd.concat((items_metadata, new_items_metadata))
+        expected_item_dict = expected_metadata.loc[index].to_dict()
+        assert metadata_wrapper.get_item_dict_from_id(item_id) == expected_item_dict
+        assert metadata_wrapper.get_item_dict_from_index(index) == expected_item_dict
+        assert metadata_wrapper.get_metadata_view().equals(expected_metadata)
+        assert metadata_view.equals(items_metadata)
+
+    def test_add_items_with_existing_index(self):
+        """
+        Test that items whose index is already in the metadata are not added.
+        """
+        metadata_wrapper = MetadataWrapper(items_metadata)
+        with pytest.raises(ValueError):
+            metadata_wrapper.add_items(pd.DataFrame({"item_id": ["d"], "name": ["E"]}, index=[12]))
+        assert metadata_wrapper.get_metadata_view().equals(items_metadata)
@@ -0,0 +1,58 @@
+from information_retriever.review_store import ReviewStore
+import numpy as np
+import pytest
+
+reviews = ["Great food!", "", "Café au lait was perfect ☕", "Slow service", "Would come back"]
+review_item_ids = np.array(["a", "a", "b", "c", "c"], dtype=object)
+
+test_data = [
+    (None, 256),
+    (6, 2),
+    (6, 1),
+    (1, 10),
+]
+
+
+class TestReviewStore:
+
+    @pytest.mark.parametrize("compression_level, block_size", test_data)
+    def test_get_reviews(self, tmp_path, compression_level: int, block_size: int):
+        """
+        Test that every review read from the store is the review written to it, in any order.
+
+        :param compression_level: zlib compression level of the blocks, where None means no compression
+        :param block_size: number of consecutive reviews compressed together
+        """
+        path_to_store = str(tmp_path / "reviews_store")
+        ReviewStore.create(reviews, review_item_ids, path_to_store, block_size, compression_level)
+        review_store = ReviewStore(path_to_store, num_cached_blocks=1)
+
+        assert len(review_store) == len(reviews)
+        assert review_store.get_reviews([4, 0, 2, 1, 3, 2]) == [reviews[i] for i in [4, 0, 2, 1, 3, 2]]
+        assert review_store[-1] == reviews[-1]
+        assert review_store.get_item_ids().tolist() == review_item_ids.tolist()
+        assert review_store.is_compressed() == (compression_level is not None)
+        with pytest.raises(IndexError):
+            review_store[len(reviews)]
+
+    def test_append(self, tmp_path):
+        """
+        Test that appended reviews follow the reviews in the store and are not written to it.
+        """
+        path_to_store = str(tmp_path / "reviews_store")
+        review_store = ReviewStore.create(reviews, review_item_ids, path_to_store, compression_level=6)
+
+        review_store.append(["New review"])
+
+        assert len(review_store) == len(reviews) + 1
+        assert review_store.get_reviews([0, len(reviews), -1]) == [reviews[0], "New review", "New review"]
+        assert len(ReviewStore(path_to_store)) == len(reviews)
+
+    def test_create_empty(self, tmp_path):
+        """
+        Test that a store without reviews can be created and opened.
+        """
+        path_to_store = str(tmp_path / "reviews_store")
+        ReviewStore.create([], np.array([], dtype=object), path_to_store)
+
+        assert len(ReviewStore(path_to_store)) == 0
@@ -0,0 +1,90 @@
+import os
+
+from information_retriever.embedder.embedder import Embedder
+from information_retriever.embedder.embedder_registry import embedder_registry
+from information_retriever.embedder.sharded_embedding_pipeline import ShardedEmbeddingPipeline
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class LengthEmbedder(Embedder):
+    """
+    Embedder that embeds every text as a vector filled with its length and counts the texts it embeds, without
+    loading a language model.
+    """
+
+    num_embedded_texts: int
+
+    def __init__(self):
+        self.num_embedded_texts = 0
+
+    def embed(self, texts: list[str], bs=48, verbose=0) -> np.ndarray:
+        self.num_embedded_texts += len(texts)
+        return np.repeat(np.array([[len(text)] for text in texts], dtype=np.float32), 768, axis=1)
+
+
+test_data = [
+    (5, 2, [], 0),
+    (5, 2, [1], 2),
+    (5, 2, [0, 2], 3),
+    (4, 4, [0], 4),
+]
+
+
+class TestShardedEmbeddingPipeline:
+
+    @pytest.mark.parametrize("num_reviews, shard_size, shards_to_delete, expected_num_embedded_texts", test_data)
+    def test_resume(self, tmp_path, monkeypatch, num_reviews: int, shard_size: int, shards_to_delete: list[int],
+                    expected_num_embedded_texts: int):
+        """
+        Test that resuming only embeds the shards that are missing and that the merged embeddings are in the
+        order of the reviews.
+
+        :param num_reviews: number of reviews to embed
+        :param shard_size: number of reviews in each shard
+        :param shards_to_delete: shards deleted after the first run
+        :param expected_num_embedded_texts: expected number of reviews embedded when resuming
+        """
+        embedder = LengthEmbedder()
+        monkeypatch.setitem(embedder_registry._embedders, ("test", "model", "model"), embedder)
+        pipeline = ShardedEmbeddingPipeline("test", "model", "model", num_workers=1, shard_size=shard_size)
+        reviews_df = pd.DataFrame({'Review': ['a' * (i + 1) for i in range(num_reviews)]})
+        shard_dir = str(tmp_path / "shards")
+
+        pipeline.embed_reviews(reviews_df, shard_dir)
+        for shard in shards_to_delete:
+            os.remove(os.path.join(shard_dir, f'shard_{shard:05d}.npy'))
+        embedder.num_embedded_texts = 0
+        embeddings = pipeline.embed_reviews(reviews_df, shard_dir)
+
+        assert embedder.num_embedded_texts == expected_num_embedded_texts
+        assert np.array_equal(embeddings[:, 0], np.arange(1, num_reviews + 1))
+
+    def test_other_reviews(self, tmp_path, monkeypatch):
+        """
+        Test that shards embedded from other reviews are not reused.
+        """
+        monkeypatch.setitem(embedder_registry._embedders, ("test", "model", "model"), LengthEmbedder())
+        pipeline = ShardedEmbeddingPipeline("test", "model", "model", num_workers=1, shard_size=2)
+        shard_dir = str(tmp_path / "shards")
+
+        pipeline.embed_reviews(pd.DataFrame({'Review': ['a', 'b', 'c']}), shard_dir)
+        with pytest.raises(ValueError):
+            pipeline.embed_reviews(pd.DataFrame({'Review': ['a', 'b', 'd']}), shard_dir)
+
+    def test_num_workers(self, tmp_path, small_language_model: str):
+        """
+        Test that embedding shards in a pool of processes returns the embeddings computed in this process.
+
+        :param small_language_model: path to a small language model
+        """
+        reviews_df = pd.DataFrame({'Review': ["great food", "slow service", "the food was great", "come back",
+                                              "would come back"]})
+        embeddings = {}
+        for num_workers in [1, 2]:
+            pipeline = ShardedEmbeddingPipeline("torch", small_language_model, small_language_model,
+                                                num_workers=num_workers, shard_size=2)
+            embeddings[num_workers] = pipeline.embed_reviews(reviews_df, str(tmp_path / f"shards_{num_workers}"))
+
+        assert np.allclose(embeddings[2], embeddings[1], atol=1e-5)
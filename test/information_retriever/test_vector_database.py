@@ -0,0 +1,98 @@
+from information_retriever.vector_database import VectorDataBase
+import faiss
+import numpy as np
+import pytest
+import torch
+
+num_vectors = 50
+dimension_size = 16
+vectors = np.random.default_rng(0).standard_normal((num_vectors, dimension_size)).astype(np.float32)
+queries = np.random.default_rng(1).standard_normal((3, dimension_size)).astype(np.float32)
+
+test_data = [
+    ("Flat", []),
+    ("IDMap2,Flat", [0, 7, 49]),
+    ("IVF4,Flat", []),
+    ("IVF4,Flat", [3, 20]),
+]
+
+
+def exhaustive_similarity_matrix(removed_indices: list[int]) -> np.ndarray:
+    """
+    Score every query against every vector with an exhaustive search of an IndexFlatIP, and put the scores in
+    the order of the vectors, where removed vectors score 0.
+
+    :param removed_indices: indices of the vectors removed from the database
+    :return: array where element (i, j) is the inner product of query i and vector j
+    """
+    kept_indices = np.setdiff1d(np.arange(num_vectors), removed_indices)
+    index = faiss.IndexFlatIP(dimension_size)
+    index.add(vectors[kept_indices])
+    D, I = index.search(queries, index.ntotal)
+
+    similarity_matrix = np.zeros((queries.shape[0], num_vectors), dtype=np.float32)
+    for i in range(queries.shape[0]):
+        similarity_matrix[i, kept_indices[I[i]]] = D[i]
+    return similarity_matrix
+
+
+class TestVectorDataBase:
+
+    @pytest.mark.parametrize("index_description, removed_indices", test_data)
+    def test_find_similarity_matrix(self, index_description: str, removed_indices: list[int]):
+        """
+        Test that the similarity scores of each query are those of an exhaustive search, in the order of the
+        indices of the vectors, including after vectors were removed.
+
+        :param index_description: FAISS description of the database
+        :param removed_indices: indices of the vectors removed from the database
+        """
+        index = faiss.index_factory(dimension_size, index_description, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        if index_description == "Flat":
+            index.add(vectors)
+        else:
+            index.add_with_ids(vectors, np.arange(num_vectors))
+        vector_database = VectorDataBase(index)
+        if removed_indices:
+            vector_database.remove_vectors(np.array(removed_indices))
+
+        expected_similarity_matrix = exhaustive_similarity_matrix(removed_indices)
+        similarity_matrix = vector_database.find_similarity_matrix(torch.from_numpy(queries))
+
+        assert similarity_matrix.shape == (queries.shape[0], num_vectors)
+        assert np.allclose(similarity_matrix.numpy(), expected_similarity_matrix, atol=1e-5)
+        assert np.allclose(vector_database.find_similarity_vector(torch.from_numpy(queries[0])).numpy(),
+                           expected_similarity_matrix[0], atol=1e-5)
+
+        kept_indices = torch.tensor([index for index in [1, 5, 8, 30] if index not in removed_indices])
+        assert np.allclose(vector_database.find_similarity_subset(torch.from_numpy(queries), kept_indices).numpy(),
+                           expected_similarity_matrix[:, kept_indices.numpy()], atol=1e-5)
+
+    @pytest.mark.parametrize("index_description, can_remove_vectors",
+                             [("IDMap2,Flat", True), ("IVF4,Flat", True), ("IDMap2,HNSW8,Flat", False),
+                              ("Flat", False)])
+    def test_remove_vectors(self, index_description: str, can_remove_vectors: bool):
+        """
+        Test that removing vectors from a database that can't remove them, such as HNSW, raises a ValueError
+        and leaves the database unchanged.
+
+        :param index_description: FAISS description of the database
+        :param can_remove_vectors: whether vectors can be removed from the database
+        """
+        index = faiss.index_factory(dimension_size, index_description, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        if index_description == "Flat":
+            index.add(vectors)
+        else:
+            index.add_with_ids(vectors, np.arange(num_vectors))
+        vector_database = VectorDataBase(index)
+
+        assert vector_database.can_remove_vectors() == can_remove_vectors
+        if can_remove_vectors:
+            vector_database.remove_vectors(np.array([3]))
+            assert index.ntotal == num_vectors - 1
+        else:
+            with pytest.raises(ValueError):
+                vector_database.remove_vectors(np.array([3]))
+            assert index.ntotal == num_vectors
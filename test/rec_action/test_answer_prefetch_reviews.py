@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+import yaml
+
+from rec_action.response_type.answer_prompt_based_resp import AnswerPromptBasedResponse
+
+with open("system_config.yaml") as f:
+    config = yaml.load(f, Loader=yaml.FullLoader)
+
+
+class Item:
+    """
+    Recommended item whose only metadata is its opening hours.
+    """
+
+    def __init__(self, item_id: str):
+        self._item_id = item_id
+
+    def get_id(self) -> str:
+        return self._item_id
+
+    def get_name(self) -> str:
+        return self._item_id
+
+    def get_data(self) -> dict:
+        return {"hours": "9-5"}
+
+
+class CategoryLLMWrapper:
+    """
+    LLM wrapper classifying questions about opening as "hours" and every other question as "none".
+    """
+
+    def make_request(self, prompt: str) -> str:
+        return "hours" if "open" in prompt else "none"
+
+
+class ItemFilterApplier:
+    """
+    Filter applier keeping item 0 only.
+    """
+
+    def filter_by_current_item(self, current_item: Item) -> list[int]:
+        return [0]
+
+
+class BatchInformationRetrieval:
+    """
+    Information retrieval recording the queries of each batch and returning the query as the review.
+    """
+
+    batches: list[list[str]]
+
+    def __init__(self):
+        self.batches = []
+
+    def get_best_matching_reviews_of_item_batch(self, queries: list[str], num_of_reviews_to_return: int,
+                                                item_indices_to_keep: list[int], unacceptable_similarity_range: float,
+                                                max_number_similar_items: int) -> list[list[list[str]]]:
+        self.batches.append(queries)
+        return [[[query]] for query in queries]
+
+
+class BarrierAnswerPromptBasedResponse(AnswerPromptBasedResponse):
+    """
+    Response whose queries can only be built once every question is being converted at the same time.
+    """
+
+    _barrier: threading.Barrier | None
+
+    def __init__(self, barrier: threading.Barrier | None, *args):
+        super().__init__(*args)
+        self._barrier = barrier
+
+    def convert_state_to_query(self, question: str) -> str:
+        if self._barrier is not None:
+            self._barrier.wait()
+        return f"query: {question}"
+
+
+class TestAnswerPrefetchReviews:
+
+    @pytest.mark.parametrize("enable_threading", [True, False])
+    def test_prefetch_reviews(self, enable_threading: bool):
+        """
+        Test that the queries of the questions answered with information retrieval are built in parallel when
+        multithreading is enabled, and that the reviews of each item are retrieved for all of them in one batch.
+
+        :param enable_threading: whether multithreading is enabled
+        """
+        questions = ["when is it open?", "is the food good?", "is it loud?", "is it clean?"]
+        ir_questions = questions[1:]
+        items = [Item("x"), Item("y")]
+        information_retrieval = BatchInformationRetrieval()
+        barrier = threading.Barrier(len(ir_questions), timeout=10) if enable_threading else None
+        answer_resp = BarrierAnswerPromptBasedResponse(
+            barrier, {**config, 'ENABLE_MULTITHREADING': enable_threading}, CategoryLLMWrapper(),
+            ItemFilterApplier(), information_retrieval, "restaurants", [], [], [], [])
+
+        categories = answer_resp._extract_categories(questions, items)
+        prefetched_reviews = answer_resp._prefetch_reviews(questions, items, categories)
+
+        expected_queries = [f"query: {question}" for question in ir_questions]
+        assert information_retrieval.batches == [expected_queries, expected_queries]
+        assert prefetched_reviews == {(question, item.get_id()): f"query: {question}"
+                                      for question in ir_questions for item in items}